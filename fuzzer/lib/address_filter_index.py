@@ -0,0 +1,71 @@
+import os
+import struct
+from array import array
+
+# magic, version, number of targets
+INDEX_HEADER = struct.Struct("<8sII")
+# length of the target name, number of ranges
+TARGET_HEADER = struct.Struct("<IQ")
+INDEX_MAGIC = b"MTCFIDX\0"
+INDEX_VERSION = 1
+
+def merge_ranges(ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """
+    Sort inclusive [lower, upper] ranges and merge the overlapping and adjacent ones.
+    """
+    merged = []
+    for lower, upper in sorted(ranges):
+        if merged and lower <= merged[-1][1] + 1:
+            if upper > merged[-1][1]:
+                merged[-1] = (merged[-1][0], upper)
+        else:
+            merged.append((lower, upper))
+    return merged
+
+def write_filter_index(path: str, filters: dict[str, list[tuple[int, int]]]) -> None:
+    """
+    Write {target: [(lower, upper)]} as a binary interval index: per target the sorted, merged
+    lower bounds followed by the upper bounds as uint64 arrays.
+    """
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(filters)))
+        for target, ranges in filters.items():
+            ranges = merge_ranges(ranges)
+            name = target.encode()
+            f.write(TARGET_HEADER.pack(len(name), len(ranges)))
+            f.write(name)
+            array("Q", (lower for lower, _ in ranges)).tofile(f)
+            array("Q", (upper for _, upper in ranges)).tofile(f)
+    os.replace(tmp_file, path)
+
+def load_filter_index(path: str) -> dict[str, tuple[array, array]]:
+    """
+    Return {target: (lowers, uppers)} of an index written by write_filter_index().
+    """
+    filters = {}
+    with open(path, "rb") as f:
+        magic, version, num_targets = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError(f"{path} is not an address filter index of version {INDEX_VERSION}")
+        for _ in range(num_targets):
+            name_len, num_ranges = TARGET_HEADER.unpack(f.read(TARGET_HEADER.size))
+            target = f.read(name_len).decode()
+            lowers = array("Q")
+            uppers = array("Q")
+            lowers.fromfile(f, num_ranges)
+            uppers.fromfile(f, num_ranges)
+            filters[target] = (lowers, uppers)
+    return filters
+
+def filters_from_config(config: dict, target: str) -> list[tuple[int, int]]:
+    """
+    Sorted (lower, upper) filters of "kernel" or "firmware", from the binary index in
+    config["fuzzing"]["address_filter_index"] if there is one, else from config["address_filters"].
+    """
+    index_path = config["fuzzing"].get("address_filter_index")
+    if index_path:
+        lowers, uppers = load_filter_index(index_path).get(target, ((), ()))
+        return list(zip(lowers, uppers))
+
+    return sorted((int(data["lower"], 16), int(data["upper"], 16)) for data in config["address_filters"].get(target, []))
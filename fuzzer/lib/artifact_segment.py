@@ -0,0 +1,123 @@
+import json
+import os
+
+# values of config["fuzzing"]["artifact_policy"]
+ARTIFACT_POLICIES = ("all", "interesting")
+
+class ArtifactSegmentWriter:
+    """
+    Per-task append-only store for the artifacts of tests that are not worth a directory of their own.
+
+    Files are appended to segment-NNNNN.bin and index.jsonl records where each one is:
+      {"test": <test dir name>, "file": <relative path>, "segment": <segment file>, "offset": <int>, "length": <int>}
+    """
+    def __init__(self, segment_dir: str, *, max_segment_size: int = 256 * 1024 * 1024,
+                 exclude: tuple = ("qemu_trace_log.log",), counters_interval: int = 100) -> None:
+        self.segment_dir = segment_dir
+        self.max_segment_size = max_segment_size
+        self.exclude = set(exclude)
+        self.counters_interval = counters_interval
+        os.makedirs(self.segment_dir, exist_ok=True)
+
+        self.index = open(os.path.join(self.segment_dir, "index.jsonl"), "a")
+        self.segment_no = self._last_segment_no()
+        self.segment = None
+        self._open_segment()
+
+        self.counters_file = os.path.join(self.segment_dir, "counters.json")
+        self.counters = {
+            "tests": 0,
+            "crashes": 0,
+            "new_coverage": 0,
+            "archived": 0,
+            "archived_bytes": 0,
+        }
+        if os.path.exists(self.counters_file):
+            with open(self.counters_file, "r") as f:
+                self.counters.update(json.load(f))
+
+    def _last_segment_no(self) -> int:
+        numbers = [int(name[len("segment-"):-len(".bin")]) for name in os.listdir(self.segment_dir)
+                   if name.startswith("segment-") and name.endswith(".bin")]
+        return max(numbers) if numbers else 0
+
+    def _segment_name(self) -> str:
+        return f"segment-{self.segment_no:05d}.bin"
+
+    def _open_segment(self) -> None:
+        if self.segment:
+            self.segment.close()
+        self.segment = open(os.path.join(self.segment_dir, self._segment_name()), "ab")
+
+    def count(self, key: str) -> None:
+        self.counters[key] += 1
+        if key == "tests" and self.counters["tests"] % self.counters_interval == 0:
+            self.save_counters()
+
+    def append_files(self, test_dir_name: str, files: dict[str, bytes]) -> int:
+        """
+        Append {relative path: data} of a test that has no directory and return the number of bytes written.
+        """
+        if self.segment.tell() >= self.max_segment_size:
+            self.segment_no += 1
+            self._open_segment()
+
+        written = 0
+        for name, data in files.items():
+            if os.path.basename(name) in self.exclude:
+                continue
+            offset = self.segment.tell()
+            self.segment.write(data)
+            record = {
+                "test": test_dir_name,
+                "file": name,
+                "segment": self._segment_name(),
+                "offset": offset,
+                "length": len(data),
+            }
+            self.index.write(json.dumps(record) + "\n")
+            written += len(data)
+
+        self.segment.flush()
+        self.index.flush()
+
+        self.counters["archived"] += 1
+        self.counters["archived_bytes"] += written
+        return written
+
+    def append_test_dir(self, test_dir_name: str, local_test_dir: str, files: dict[str, bytes] = None) -> int:
+        """
+        Append all files of local_test_dir (except excluded ones) and files, if given, and return the number of bytes written.
+        """
+        files = dict(files or {})
+        for root, _, names in os.walk(local_test_dir):
+            for name in sorted(names):
+                if name in self.exclude:
+                    continue
+                path = os.path.join(root, name)
+                with open(path, "rb") as f:
+                    files[os.path.relpath(path, local_test_dir)] = f.read()
+        return self.append_files(test_dir_name, files)
+
+    def save_counters(self) -> None:
+        with open(self.counters_file, "w") as f:
+            json.dump(self.counters, f, indent=4)
+
+    def close(self) -> None:
+        self.save_counters()
+        if self.segment:
+            self.segment.close()
+            self.segment = None
+        if self.index:
+            self.index.close()
+            self.index = None
+
+def read_artifact(segment_dir: str, test_dir_name: str, file_name: str) -> bytes | None:
+    with open(os.path.join(segment_dir, "index.jsonl"), "r") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["test"] == test_dir_name and record["file"] == file_name:
+                with open(os.path.join(segment_dir, record["segment"]), "rb") as seg:
+                    seg.seek(record["offset"])
+                    return seg.read(record["length"])
+    return None
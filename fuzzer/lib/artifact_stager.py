@@ -0,0 +1,194 @@
+import logging
+logger = logging.getLogger("mtcfuzz")
+
+import errno
+import fcntl
+import json
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ioctl(2) request number of FICLONE on Linux (_IOW(0x94, 9, int))
+FICLONE = 0x40049409
+
+STAGED_MARKER_FILE = ".mtcfuzz-staged"
+
+_staged_lock = threading.Lock()
+_staged_trees = set()
+
+class ArtifactStager:
+    """
+    Stage pristine build artifacts (OP-TEE bin dir, rootfs images) into the local work dir.
+
+    mode:
+      - "reflink":  reflink (copy-on-write clone) every file, fall back to copy
+      - "copy":     plain copy, parallelised over files
+      - "hardlink": hardlink read-only files, reflink or copy writable ones.
+                    The staged files share their inodes with the build outputs, a build writing
+                    them in place changes the staged tree too.
+    """
+    def __init__(self, mode: str = "reflink", *, max_workers: int = 8) -> None:
+        if mode not in ("hardlink", "reflink", "copy"):
+            raise ValueError(f"Unknown artifact staging mode: {mode}")
+
+        self.mode = mode
+        self.max_workers = max_workers
+        self.overlay_templates = {}
+
+    def _reflink(self, src: str, dst: str) -> bool:
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            shutil.copystat(src, dst)
+            return True
+        except OSError:
+            if os.path.exists(dst):
+                os.unlink(dst)
+            return False
+
+    def _hardlink(self, src: str, dst: str) -> bool:
+        try:
+            os.link(src, dst)
+            return True
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+            return False
+
+    def stage_file(self, src: str, dst: str, *, writable: bool = False) -> str:
+        """
+        Place src at dst and return the method that was used.
+        Writable files are never hardlinked so the pristine image stays untouched.
+        """
+        if os.path.lexists(dst):
+            os.unlink(dst)
+
+        if self.mode == "hardlink" and not writable:
+            if self._hardlink(src, dst):
+                return "hardlink"
+
+        if self.mode in ("hardlink", "reflink"):
+            if self._reflink(src, dst):
+                return "reflink"
+
+        shutil.copy2(src, dst)
+        return "copy"
+
+    @staticmethod
+    def _manifest(src_dir: str, files: list[tuple[str, str]]) -> dict:
+        """
+        Size and mtime of every source file, a tree staged from other sources is staged again.
+        """
+        manifest = {}
+        for from_path, _ in files:
+            st = os.stat(from_path)
+            manifest[os.path.relpath(from_path, src_dir)] = [st.st_size, st.st_mtime_ns]
+        return {"src": src_dir, "files": manifest}
+
+    def _is_staged(self, dst_dir: str, manifest: dict) -> bool:
+        marker = os.path.join(dst_dir, STAGED_MARKER_FILE)
+        try:
+            with open(marker, "r") as f:
+                return json.load(f) == manifest
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+
+    @staticmethod
+    def _list_tree(src_dir: str, dst_dir: str, *, create: bool) -> list[tuple[str, str]]:
+        """
+        (source, destination) of every regular file of src_dir. With create, the directories and
+        symlinks are recreated in dst_dir, os.walk() does not follow symlinked dirs, like copytree(symlinks=True).
+        """
+        files = []
+        for root, dirs, names in os.walk(src_dir):
+            rel = os.path.relpath(root, src_dir)
+            to_root = os.path.normpath(os.path.join(dst_dir, rel))
+            if create:
+                os.makedirs(to_root, exist_ok=True)
+
+            for name in dirs + names:
+                from_path = os.path.join(root, name)
+                to_path = os.path.join(to_root, name)
+                if os.path.islink(from_path):
+                    if create:
+                        if os.path.lexists(to_path):
+                            os.unlink(to_path)
+                        os.symlink(os.readlink(from_path), to_path)
+                elif name in names:
+                    files.append((from_path, to_path))
+        return files
+
+    def stage_tree(self, src_dir: str, dst_dir: str) -> bool:
+        """
+        Mirror src_dir into dst_dir. Tasks sharing the same dst_dir stage it only once,
+        a later run reuses it while the sizes and mtimes of the source files are unchanged.
+        """
+        src_dir = os.path.realpath(src_dir)
+        dst_dir = os.path.realpath(dst_dir)
+        key = (src_dir, dst_dir)
+
+        with _staged_lock:
+            if key in _staged_trees:
+                return True
+
+            manifest = self._manifest(src_dir, self._list_tree(src_dir, dst_dir, create=False))
+            if self._is_staged(dst_dir, manifest):
+                logger.info(f"Artifacts already staged: {dst_dir}")
+                _staged_trees.add(key)
+                return True
+
+            marker = os.path.join(dst_dir, STAGED_MARKER_FILE)
+            if os.path.exists(marker):
+                logger.info(f"Artifacts in {src_dir} changed since they were staged, staging them again")
+                os.unlink(marker)
+
+            files = self._list_tree(src_dir, dst_dir, create=True)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                methods = list(executor.map(lambda p: self.stage_file(p[0], p[1]), files))
+
+            # the manifest of before the staging, a source changed meanwhile is staged again next time
+            with open(marker, "w") as f:
+                json.dump(manifest, f)
+
+            _staged_trees.add(key)
+
+        summary = {m: methods.count(m) for m in set(methods)}
+        logger.info(f"Staged {len(files)} files from {src_dir} to {dst_dir}: {summary}")
+        return True
+
+    def create_overlay(self, base_image: str, overlay: str, *, base_format: str = "qcow2") -> bool:
+        """
+        Create a thin qcow2 overlay on top of a read-only base image.
+        The freshly created overlay is kept in memory so reset_overlay() can restore it without qemu-img.
+        """
+        if os.path.lexists(overlay):
+            os.unlink(overlay)
+
+        cmd = ["qemu-img", "create", "-f", "qcow2", "-F", base_format, "-b", os.path.realpath(base_image), overlay]
+        try:
+            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        except Exception as e:
+            logger.error(f"Failed to create overlay {overlay}: {e}")
+            return False
+
+        with open(overlay, "rb") as f:
+            self.overlay_templates[overlay] = f.read()
+
+        return True
+
+    def reset_overlay(self, overlay: str) -> bool:
+        """
+        Drop all writes in the overlay by truncating it back to its freshly created state.
+        """
+        template = self.overlay_templates.get(overlay)
+        if template is None:
+            logger.error(f"Overlay {overlay} was not created by this stager")
+            return False
+
+        with open(overlay, "r+b") as f:
+            f.truncate(0)
+            f.write(template)
+
+        return True
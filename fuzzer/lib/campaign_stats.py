@@ -0,0 +1,181 @@
+import logging
+logger = logging.getLogger("mtcfuzz")
+
+import asyncio
+import json
+import os
+import time
+import urllib.parse
+
+from .coverage import layout_coverage
+
+class CampaignStats:
+    """
+    Campaign progress shared by all tasks, written to <local_work_dir>/fuzzer_stats.json periodically
+    and optionally served as JSON over HTTP on a local TCP port and/or a unix socket.
+    """
+    def __init__(self, local_work_dir: str, crashed_testcase_manager: "CrashedTestcaseManager") -> None:
+        self.stats_file = f"{local_work_dir}/fuzzer_stats.json"
+        self.crashed_testcase_manager = crashed_testcase_manager
+        self.started = time.time()
+        self.tasks = {}
+        self.servers = []
+        # path -> (handler taking the parsed query string and returning bytes, content type), see add_route()
+        self.routes = {
+            "/": (self.stats_json, "application/json"),
+            "/stats": (self.stats_json, "application/json"),
+        }
+
+    def register_task(self, task_id: str, coverage: "Coverage", seed_manager: "SeedManager") -> None:
+        now = time.time()
+        self.tasks[task_id] = {
+            "coverage": coverage,
+            "seed_manager": seed_manager,
+            "started": now,
+            "execs": 0,
+            "restarts": 0,
+            "last_new_path": None,
+            "last_update": now,
+        }
+
+    def count_execs(self, task_id: str, num: int = 1) -> None:
+        task = self.tasks[task_id]
+        task["execs"] += num
+        task["last_update"] = time.time()
+
+    def count_restart(self, task_id: str) -> None:
+        self.tasks[task_id]["restarts"] += 1
+
+    def new_path(self, task_id: str) -> None:
+        self.tasks[task_id]["last_new_path"] = time.time()
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        kernel_pcs = set()
+        firmware_pcs = set()
+        coverage_hashes = set()
+        corpus_size = 0
+        last_new_path = None
+        tasks = {}
+        # target -> union of the block/function coverage of the tasks with a static layout
+        layouts = {}
+
+        for task_id, task in self.tasks.items():
+            kernel_cov, firmware_cov = task["coverage"].get_coverages()
+            kernel_pcs.update(kernel_cov)
+            firmware_pcs.update(firmware_cov)
+
+            seeds = task["seed_manager"].seeds
+            corpus_size += len(seeds)
+            task_hashes = {seed["coverage_hash"] for seed in seeds.values() if seed["coverage_hash"] is not None}
+            coverage_hashes.update(task_hashes)
+
+            for target, data in task["coverage"].layouts.items():
+                total = layouts.setdefault(target, {"blocks": set(), "functions": set(),
+                                                    "total_blocks": data["total_blocks"], "total_functions": data["total_functions"]})
+                total["blocks"].update(data["blocks"])
+                total["functions"].update(data["functions"])
+
+            if task["last_new_path"] is not None and (last_new_path is None or task["last_new_path"] > last_new_path):
+                last_new_path = task["last_new_path"]
+
+            run_time = now - task["started"]
+            tasks[task_id] = {
+                "execs": task["execs"],
+                "execs_per_sec": task["execs"] / run_time if run_time > 0 else 0,
+                "restarts": task["restarts"],
+                "corpus_size": len(seeds),
+                "favored": len(task_hashes),
+                "kernel_coverage": len(kernel_cov),
+                "firmware_coverage": len(firmware_cov),
+                "seconds_since_last_new_path": now - task["last_new_path"] if task["last_new_path"] else None,
+                "seconds_since_last_update": now - task["last_update"],
+                "layout_coverage": task["coverage"].get_layout_coverages(),
+            }
+
+        run_time = now - self.started
+        total_execs = sum(task["execs"] for task in self.tasks.values())
+        return {
+            "start_time": self.started,
+            "last_update": now,
+            "run_time": run_time,
+            "execs_done": total_execs,
+            "execs_per_sec": total_execs / run_time if run_time > 0 else 0,
+            "total_crashes": self.crashed_testcase_manager.total_crash_count(),
+            "unique_crashes": self.crashed_testcase_manager.unique_crash_count(),
+            "corpus_size": corpus_size,
+            # seeds with distinct coverage, the closest thing to AFL's favored entries here
+            "favored": len(coverage_hashes),
+            "kernel_coverage": len(kernel_pcs),
+            "firmware_coverage": len(firmware_pcs),
+            "restarts": sum(task["restarts"] for task in self.tasks.values()),
+            "seconds_since_last_new_path": now - last_new_path if last_new_path else None,
+            "layout_coverage": {
+                target: layout_coverage(len(total["blocks"]), total["total_blocks"], len(total["functions"]), total["total_functions"])
+                for target, total in layouts.items()
+            },
+            "tasks": tasks,
+        }
+
+    def stats_json(self, query: dict = None) -> bytes:
+        return json.dumps(self.snapshot(), indent=4).encode()
+
+    def write(self) -> None:
+        tmp_file = f"{self.stats_file}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(self.stats_json())
+        os.replace(tmp_file, self.stats_file)
+
+    async def run(self, interval: float = 5) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.write()
+            except Exception as e:
+                logger.warning(f"Failed to write {self.stats_file}: {e}")
+
+    def add_route(self, path: str, handler, content_type: str = "application/json") -> None:
+        self.routes[path] = (handler, content_type)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            # skip the headers, only GET is supported
+            while True:
+                line = await reader.readline()
+                if not line or line in (b"\r\n", b"\n"):
+                    break
+
+            parts = request_line.decode("latin-1").split()
+            url = urllib.parse.urlsplit(parts[1] if len(parts) >= 2 else "/")
+            path = url.path
+            route = self.routes.get(path)
+            if route is None:
+                status, body, content_type = "404 Not Found", b"not found\n", "text/plain"
+            else:
+                handler, content_type = route
+                status, body = "200 OK", handler(urllib.parse.parse_qs(url.query))
+
+            writer.write(f"HTTP/1.0 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+            await writer.drain()
+        except Exception as e:
+            logger.warning(f"stats endpoint: {e}")
+        finally:
+            writer.close()
+
+    async def start_server(self, *, http_host: str = "127.0.0.1", http_port: int = None, unix_socket: str = None) -> None:
+        if http_port is not None:
+            self.servers.append(await asyncio.start_server(self._handle, http_host, http_port))
+            logger.info(f"Stats endpoint: http://{http_host}:{http_port}/stats")
+
+        if unix_socket is not None:
+            if os.path.exists(unix_socket):
+                os.unlink(unix_socket)
+            self.servers.append(await asyncio.start_unix_server(self._handle, unix_socket))
+            logger.info(f"Stats endpoint: unix socket {unix_socket}")
+
+    async def stop_server(self) -> None:
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        self.servers = []
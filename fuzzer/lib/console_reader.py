@@ -0,0 +1,117 @@
+import logging
+logger = logging.getLogger("mtcfuzz")
+
+import asyncio
+import time
+
+class ConsoleReader:
+    """
+    Stream a QEMU serial socket into a ring buffer for the whole VM lifetime.
+    Per-test output is sliced out of the buffer by absolute stream offsets.
+    """
+    def __init__(self, serial_socket_path: str, *, buffer_size: int = 4 * 1024 * 1024) -> None:
+        self.serial_socket_path = serial_socket_path
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        # absolute stream offset of self.buffer[0]
+        self.base_offset = 0
+        self.last_data_time = 0.0
+        self.listeners = []
+        self.reader = None
+        self.writer = None
+        self.read_task = None
+        self.closed = True
+
+    @property
+    def offset(self) -> int:
+        return self.base_offset + len(self.buffer)
+
+    def add_listener(self, listener: callable) -> None:
+        """
+        listener(data: bytes, offset: int) is called for every chunk received, offset is where the chunk starts.
+        """
+        self.listeners.append(listener)
+
+    async def open(self, *, retry_max: int = 50, retry_interval: float = 0.1) -> bool:
+        for attempt in range(retry_max):
+            try:
+                self.reader, self.writer = await asyncio.open_unix_connection(self.serial_socket_path)
+                break
+            except OSError:
+                await asyncio.sleep(retry_interval)
+        else:
+            logger.error(f"Failed to connect to serial socket {self.serial_socket_path}")
+            return False
+
+        self.closed = False
+        self.read_task = asyncio.create_task(self._read_loop())
+        return True
+
+    async def _read_loop(self) -> None:
+        try:
+            while True:
+                data = await self.reader.read(8192)
+                if not data:
+                    break
+                self._append(data)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.closed = True
+
+    def _append(self, data: bytes) -> None:
+        start = self.offset
+        self.buffer += data
+
+        overflow = len(self.buffer) - self.buffer_size
+        if overflow > 0:
+            del self.buffer[:overflow]
+            self.base_offset += overflow
+
+        self.last_data_time = time.monotonic()
+        for listener in self.listeners:
+            listener(data, start)
+
+    async def drain(self, *, quiet: float = 0.02, timeout: float = 0.5) -> None:
+        """
+        Wait until the console has been silent for `quiet` seconds since the call, at most `timeout` seconds.
+        """
+        start = time.monotonic()
+        deadline = start + timeout
+        while not self.closed:
+            now = time.monotonic()
+            silent_for = now - max(self.last_data_time, start)
+            if silent_for >= quiet or now >= deadline:
+                break
+            await asyncio.sleep(min(quiet - silent_for, deadline - now))
+
+    def get(self, start: int, end: int = None) -> bytes:
+        if end is None:
+            end = self.offset
+        # data older than the ring buffer is lost
+        start = max(start, self.base_offset)
+        return bytes(self.buffer[start - self.base_offset:end - self.base_offset])
+
+    def save(self, logfile_path: str, start: int, end: int = None) -> None:
+        with open(logfile_path, "wb") as f:
+            f.write(self.get(start, end))
+
+    async def close(self) -> None:
+        if self.read_task:
+            self.read_task.cancel()
+            try:
+                await self.read_task
+            except asyncio.CancelledError:
+                pass
+            self.read_task = None
+
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+            self.writer = None
+
+        self.reader = None
+        self.closed = True
@@ -20,11 +20,21 @@ class Coverage:
         self.firmware_cov = defaultdict(int)
         self.other = defaultdict(int)
 
+        # target -> StaticLayout and the block/function coverage derived from it, see set_static_layout()
+        self.layouts = {}
+        # name -> (target, lower, upper, load address) of code whose load address is only known at runtime,
+        # its PCs are counted in target and belong to the static layout and binary of that name, see relocate_filter()
+        self.relocated = {}
+
     def _create_filter(self, filter_list):
         result = []
         for data in filter_list:
-            lower = int(data["lower"], 16)
-            upper = int(data["upper"], 16)
+            # {"lower": "0x...", "upper": "0x..."} of the JSON config or (lower, upper) of the filter index
+            if isinstance(data, dict):
+                lower = int(data["lower"], 16)
+                upper = int(data["upper"], 16)
+            else:
+                lower, upper = data
             result.append([lower, upper])
         result.sort(key=lambda x: x[0])
         return result
@@ -63,12 +73,16 @@ class Coverage:
             if addr_in_filters(pc, self.kernel_filter, self.kernel_starts):
                 self.kernel_cov[pc] = 1
                 kernel_cov_found = True
+                if self.layouts:
+                    self._add_layout_pc("kernel", pc)
                 all_hex.append(pc)
                 continue
             
             if addr_in_filters(pc, self.firmware_filter, self.firmware_starts):
                 self.firmware_cov[pc] = 1
                 firmware_cov_found = True
+                if self.layouts:
+                    self._add_layout_pc("firmware", pc)
                 all_hex.append(pc)
                 continue
 
@@ -87,3 +101,120 @@ class Coverage:
 
     def get_coverages(self) -> tuple[dict, dict]:
         return (self.kernel_cov, self.firmware_cov)
+
+    def relocate_filter(self, target: str, new_range: tuple[int, int], old_ranges: list[tuple[int, int]] = None, *,
+                        name: str = None, base_addr: int = None) -> None:
+        """
+        Replace the "kernel" or "firmware" filters overlapping new_range or one of old_ranges with new_range,
+        for code whose load address is only known at runtime.
+        PCs covered in one of old_ranges move with the code, so code covered before a move is not new coverage again.
+        With name, PCs of new_range belong to the static layout and binary of that name, loaded at base_addr.
+        """
+        old_ranges = old_ranges if old_ranges is not None else []
+        filters = self.kernel_filter if target == "kernel" else self.firmware_filter
+        replaced = [new_range] + list(old_ranges)
+        result = [pair for pair in filters
+                  if not any(pair[0] <= upper and lower <= pair[1] for lower, upper in replaced)]
+        result.append([new_range[0], new_range[1]])
+        result.sort(key=lambda x: x[0])
+
+        if target == "kernel":
+            self.kernel_filter = result
+            self.kernel_starts = [pair[0] for pair in result]
+        else:
+            self.firmware_filter = result
+            self.firmware_starts = [pair[0] for pair in result]
+
+        cov = self.kernel_cov if target == "kernel" else self.firmware_cov
+        for lower, upper in old_ranges:
+            offset = new_range[0] - lower
+            if offset == 0:
+                continue
+            moved = {pc: cov.pop(pc) for pc in [pc for pc in cov if lower <= pc <= upper]}
+            for pc, count in moved.items():
+                cov[pc + offset] += count
+
+        if name is not None:
+            self.relocated[name] = (target, new_range[0], new_range[1], base_addr if base_addr is not None else new_range[0])
+
+    def set_static_layout(self, target: str, layout: "StaticLayout", base_addr: int = 0) -> None:
+        """
+        Track basic-block and function coverage of "kernel" or "firmware" PCs with a StaticLayout.
+        The totals are the blocks and functions overlapping the address filters of the target.
+        For the name of relocated code (see relocate_filter()) the totals are the whole layout and base_addr is not used.
+        """
+        if target in ("kernel", "firmware"):
+            filters = self.kernel_filter if target == "kernel" else self.firmware_filter
+            functions = set()
+            for lower, upper in filters:
+                functions.update(layout.functions_in(lower - base_addr, upper - base_addr))
+        else:
+            functions = range(len(layout.starts))
+
+        self.layouts[target] = {
+            "layout": layout,
+            "base_addr": base_addr,
+            "total_functions": len(functions),
+            "total_blocks": sum(layout.count_blocks(layout.starts[i], layout.ends[i]) for i in functions),
+            "blocks": set(),
+            "functions": set(),
+        }
+        for cov_target, cov in (("kernel", self.kernel_cov), ("firmware", self.firmware_cov)):
+            for pc in cov:
+                self._add_layout_pc(cov_target, pc)
+
+    def layout_address(self, target: str, pc: int) -> tuple[str, int]:
+        """
+        The layout name and the ELF address of a "kernel" or "firmware" PC.
+        """
+        for name, (reloc_target, lower, upper, base_addr) in self.relocated.items():
+            if reloc_target == target and lower <= pc <= upper:
+                return name, pc - base_addr
+        data = self.layouts.get(target)
+        return target, pc - (data["base_addr"] if data else 0)
+
+    def _add_layout_pc(self, target: str, pc: int) -> None:
+        name, addr = self.layout_address(target, pc)
+        data = self.layouts.get(name)
+        if data is None:
+            return
+        function = data["layout"].function_index(addr)
+        if function is None:
+            return
+        data["functions"].add(function)
+        data["blocks"].add(data["layout"].block_index(addr))
+
+    def get_layout_coverages(self) -> dict[str, dict]:
+        """
+        {target: {"blocks", "total_blocks", "block_coverage", "functions", "total_functions", "function_coverage"}},
+        coverages in percent.
+        """
+        result = {}
+        for target, data in self.layouts.items():
+            result[target] = layout_coverage(len(data["blocks"]), data["total_blocks"],
+                                             len(data["functions"]), data["total_functions"])
+        return result
+
+def layout_coverage(blocks: int, total_blocks: int, functions: int, total_functions: int) -> dict:
+    return {
+        "blocks": blocks,
+        "total_blocks": total_blocks,
+        "block_coverage": blocks * 100 / total_blocks if total_blocks else 0.0,
+        "functions": functions,
+        "total_functions": total_functions,
+        "function_coverage": functions * 100 / total_functions if total_functions else 0.0,
+    }
+
+def split_trace(cover_pcs: list[str], boundary_pc: int) -> list[list[str]]:
+    """
+    Split a trace of several inputs run back to back at each occurrence of boundary_pc.
+    Each segment starts at a boundary, PCs before the first one belong to the first segment.
+    """
+    marker = f"{boundary_pc:#x}"
+    boundaries = [i for i, pc_str in enumerate(cover_pcs) if pc_str.strip() == marker]
+    if not boundaries:
+        return [cover_pcs]
+
+    boundaries[0] = 0
+    boundaries.append(len(cover_pcs))
+    return [cover_pcs[start:end] for start, end in zip(boundaries, boundaries[1:])]
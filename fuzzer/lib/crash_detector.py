@@ -0,0 +1,51 @@
+import logging
+logger = logging.getLogger("mtcfuzz")
+
+import asyncio
+import re
+
+from .fuzzer_lib import CRASH_SIGNATURES
+
+class CrashDetector:
+    """
+    Incremental crash matcher fed by a ConsoleReader listener.
+
+    All signatures are compiled into one regex, so every console chunk is scanned once
+    no matter how many signatures there are. `event` is set as soon as one matches.
+    """
+    def __init__(self, patterns: list[str] = None, *, event: asyncio.Event = None, max_match_len: int = 256) -> None:
+        regexes = [re.escape(s) for s in CRASH_SIGNATURES]
+        if patterns:
+            regexes += patterns
+
+        self.pattern = re.compile("|".join(f"(?:{r})" for r in regexes).encode("utf-8"))
+        self.event = event if event is not None else asyncio.Event()
+        self.max_match_len = max_match_len
+
+        # keep the end of the previous chunk so a signature split over two reads is still found
+        self.tail = b""
+        self.crash_offset = None
+        self.crash_signature = None
+
+    def feed(self, data: bytes, offset: int) -> None:
+        if self.crash_offset is not None:
+            return
+
+        buf = self.tail + data
+        m = self.pattern.search(buf)
+        if m:
+            self.crash_offset = offset - len(self.tail) + m.start()
+            self.crash_signature = m.group(0).decode("utf-8", errors="replace")
+            logger.info(f"Crash signature detected on console: {self.crash_signature}")
+            self.event.set()
+
+        self.tail = buf[-self.max_match_len:]
+
+    def crashed(self) -> bool:
+        return self.crash_offset is not None
+
+    def reset(self) -> None:
+        self.tail = b""
+        self.crash_offset = None
+        self.crash_signature = None
+        self.event.clear()
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import re
+
+# Linux oops/panic, e.g. "pc : do_foo+0x1c/0x40" (arm64) or "epc : do_foo+0x1c/0x40" (riscv)
+linux_pc_pattern = re.compile(r"\be?pc\s*:\s*(\S+)")
+linux_panic_pattern = re.compile(r"Kernel panic - not syncing: ([^\r\n]*)")
+# OpenSBI, e.g. "sbi_trap_error: hart0: mcause=0x0000000000000005 mtval=0x0000000000000000"
+sbi_mcause_pattern = re.compile(r"mcause=(0x[0-9a-fA-F]+)")
+sbi_mepc_pattern = re.compile(r"mepc=(0x[0-9a-fA-F]+)")
+ta_panic_pattern = re.compile(r"TA panicked with code (0x[0-9a-fA-F]+)")
+optee_panic_pattern = re.compile(r"Panic (?:'[^']*' )?at (\S+:\d+)")
+
+def read_trace_tail(trace_log: str, num_pcs: int, *, block_size: int = 4096) -> list[str]:
+    """
+    Return the last num_pcs PCs of a trace log without reading the whole file.
+    """
+    if num_pcs <= 0 or not trace_log or not os.path.exists(trace_log):
+        return []
+
+    with open(trace_log, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        while pos > 0 and data.count(b"\n") <= num_pcs:
+            read_size = min(block_size, pos)
+            pos -= read_size
+            f.seek(pos)
+            data = f.read(read_size) + data
+
+    lines = [l.strip() for l in data.decode("utf-8", errors="replace").splitlines() if l.strip()]
+    # the first line may have been cut in the middle when we did not reach the beginning of the file
+    if pos > 0 and len(lines) > num_pcs:
+        lines = lines[1:]
+    return lines[-num_pcs:]
+
+def extract_crash_signature(console_logs: list[str], trace_log: str = None, *, trace_tail: int = 8) -> dict:
+    """
+    Build a crash signature from console output, or from the tail of the trace log if the console has no key.
+    Crashes with the same "bucket" value are considered the same bug.
+    """
+    console = "\n".join(log for log in console_logs if log)
+
+    kind = "unknown"
+    keys = []
+
+    m = ta_panic_pattern.search(console)
+    if m:
+        kind = "ta_panic"
+        keys.append(m.group(1))
+
+    m = optee_panic_pattern.search(console)
+    if m:
+        kind = "optee_panic"
+        keys.append(m.group(1))
+
+    if "sbi_trap_error" in console:
+        kind = "sbi_trap_error"
+        for pattern in (sbi_mcause_pattern, sbi_mepc_pattern):
+            m = pattern.search(console)
+            if m:
+                keys.append(m.group(1))
+
+    m = linux_pc_pattern.search(console)
+    if m:
+        kind = "kernel_oops" if kind == "unknown" else kind
+        keys.append(m.group(1))
+
+    m = linux_panic_pattern.search(console)
+    if m:
+        kind = "kernel_panic" if kind in ("unknown", "kernel_oops") else kind
+        keys.append(m.group(1).strip())
+
+    # the guest keeps running until it is torn down, so the trace tail depends on where QEMU stopped
+    # and would split one bug into many buckets, it is only used when the console has nothing better
+    pcs = read_trace_tail(trace_log, trace_tail) if not keys else []
+
+    canonical = "|".join([kind] + keys + pcs)
+    bucket = hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+    return {
+        "bucket": bucket,
+        "kind": kind,
+        "keys": keys,
+        "pcs": pcs,
+    }
+
+def read_console_logs(test_dir: str) -> list[str]:
+    logs = []
+    for name in ("console0.log", "console1.log"):
+        path = os.path.join(test_dir, name)
+        if os.path.exists(path):
+            with open(path, "r", errors="replace") as f:
+                logs.append(f.read())
+    return logs
+
+def extract_crash_signature_from_dir(test_dir: str, trace_tail: int = 8) -> tuple[str, dict]:
+    """
+    Signature of an already saved test dir. Top level so it can be used with a process pool.
+    """
+    trace_log = os.path.join(test_dir, "qemu_trace_log.log")
+    return test_dir, extract_crash_signature(read_console_logs(test_dir), trace_log, trace_tail=trace_tail)
@@ -1,17 +1,61 @@
 import asyncio
 import json
 import os
+from datetime import datetime
 
 class CrashedTestcaseManager:
-    def __init__(self) -> None:
+    def __init__(self, local_work_dir: str = None) -> None:
+        # one representative testcase per crash bucket
         self.testcases = []
-        self.lock = asyncio.Lock() 
+        self.buckets = {}
+        self.local_work_dir = local_work_dir
+        self.lock = asyncio.Lock()
 
-    async def add_crashed_testcase(self, testcase: dict) -> None:
+    async def add_crashed_testcase(self, testcase: dict, localdir: str = None, signature: dict = None) -> bool:
+        """
+        Count the crash in its bucket. Returns True if this is the first crash of the bucket.
+        """
         async with self.lock:
+            if signature is None:
+                self.testcases.append(testcase)
+                return True
+
+            now = datetime.now().isoformat(timespec="seconds")
+            bucket_id = signature["bucket"]
+            bucket = self.buckets.get(bucket_id)
+            if bucket is not None:
+                bucket["count"] += 1
+                bucket["last_seen"] = now
+                self.save_buckets()
+                return False
+
+            self.buckets[bucket_id] = {
+                **signature,
+                "count": 1,
+                "first_seen": now,
+                "last_seen": now,
+                "representative": localdir,
+                "params": testcase,
+            }
             self.testcases.append(testcase)
+            self.save_buckets()
+            return True
+
+    def unique_crash_count(self) -> int:
+        return len(self.buckets)
+
+    def total_crash_count(self) -> int:
+        return sum(bucket["count"] for bucket in self.buckets.values())
 
-    def save_params(self, localdir: str, seed: dict):
+    def save_buckets(self) -> None:
+        if self.local_work_dir is None:
+            return
+
+        filename = f"{self.local_work_dir}/crash_buckets.json"
+        with open(filename, "w") as f:
+            json.dump(self.buckets, f, indent=4, default=str)
+
+    def save_params(self, localdir: str, seed: dict, signature: dict = None):
         filename = f"{localdir}/saved_seed.json"
         with open(filename, "w") as f:
             json.dump(seed, f, indent=4)
@@ -20,6 +64,7 @@ class CrashedTestcaseManager:
         testdir = os.path.basename(localdir)
         with open(crash_flag_file, "w") as f:
             f.write(f"{testdir}")
-            
-
 
+        if signature is not None:
+            with open(f"{localdir}/crash_signature.json", "w") as f:
+                json.dump(signature, f, indent=4)
@@ -0,0 +1,127 @@
+import logging
+logger = logging.getLogger("mtcfuzz")
+
+import socket
+import time
+
+from .ssh_error import SSHError
+
+class ExecutorError(SSHError):
+    """
+    Raised when the in-guest executor does not answer, handled like an SSH failure (maybe a crash).
+    """
+    pass
+
+class ExecutorClient:
+    """
+    Host side of test_harnesses/executor. Commands go over a virtio-serial port whose chardev
+    is a unix socket, exec_command() returns the same dict as SSHClient.exec_command().
+    """
+    # seconds the host waits for an answer after the executor should have killed the command
+    GUEST_TIMEOUT_MARGIN = 1
+
+    def __init__(self, config: dict, socket_path: str) -> None:
+        self.socket_path = socket_path
+        self.remote_command_exec_timeout = config["fuzzing"].get("remote_command_exec_timeout", 2)
+        self.sock = None
+        self.rfile = None
+        self.request_id = 0
+
+    def connect(self, *, retry_max: int = 50, retry_interval: float = 0.1) -> bool:
+        self.close()
+        for _ in range(retry_max):
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.socket_path)
+                self.sock = sock
+                self.rfile = sock.makefile("rb")
+                return True
+            except OSError:
+                sock.close()
+                time.sleep(retry_interval)
+
+        logger.error(f"Failed to connect to executor socket {self.socket_path}")
+        return False
+
+    def shutdown(self) -> None:
+        """
+        Wake up a thread blocked on a response, callable from any thread. The connection is
+        closed by the thread running exec_command() or by the next connect().
+        """
+        sock = self.sock
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        if self.rfile:
+            self.rfile.close()
+            self.rfile = None
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def _read_response(self, rfile) -> tuple[str, int, int, bytes, bytes, bool]:
+        header = rfile.readline()
+        if not header:
+            raise ExecutorError("executor closed the connection")
+
+        fields = header.split()
+        # executors without the command timeout have no <timed out> field
+        if len(fields) not in (6, 7) or fields[0] != b"DONE":
+            raise ExecutorError(f"invalid executor response: {header!r}")
+
+        request_id = fields[1].decode()
+        returncode, elapsed_us, stdout_len, stderr_len = (int(x) for x in fields[2:6])
+        timed_out = len(fields) == 7 and fields[6] == b"1"
+        stdout = rfile.read(stdout_len)
+        stderr = rfile.read(stderr_len)
+        if len(stdout) != stdout_len or len(stderr) != stderr_len:
+            raise ExecutorError("executor closed the connection")
+
+        return request_id, returncode, elapsed_us, stdout, stderr, timed_out
+
+    def exec_command(self, cmd: str, *, retry_max: int = None, connect_time_out: int = 5, remote_command_exec_timeout: int = None,
+                     guest_timing: bool = False) -> dict:
+        # retry_max, connect_time_out and guest_timing are accepted for compatibility with SSHClient.exec_command(),
+        # the executor always times the command in the guest
+        if self.sock is None and not self.connect():
+            raise ExecutorError(f"not connected: {cmd}")
+
+        rce_timeout = remote_command_exec_timeout if remote_command_exec_timeout is not None else self.remote_command_exec_timeout
+
+        self.request_id += 1
+        request_id = str(self.request_id)
+        data = cmd.encode()
+
+        sock, rfile = self.sock, self.rfile
+        start = time.perf_counter()
+        try:
+            # the executor kills the command at rce_timeout, the margin lets its answer arrive
+            sock.settimeout(rce_timeout + self.GUEST_TIMEOUT_MARGIN)
+            sock.sendall(f"RUN {request_id} {len(data)} {int(rce_timeout * 1000)}\n".encode() + data)
+
+            while True:
+                res_id, returncode, elapsed_us, stdout, stderr, timed_out = self._read_response(rfile)
+                # skip late answers to requests that timed out before
+                if res_id == request_id:
+                    break
+        except (OSError, ExecutorError) as e:
+            # the stream can't be trusted after a timeout or a broken frame
+            self.close()
+            raise ExecutorError(f"exec_command(): {e}: {cmd}")
+        end = time.perf_counter()
+
+        if timed_out:
+            # like an SSH timeout, but the stream is still in sync
+            raise ExecutorError(f"exec_command(): killed after {rce_timeout} seconds in the guest: {cmd}")
+
+        return {
+            "returncode": returncode,
+            "stdout": stdout.decode("utf-8", errors="replace"),
+            "stderr": stderr.decode("utf-8", errors="replace"),
+            "elapsed_us": (end - start) * 1_000_000,
+            "guest_elapsed_us": elapsed_us,
+        }
@@ -2,7 +2,25 @@ from .fuzzer_lib import *
 import logging
 logger = logging.getLogger("mtcfuzz")
 
+import os
+import shutil
+
+HARNESS_OUTPUT_MODES = ("none", "stdout", "remote_dir", "hostshare")
+
 class FuzzerBase:
+    # Target specific regexes matched on the console stream in addition to fuzzer_lib.CRASH_SIGNATURES
+    crash_patterns: list[str] = []
+
+    # Where the harness leaves its per-test output, overridable with fuzzing.harness_output:
+    #   "none":       nothing is kept
+    #   "stdout":     stdout/stderr of the harness only
+    #   "remote_dir": a per-test directory in the guest, fetched with scp after the test
+    #   "hostshare":  a per-test directory on the 9p share, already on the host after the test
+    harness_output: str = "remote_dir"
+
+    # True if run_batch()/split_batch_trace() are implemented
+    supports_batch: bool = False
+
     def __init__(self, config: dict, task_id: str, ssh_client: "SSHClient") -> None:
         self.config = config
         self.remote_work_dir = self.config["fuzzing"].get("remote_work_dir", "/root/work")
@@ -18,8 +36,17 @@ class FuzzerBase:
             self.remote_harness_path = f"{self.remote_work_dir}/{self.harness_name}"
 
         self.ssh_client = ssh_client
+        # runs the harness, anything with SSHClient.exec_command()
+        self.executor = ssh_client
         self.test_dir = None
 
+        self.harness_output = self.config["fuzzing"].get("harness_output", self.harness_output)
+        if self.harness_output not in HARNESS_OUTPUT_MODES:
+            raise ValueError(f"Unknown harness_output {self.harness_output}, must be one of {HARNESS_OUTPUT_MODES}")
+        # set by the subclass when the harness output goes through the 9p share
+        self.hostshare_dir = None
+        self.remote_hostshare_dir = None
+
         self.started = False
         self.machine_info_dir = f"{task_id}-{self.config['fuzzing'].get('machine_info_dir', 'machine_info')}"
         self.task_id = task_id
@@ -43,6 +70,55 @@ class FuzzerBase:
         self.test_dir = f"{self.remote_work_dir}/{test_dir}"
         return self.ssh_client.exec_command(f"mkdir -p {self.test_dir}")
 
+    def setup_test_dir(self, test_dir: str) -> None:
+        """
+        Prepare the directory the harness writes to for this test. self.test_dir is None if there is none.
+        """
+        if self.harness_output == "remote_dir":
+            self.create_remote_test_dir(test_dir)
+        elif self.harness_output == "hostshare":
+            # created on the host side, the guest sees it through the 9p mount
+            os.makedirs(f"{self.hostshare_dir}/{test_dir}", exist_ok=True)
+            self.test_dir = f"{self.remote_hostshare_dir}/{test_dir}"
+        else:
+            self.test_dir = None
+
+    def collect_test_output(self, local_test_dir: str, *, fetch_remote: bool = True) -> None:
+        """
+        Move the harness output of this test into local_test_dir.
+        fetch_remote is False when the guest is not usable anymore (e.g. after a crash).
+        """
+        if self.harness_output == "remote_dir":
+            if fetch_remote and self.test_dir:
+                self.ssh_client.copy_remote_files(self.test_dir, os.path.dirname(local_test_dir))
+        elif self.harness_output == "hostshare":
+            shared_dir = f"{self.hostshare_dir}/{os.path.basename(local_test_dir)}"
+            if not os.path.isdir(shared_dir):
+                return
+            os.makedirs(local_test_dir, exist_ok=True)
+            for name in os.listdir(shared_dir):
+                shutil.move(os.path.join(shared_dir, name), os.path.join(local_test_dir, name))
+            os.rmdir(shared_dir)
+
+    def run_batch(self, fuzz_data_list: list[dict]) -> dict:
+        """
+        Run several inputs in one harness invocation. The result is the exec_command() dict
+        plus "results", one exec_command() like dict per input that finished.
+        """
+        raise NotImplementedError("run_batch() must be implemented in the subclass")
+
+    def split_batch_trace(self, cover_pcs: list[str]) -> list[list[str]]:
+        """
+        Split the trace of a batch into one segment per input that started.
+        """
+        raise NotImplementedError("split_batch_trace() must be implemented in the subclass")
+
+    def relocate_coverage(self, coverage: "Coverage") -> None:
+        """
+        Called after every (re)boot, move the address filters of code whose load address changes between boots.
+        """
+        pass
+
     def is_qemu_target(self) -> bool:
         return self.config.get("target_type") == "qemu"
 
@@ -1,5 +1,30 @@
 import json
 import pprint
+import re
+
+CRASH_SIGNATURES = [
+    "sbi_trap_error",
+    "TA panicked with code",
+    "Kernel panic",
+]
+
+# regexes of the OP-TEE fuzzers, matched on the console stream in addition to CRASH_SIGNATURES
+OPTEE_CRASH_PATTERNS = [
+    # OP-TEE core panic, e.g. "Panic 'msg' at core/kernel/foo.c:123 <func>"
+    r"Panic (?:'[^']*' )?at \S+:\d+",
+]
+
+# printk lines with CONFIG_PRINTK_TIME, e.g. "[   12.345678] sbi_fuzz: ..."
+KERNEL_LOG_LINE = re.compile(rb"^\s*\[\s*\d+\.\d+\].*$", re.MULTILINE)
+
+def extract_kernel_log(console: bytes) -> str:
+    """
+    Pick the kernel messages out of a console capture, what dmesg would show for the same period.
+    """
+    lines = [line.rstrip(b"\r") for line in KERNEL_LOG_LINE.findall(console)]
+    if not lines:
+        return ""
+    return b"\n".join(lines).decode("utf-8", errors="replace") + "\n"
 
 def save_cmd_output(buffer: str, output_file: str) -> None:
     if not buffer:
@@ -12,19 +37,9 @@ def read_json(file_path: str) -> dict:
     with open(file_path, 'r') as f:
         return json.load(f)
     
-def is_crashed(test_result: str) -> bool:
-    console_log = None
-    with open(test_result) as f:
-        console_log = f.read()
-    
-    # pprint.pprint(console_log)
-    if "sbi_trap_error" in console_log:
-        return True
-    
-    if "TA panicked with code" in console_log:
-        return True
-    
-    if "Kernel panic" in console_log:
-        return True
-    
-    return False
\ No newline at end of file
+def exec_elapsed_us(exec_result: dict) -> float:
+    """
+    Execution time of a test, measured in the guest when available.
+    """
+    guest_elapsed_us = exec_result.get("guest_elapsed_us")
+    return guest_elapsed_us if guest_elapsed_us is not None else exec_result["elapsed_us"]
@@ -0,0 +1,45 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+class PageDigests:
+    """
+    Digest of the inputs of every generated page, kept in <html_dir>/.page_digests.json
+    so a page is only rendered again when its inputs changed.
+    """
+    FILE_NAME = ".page_digests.json"
+
+    def __init__(self, html_dir: str) -> None:
+        self.html_dir = html_dir
+        self.path = os.path.join(html_dir, self.FILE_NAME)
+        try:
+            with open(self.path, "r") as f:
+                self.digests = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.digests = {}
+
+    @staticmethod
+    def digest(*inputs) -> str:
+        return hashlib.sha256(json.dumps(inputs, default=str).encode()).hexdigest()
+
+    def is_current(self, page: str, digest: str) -> bool:
+        return self.digests.get(page) == digest and os.path.exists(os.path.join(self.html_dir, page))
+
+    def update(self, page: str, digest: str) -> None:
+        self.digests[page] = digest
+
+    def save(self) -> None:
+        tmp_file = f"{self.path}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self.digests, f)
+        os.replace(tmp_file, self.path)
+
+def map_pages(fn, tasks: list[tuple], jobs: int) -> list:
+    """
+    fn(*task) for every task, in a process pool when there is more than one job and task.
+    """
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(fn, *zip(*tasks), chunksize=8))
+    return [fn(*task) for task in tasks]
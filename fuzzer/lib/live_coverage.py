@@ -0,0 +1,298 @@
+import logging
+logger = logging.getLogger("mtcfuzz")
+
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .symbolizer import SymbolCache, Symbolizer
+from .ta_layout import TA_TARGET
+
+TARGETS = ("kernel", "firmware")
+# TA PCs are taken out of the firmware PCs of each task with the load address of its current boot, see Coverage.relocated
+BINARY_TARGETS = TARGETS + (TA_TARGET,)
+
+def binaries_from_config(config: dict) -> dict[str, tuple[str, int]]:
+    """
+    {target: (ELF path, load address subtracted from each PC)} from config["fuzzing"]
+    "kernel_binary"/"firmware_binary"/"ta_binary" and "kernel_base_addr"/"firmware_base_addr".
+    TA PCs are offsets from the load address already, the base of the TA is 0.
+    """
+    binaries = {}
+    for target in BINARY_TARGETS:
+        elf = config["fuzzing"].get(f"{target}_binary")
+        if not elf:
+            continue
+        if not os.path.exists(elf):
+            logger.warning(f"Live coverage: {target} binary {elf} not found, its PCs are not symbolized")
+            continue
+        binaries[target] = (elf, int(config["fuzzing"].get(f"{target}_base_addr", "0x0"), 16))
+    return binaries
+
+class LiveCoverage:
+    """
+    Campaign-wide coverage of all tasks, symbolized while the campaign runs and served as
+    /coverage (JSON) and /coverage.html by CampaignStats.
+
+    Every new PC is symbolized once, in a worker thread, through the shared symbol cache.
+    Files and functions carry the generation they last changed in, so /coverage?since=<generation>
+    returns only what changed after an earlier response.
+    """
+    def __init__(self, campaign_stats: "CampaignStats", binaries: dict[str, tuple[str, int]], *,
+                 addr2line: str = "addr2line", symbol_cache: str = None, max_history: int = 2000) -> None:
+        self.campaign_stats = campaign_stats
+        self.binaries = binaries
+        self.addr2line = addr2line
+        self.symbol_cache = symbol_cache
+        self.max_history = max_history
+
+        # target -> pc -> (file key, function key)
+        self.pcs = {target: {} for target in BINARY_TARGETS}
+        self.files = {}
+        self.functions = {}
+        self.generation = 0
+        # [generation, time, pcs, lines]
+        self.history = []
+
+        # addr2line and the sqlite cache live in this one thread
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="live-coverage")
+        self.cache = None
+        self.symbolizers = {}
+
+        campaign_stats.add_route("/coverage", self.coverage_json, "application/json")
+        campaign_stats.add_route("/coverage.html", self.coverage_html, "text/html; charset=utf-8")
+
+    def _collect_hits(self) -> dict[str, dict[int, int]]:
+        hits = {target: {} for target in BINARY_TARGETS}
+        for task in self.campaign_stats.tasks.values():
+            coverage = task["coverage"]
+            for target, cov in zip(TARGETS, coverage.get_coverages()):
+                # the load address of relocated code differs between tasks and boots
+                relocated = [(hits[name], lower, upper, base_addr) for name, (reloc_target, lower, upper, base_addr)
+                             in coverage.relocated.items() if reloc_target == target and name in hits]
+                target_hits = hits[target]
+                for pc, count in cov.items():
+                    pc_hits, key = target_hits, pc
+                    for reloc_hits, lower, upper, base_addr in relocated:
+                        if lower <= pc <= upper:
+                            pc_hits, key = reloc_hits, pc - base_addr
+                            break
+                    pc_hits[key] = pc_hits.get(key, 0) + count
+        return hits
+
+    def _symbolize(self, target: str, pcs: list[int]) -> dict[int, tuple]:
+        if target not in self.binaries:
+            return {pc: ("??", "??", None) for pc in pcs}
+
+        elf, base_addr = self.binaries[target]
+        symbolizer = self.symbolizers.get(target)
+        if symbolizer is None:
+            if self.cache is None:
+                self.cache = SymbolCache(self.symbol_cache)
+            symbolizer = self.symbolizers[target] = Symbolizer(self.addr2line, elf, self.cache)
+
+        symbols = symbolizer.symbolize([pc - base_addr for pc in pcs])
+        return {pc: symbols[pc - base_addr] for pc in pcs}
+
+    def _close_symbolizers(self) -> None:
+        for symbolizer in self.symbolizers.values():
+            symbolizer.close()
+        self.symbolizers = {}
+        if self.cache:
+            self.cache.close()
+            self.cache = None
+
+    @staticmethod
+    def _new_entry(target: str, now: float) -> dict:
+        return {"target": target, "pcs": 0, "lines": set(), "hits": 0, "first_seen": now, "last_new": now, "generation": 0}
+
+    async def update(self) -> None:
+        # the coverage dicts are only read on the event loop, the tasks update them there
+        hits = self._collect_hits()
+        loop = asyncio.get_running_loop()
+        symbols = {}
+        for target in BINARY_TARGETS:
+            new_pcs = [pc for pc in hits[target] if pc not in self.pcs[target]]
+            if new_pcs:
+                symbols[target] = await loop.run_in_executor(self.executor, self._symbolize, target, new_pcs)
+
+        self.generation += 1
+        now = time.time()
+        for target, target_symbols in symbols.items():
+            for pc, (function, file, line) in target_symbols.items():
+                file_key = file if file != "??" else f"{target}:??"
+                function_key = f"{target}:{function}"
+                self.pcs[target][pc] = (file_key, function_key)
+
+                for entries, key in ((self.files, file_key), (self.functions, function_key)):
+                    entry = entries.get(key)
+                    if entry is None:
+                        entry = entries[key] = self._new_entry(target, now)
+                    entry["pcs"] += 1
+                    entry["last_new"] = now
+                    entry["generation"] = self.generation
+                    if line is not None:
+                        entry["lines"].add(line)
+
+        file_hits = {}
+        function_hits = {}
+        for target in BINARY_TARGETS:
+            pc_keys = self.pcs[target]
+            for pc, count in hits[target].items():
+                file_key, function_key = pc_keys[pc]
+                file_hits[file_key] = file_hits.get(file_key, 0) + count
+                function_hits[function_key] = function_hits.get(function_key, 0) + count
+
+        for entries, entry_hits in ((self.files, file_hits), (self.functions, function_hits)):
+            for key, count in entry_hits.items():
+                entry = entries[key]
+                if entry["hits"] != count:
+                    entry["hits"] = count
+                    entry["generation"] = self.generation
+
+        total_pcs = sum(len(pcs) for pcs in self.pcs.values())
+        total_lines = sum(len(entry["lines"]) for entry in self.files.values())
+        if not self.history or self.history[-1][2:] != [total_pcs, total_lines] or symbols:
+            self.history.append([self.generation, now, total_pcs, total_lines])
+            if len(self.history) > self.max_history:
+                # keep the start of the campaign and the latest sample, thin out the rest
+                self.history = self.history[:1] + self.history[1:-1:2] + self.history[-1:]
+
+    @staticmethod
+    def _entries_json(entries: dict, since: int) -> dict:
+        return {
+            key: {
+                "target": entry["target"],
+                "pcs": entry["pcs"],
+                "lines": len(entry["lines"]),
+                "hits": entry["hits"],
+                "first_seen": entry["first_seen"],
+                "last_new": entry["last_new"],
+            }
+            for key, entry in entries.items() if entry["generation"] > since
+        }
+
+    def coverage_json(self, query: dict = None) -> bytes:
+        try:
+            since = int((query or {}).get("since", ["0"])[0])
+        except ValueError:
+            since = 0
+        return json.dumps({
+            "generation": self.generation,
+            "time": time.time(),
+            "total": {
+                **{f"{target}_pcs": len(self.pcs[target]) for target in BINARY_TARGETS},
+                "files": len(self.files),
+                "functions": len(self.functions),
+                "lines": sum(len(entry["lines"]) for entry in self.files.values()),
+            },
+            "history": [point for point in self.history if point[0] > since],
+            "files": self._entries_json(self.files, since),
+            "functions": self._entries_json(self.functions, since),
+        }).encode()
+
+    def coverage_html(self, query: dict = None) -> bytes:
+        return COVERAGE_PAGE.encode()
+
+    async def run(self, interval: float = 10) -> None:
+        while True:
+            try:
+                await self.update()
+            except Exception as e:
+                logger.warning(f"Live coverage update failed: {e}")
+            await asyncio.sleep(interval)
+
+    def close(self) -> None:
+        self.executor.submit(self._close_symbolizers).result()
+        self.executor.shutdown()
+
+COVERAGE_PAGE = """<html><head><title>Live coverage</title><style>
+body { font-family: sans-serif; padding: 8px; }
+table { border-collapse: collapse; margin-bottom: 30px; }
+td, th { padding: 2px 8px; text-align: right; }
+td.name { text-align: left; font-family: monospace; }
+th { background-color: #eaeaea; cursor: pointer; }
+tr.recent { background-color: #ddffdd; }
+svg { border: 1px solid #ccc; }
+#error { color: #c00000; }
+</style></head><body>
+<h2>Live coverage</h2>
+<div id="total"></div>
+<div id="error"></div>
+<svg id="growth" width="800" height="200"></svg>
+<h3>Files</h3><table id="files"></table>
+<h3>Functions</h3><table id="functions"></table>
+<script>
+var generation = 0, growthHistory = [], files = {}, functions = {}, sortKey = "last_new";
+// entries with new PCs within this many seconds are highlighted
+var RECENT = 60;
+
+function esc(s) {
+    return String(s).replace(/[&<>"']/g, function (c) { return "&#" + c.charCodeAt(0) + ";"; });
+}
+
+function age(t, now) {
+    var s = Math.round(now - t);
+    return s < 60 ? s + "s" : s < 3600 ? Math.round(s / 60) + "m" : (s / 3600).toFixed(1) + "h";
+}
+
+function renderTable(id, entries, now) {
+    var keys = Object.keys(entries).sort(function (a, b) { return entries[b][sortKey] - entries[a][sortKey]; });
+    var rows = ["<tr><th>name</th><th>target</th><th onclick=\\"sortBy('pcs')\\">PCs</th>" +
+                "<th onclick=\\"sortBy('lines')\\">lines</th><th onclick=\\"sortBy('hits')\\">hits</th>" +
+                "<th onclick=\\"sortBy('last_new')\\">last new</th><th onclick=\\"sortBy('first_seen')\\">first seen</th></tr>"];
+    keys.slice(0, 500).forEach(function (key) {
+        var e = entries[key];
+        rows.push("<tr class='" + (now - e.last_new < RECENT ? "recent" : "") + "'><td class='name'>" + esc(key) +
+                  "</td><td>" + e.target + "</td><td>" + e.pcs + "</td><td>" + e.lines + "</td><td>" + e.hits +
+                  "</td><td>" + age(e.last_new, now) + "</td><td>" + age(e.first_seen, now) + "</td></tr>");
+    });
+    document.getElementById(id).innerHTML = rows.join("");
+}
+
+function renderGrowth() {
+    var svg = document.getElementById("growth");
+    if (growthHistory.length < 2) { return; }
+    var t0 = growthHistory[0][1], t1 = growthHistory[growthHistory.length - 1][1], max = growthHistory[growthHistory.length - 1][2] || 1;
+    var points = growthHistory.map(function (p) {
+        return ((p[1] - t0) / ((t1 - t0) || 1) * 790 + 5).toFixed(1) + "," + (195 - p[2] / max * 190).toFixed(1);
+    });
+    svg.innerHTML = "<polyline fill='none' stroke='#004080' points='" + points.join(" ") + "'/>" +
+                    "<text x='8' y='16' font-size='12'>" + max + " PCs</text>";
+}
+
+function render(now) {
+    renderTable("files", files, now);
+    renderTable("functions", functions, now);
+    renderGrowth();
+}
+
+function sortBy(key) {
+    sortKey = key;
+    render(Date.now() / 1000);
+}
+
+function poll() {
+    fetch("coverage?since=" + generation).then(function (r) {
+        if (!r.ok) { throw new Error("HTTP " + r.status); }
+        return r.json();
+    }).then(function (data) {
+        Object.assign(files, data.files);
+        Object.assign(functions, data.functions);
+        growthHistory = growthHistory.concat(data.history);
+        generation = data.generation;
+        var t = data.total;
+        document.getElementById("total").textContent = "kernel PCs: " + t.kernel_pcs + ", firmware PCs: " + t.firmware_pcs +
+            ", TA PCs: " + t.ta_pcs + ", files: " + t.files + ", functions: " + t.functions + ", lines: " + t.lines;
+        render(data.time);
+        document.getElementById("error").textContent = "";
+    }).catch(function (e) {
+        document.getElementById("error").textContent = "Failed to update: " + e;
+    }).finally(function () { setTimeout(poll, 5000); });
+}
+
+poll();
+</script></body></html>
+"""
@@ -0,0 +1,127 @@
+import contextvars
+import logging
+import logging.handlers
+import queue
+import time
+
+LOG_FORMAT = "%(asctime)s:%(levelname)s: %(message)s"
+
+# set at the top of each fuzzing task, asyncio tasks and asyncio.to_thread() inherit it
+current_task_id = contextvars.ContextVar("mtcfuzz_task_id", default=None)
+
+class TaskContextFilter(logging.Filter):
+    """
+    Tag records with the task they were logged from. Runs in the caller, before the record is queued.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.task_id = current_task_id.get()
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through at most one record per interval for each task and rate_limit key.
+    Messages opt in with extra={"rate_limit": "<key>"}, the number of dropped records
+    is appended to the next one that passes.
+    """
+    def __init__(self, interval: float) -> None:
+        super().__init__()
+        self.interval = interval
+        self.last_emit = {}
+        self.suppressed = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate_limit = getattr(record, "rate_limit", None)
+        if rate_limit is None or self.interval <= 0:
+            return True
+
+        key = (getattr(record, "task_id", None), rate_limit)
+        now = time.monotonic()
+        if now - self.last_emit.get(key, -self.interval) < self.interval:
+            self.suppressed[key] = self.suppressed.get(key, 0) + 1
+            return False
+
+        self.last_emit[key] = now
+        suppressed = self.suppressed.pop(key, 0)
+        if suppressed:
+            record.msg = f"{record.getMessage()} ({suppressed} similar messages suppressed)"
+            record.args = None
+        return True
+
+class TaskFileHandler(logging.Handler):
+    """
+    Write each record only into the log file of the task that logged it.
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.handlers = {}
+
+    def add_task(self, task_id: str, log_file: str) -> None:
+        handler = logging.FileHandler(log_file, mode="a", encoding="utf-8")
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        self.handlers[task_id] = handler
+
+    def remove_task(self, task_id: str) -> None:
+        handler = self.handlers.pop(task_id, None)
+        if handler:
+            handler.close()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        handler = self.handlers.get(getattr(record, "task_id", None))
+        if handler:
+            handler.handle(record)
+
+    def close(self) -> None:
+        for task_id in list(self.handlers):
+            self.remove_task(task_id)
+        super().close()
+
+_listener = None
+_queue_handler = None
+_task_file_handler = None
+
+def start_logging(logger: logging.Logger, *, rate_limit_seconds: float = 1.0) -> None:
+    """
+    Move the console and per-task file output of the logger to a background QueueListener thread,
+    so the fuzzing loop only pays for putting records on a queue.
+    """
+    global _listener, _queue_handler, _task_file_handler
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    _queue_handler.addFilter(TaskContextFilter())
+    _queue_handler.addFilter(RateLimitFilter(rate_limit_seconds))
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    _task_file_handler = TaskFileHandler()
+
+    _listener = logging.handlers.QueueListener(log_queue, console_handler, _task_file_handler)
+    _listener.start()
+
+    logger.addHandler(_queue_handler)
+    # the root handler of basicConfig would write synchronously again
+    logger.propagate = False
+
+def stop_logging(logger: logging.Logger) -> None:
+    """
+    Flush the queued records, close the log files and give the logger back to the root handler.
+    """
+    global _listener, _queue_handler, _task_file_handler
+    if _listener is None:
+        return
+
+    logger.removeHandler(_queue_handler)
+    logger.propagate = True
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _queue_handler = None
+    _task_file_handler = None
+
+def add_task_log(task_id: str, log_file: str) -> None:
+    current_task_id.set(task_id)
+    if _task_file_handler:
+        _task_file_handler.add_task(task_id, log_file)
@@ -1,18 +1,23 @@
 from ..qemu_fuzzer import QemuFuzzer
+from ..fuzzer_lib import OPTEE_CRASH_PATTERNS
 
-import shutil
 import os
 from .optee_mutator import OPTeeMutator
 import pprint
 
 class OpteeFuzzer(QemuFuzzer):
+    crash_patterns = OPTEE_CRASH_PATTERNS
+    # xtest/tpm2 tools report everything on stdout
+    harness_output = "stdout"
+
     def __init__(self, config: dict, task_id: int, ssh_client: "SSHClient", 
                  qmp_socket_path: str, serial_socket_path0: str, serial_socket_path1: str, gdb_port: int) -> None:
         super().__init__(config, task_id, ssh_client, qmp_socket_path, serial_socket_path0, serial_socket_path1, gdb_port)
 
         self.working_dir = self.local_work_dir + "/bin"
 
-        self.hostshare_dir = self.local_work_dir + "/hostshare"
+        # per task, the 9p share carries the fuzz input and tasks run their harnesses concurrently
+        self.hostshare_dir = f"{self.local_work_dir}/{task_id}-hostshare"
         os.makedirs(self.hostshare_dir, exist_ok=True)
 
         self.remote_hostshare_dir = self.config["fuzzing"]["hostshare_9p"]
@@ -34,13 +39,9 @@ class OpteeFuzzer(QemuFuzzer):
         from_path = self.config["fuzzing"]["optee_artifact_dir"]
         to_path = self.working_dir
 
-        shutil.copytree(from_path, to_path, symlinks=True)
-
-        return True
+        return self.artifact_stager.stage_tree(from_path, to_path)
 
     def create_qemu_params(self) -> list[str]:
-        shutil.copy(self.config['qemu_params']['initrd'], self.qemu_rootfs)
-        
         params = [
             self.config["qemu_params"]["qemu_path"],
             "-machine", "virt",
@@ -92,4 +93,4 @@ class OpteeFuzzer(QemuFuzzer):
         ]
 
         args_str = " ".join(args)
-        return self.ssh_client.exec_command(args_str, retry_max=1)
+        return self.executor.exec_command(args_str, retry_max=1, guest_timing=True)
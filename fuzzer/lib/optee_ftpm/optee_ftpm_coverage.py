@@ -1,9 +1,10 @@
 from ..coverage import Coverage
+from ..address_filter_index import filters_from_config
 
 class OPTEEFtpmCoverage(Coverage):
     def __init__(self, config: dict) -> None:
-        kernel_filters = config["address_filters"]["kernel"]
-        firmware_filters = config["address_filters"]["firmware"]
+        kernel_filters = filters_from_config(config, "kernel")
+        firmware_filters = filters_from_config(config, "firmware")
         ignore_kernel_coverage = config["fuzzing"]["ignore_kernel_coverage"]
         ignore_firmware_coverage = config["fuzzing"]["ignore_firmware_coverage"]
 
@@ -1,4 +1,5 @@
 from ..qemu_fuzzer import QemuFuzzer
+from ..fuzzer_lib import OPTEE_CRASH_PATTERNS
 import logging
 logger = logging.getLogger("mtcfuzz")
 
@@ -8,6 +9,7 @@ import os
 from .optee_ftpm_mutator import OPTeeFtpmMutator
 import time
 import re
+from ..ta_layout import TaLayoutMixin
 import pprint
 
 ftpm_ta_uuid = "bc50d971-d4c9-42c4-82cb-343fb7f37896"
@@ -18,14 +20,22 @@ ftpm_size_pattern = re.compile(
     rf"D/TC:\d+\s+\d+\s+early_ta_init:\d+\s+Early TA {re.escape(ftpm_ta_uuid)} size \d+ \(compressed, uncompressed (\d+)\)"
 )
 
-class OpteeFtpmFuzzer(QemuFuzzer):
+class OpteeFtpmFuzzer(TaLayoutMixin, QemuFuzzer):
+    crash_patterns = OPTEE_CRASH_PATTERNS
+    # xtest/tpm2 tools report everything on stdout
+    harness_output = "stdout"
+    ta_uuid = ftpm_ta_uuid
+    ta_load_pattern = ftpm_load_pattern
+    ta_size_pattern = ftpm_size_pattern
+
     def __init__(self, config: dict, task_id: int, ssh_client: "SSHClient", 
                  qmp_socket_path: str, serial_socket_path0: str, serial_socket_path1: str, gdb_port: int) -> None:
         super().__init__(config, task_id, ssh_client, qmp_socket_path, serial_socket_path0, serial_socket_path1, gdb_port)
 
         self.working_dir = self.local_work_dir + "/bin"
 
-        self.hostshare_dir = self.local_work_dir + "/hostshare"
+        # per task, the 9p share carries the fuzz input and tasks run their harnesses concurrently
+        self.hostshare_dir = f"{self.local_work_dir}/{task_id}-hostshare"
         os.makedirs(self.hostshare_dir, exist_ok=True)
         self.fuzz_input_file = self.hostshare_dir + "/fuzz_input.txt"
 
@@ -35,6 +45,9 @@ class OpteeFtpmFuzzer(QemuFuzzer):
 
         self.mutator = OPTeeFtpmMutator()
 
+        # the fTPM TA range of the firmware filters follows the load address logged at each boot
+        self.init_ta_layout(serial_socket_path1)
+
         #self.xtest_number = str(self.config["fuzzing"]["xtest_number"])
     def extra_qemu_params(self) -> list[str]:
         return [
@@ -49,13 +62,9 @@ class OpteeFtpmFuzzer(QemuFuzzer):
         from_path = self.config["fuzzing"]["optee_artifact_dir"]
         to_path = self.working_dir
 
-        shutil.copytree(from_path, to_path, symlinks=True)
-
-        return True
+        return self.artifact_stager.stage_tree(from_path, to_path)
 
     def create_qemu_params(self) -> list[str]:
-        shutil.copy(self.config['qemu_params']['initrd'], self.qemu_rootfs)
-        
         params = [
             self.config["qemu_params"]["qemu_path"],
             "-machine", "virt",
@@ -141,7 +150,8 @@ class OpteeFtpmFuzzer(QemuFuzzer):
             f.write(f"{payload_len}\n")
             f.write(f"{fuzz_data['payload']}\n")
 
-        # copy seed file to test dir
+        # copy seed file to test dir, it is only created up front with artifact_policy "all"
+        os.makedirs(self.local_test_dir, exist_ok=True)
         shutil.copy(self.fuzz_input_file, self.local_test_dir)
 
     def run_test(self, fuzz_data: dict) -> dict:
@@ -153,4 +163,4 @@ class OpteeFtpmFuzzer(QemuFuzzer):
         ]
 
         args_str = " ".join(args)
-        return self.ssh_client.exec_command(args_str, retry_max=1, remote_command_exec_timeout=5)
+        return self.executor.exec_command(args_str, retry_max=1, remote_command_exec_timeout=5, guest_timing=True)
@@ -0,0 +1,116 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram of integer microseconds.
+    Values below 2^sub_bucket_bits are exact, above that every power of two is split into
+    2^(sub_bucket_bits - 1) buckets, so the relative error stays below 2^-(sub_bucket_bits - 1).
+    """
+    def __init__(self, sub_bucket_bits: int = 7) -> None:
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value: int) -> int:
+        shift = value.bit_length() - self.sub_bucket_bits
+        if shift <= 0:
+            return value
+        return (shift << self.sub_bucket_bits) + (value >> shift)
+
+    def _lower_bound(self, index: int) -> int:
+        shift = index >> self.sub_bucket_bits
+        if shift == 0:
+            return index
+        return (index - (shift << self.sub_bucket_bits)) << shift
+
+    def record(self, value: int) -> None:
+        value = max(int(value), 0)
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> int:
+        if self.count == 0:
+            return 0
+
+        rank = max(1, round(self.count * p / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._lower_bound(index), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_us": self.total,
+            "mean_us": self.total / self.count if self.count else 0,
+            "min_us": self.min,
+            "max_us": self.max,
+            "p50_us": self.percentile(50),
+            "p90_us": self.percentile(90),
+            "p99_us": self.percentile(99),
+            # [bucket lower bound, count], enough to merge the histograms of several tasks
+            "buckets": [[self._lower_bound(index), self.counts[index]] for index in sorted(self.counts)],
+        }
+
+class PhaseStats:
+    """
+    Per-task latency histograms of the phases of the fuzzing loop, dumped to a json file.
+    """
+    def __init__(self, stats_file: str, *, dump_interval: int = 100, enabled: bool = True) -> None:
+        self.stats_file = stats_file
+        self.dump_interval = dump_interval
+        self.enabled = enabled
+        self.histograms = {}
+        self.started = time.time()
+        self.tests = 0
+
+    def record(self, phase: str, elapsed_us: float) -> None:
+        histogram = self.histograms.get(phase)
+        if histogram is None:
+            histogram = self.histograms[phase] = LatencyHistogram()
+        histogram.record(elapsed_us)
+
+    @contextmanager
+    def measure(self, phase: str):
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, (time.perf_counter() - start) * 1_000_000)
+
+    def count_test(self, num: int = 1) -> None:
+        self.tests += num
+        if self.enabled and self.tests // self.dump_interval != (self.tests - num) // self.dump_interval:
+            self.dump()
+
+    def dump(self) -> None:
+        if not self.enabled:
+            return
+
+        data = {
+            "tests": self.tests,
+            "uptime_seconds": time.time() - self.started,
+            "phases": {phase: histogram.to_dict() for phase, histogram in self.histograms.items()},
+        }
+        tmp_file = f"{self.stats_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_file, self.stats_file)
@@ -18,11 +18,12 @@ class PowerScheduler:
             raise ValueError(f"Unknown energy assignment function: {assing_energy_function}")
 
     def calculate_alpha(self, seed: dict, total_tested_count: int, total_elapsed_us: int) -> float:
-        used_count = seed["total_tested_count"]
+        timed_count = seed["timed_count"]
 
         # prevent division by zero
         avg_exec_us = total_elapsed_us / total_tested_count if total_tested_count > 0 else 1
-        exec_us = total_elapsed_us / used_count if used_count > 0 else avg_exec_us
+        # average execution time of this seed against the average of all tests
+        exec_us = seed["total_elapsed_us"] / timed_count if timed_count > 0 else avg_exec_us
 
         perf_score = 100
 
@@ -53,7 +54,7 @@ class PowerScheduler:
         # f(i)
         fi = max(seed.get("total_same_coverage_count", 0), 1)
 
-        logger.info(f"Assigning energy for seed {seed['id']} with s(i): {si}, f(i): {fi}")
+        logger.debug("Assigning energy for seed %s with s(i): %d, f(i): %d", seed["id"], si, fi)
 
         # α(i)
         alpha = self.calculate_alpha(seed, total_tested_count, total_elapsed_us)
@@ -71,9 +72,9 @@ class PowerScheduler:
         else:
             e = math.exp(log_e)
 
-        logger.info(
-            f"Calculated energy for seed {seed['id']}: {e} (α: {alpha}, β: {self.beta}, "
-            f"s(i): {si}, f(i): {fi}, log_e: {log_e:.3f})"
+        logger.debug(
+            "Calculated energy for seed %s: %s (α: %s, β: %s, s(i): %d, f(i): %d, log_e: %.3f)",
+            seed["id"], e, alpha, self.beta, si, fi, log_e
         )
         return e
 
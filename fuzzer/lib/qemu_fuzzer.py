@@ -5,6 +5,8 @@ import os
 
 from .fuzzer_base import FuzzerBase
 from .fuzzer_lib import *
+from .artifact_stager import ArtifactStager
+from .executor_client import ExecutorClient, ExecutorError
 
 import subprocess
 import signal
@@ -41,6 +43,13 @@ class QemuFuzzer(FuzzerBase):
         self.use_gdb = config["fuzzing"].get("use_gdb", False)
         self.working_dir = None
         self.first_boot = True
+        self.artifact_stager = ArtifactStager(config["fuzzing"].get("artifact_staging", "reflink"))
+
+        # "ssh": a login per harness run, "virtio-serial": the in-guest executor (test_harnesses/executor)
+        self.executor_socket_path = None
+        if config["fuzzing"].get("executor", "ssh") == "virtio-serial":
+            self.executor_socket_path = f"{self.local_work_dir}/qemu_fuzzer_{task_id}_executor.sock"
+            self.executor = ExecutorClient(config, self.executor_socket_path)
 
     def create_snapshot_storage(self) -> bool:
         if not os.path.exists(self.qemu_snapshot_storage):
@@ -96,11 +105,18 @@ class QemuFuzzer(FuzzerBase):
         if "initrd" in self.config["qemu_params"]:
             params += ["-initrd", self.config["qemu_params"]["initrd"]]
 
+        if self.executor_socket_path:
+            params += ["-device", "virtio-serial-device"]
+            params += ["-chardev", f"socket,id=exec0,path={self.executor_socket_path},server=on,wait=off"]
+            params += ["-device", "virtserialport,chardev=exec0,name=mtcfuzz.executor"]
+
         params += self.extra_qemu_params()
 
         if self.first_boot:
             self.copy_files()
             self.first_boot = False
+        else:
+            self.reset_files()
 
         if "rootfs" in self.config["qemu_params"]:
             self.rootfs_device_name = "rootfs0"
@@ -134,10 +150,17 @@ class QemuFuzzer(FuzzerBase):
         self.started = True
         return True
 
+    def reset_files(self) -> None:
+        # Called on every restart after the first boot. Nothing to do unless files are staged per boot.
+        pass
+
     async def initial_setup(self, local_work_dir: str, first_run: bool) -> tuple[bool, int]:
         try:
             self.prepare_harness()
 
+            if not self.start_executor():
+                return False, -1
+
             if first_run:
                 self.create_remote_test_dir(self.machine_info_dir)
 
@@ -160,6 +183,31 @@ class QemuFuzzer(FuzzerBase):
             traceback.print_exc()
             return False, -1
     
+    def start_executor(self) -> bool:
+        if self.executor_socket_path is None:
+            return True
+
+        remote_executor_path = f"{self.remote_work_dir}/mtcfuzz-executor"
+        self.ssh_client.exec_command(f"mkdir -p {self.remote_work_dir}")
+        self.ssh_client.send_file(self.config["fuzzing"]["executor_binary"], remote_executor_path)
+        # detach from the SSH session, it is part of the snapshot from now on
+        exec_result = self.ssh_client.exec_command(f"nohup {remote_executor_path} </dev/null >/dev/null 2>&1 &")
+        if not exec_result["returncode"] == 0:
+            logger.error(f"Failed to start executor: {exec_result['stderr']}")
+            return False
+
+        if not self.executor.connect():
+            return False
+
+        try:
+            self.executor.exec_command("true")
+        except ExecutorError as e:
+            logger.error(f"Executor does not respond: {e}")
+            return False
+
+        logger.info(f"Executor is ready on {self.executor_socket_path}")
+        return True
+
     async def save_state(self) -> bool:
         self.ssh_client.exec_command("sync")
         ret = await self.savevm()
@@ -178,9 +226,15 @@ class QemuFuzzer(FuzzerBase):
 
     def stop_machine(self) -> None:
         if self.qemu_process is None:
+            if self.executor is not self.ssh_client:
+                self.executor.shutdown()
             return
 
         self.qemu_process.send_signal(signal.SIGKILL)
+        # may run on the event loop while a harness thread waits on the executor, only wake it up,
+        # closing the connection here would block until that thread gives up
+        if self.executor is not self.ssh_client:
+            self.executor.shutdown()
         ret = self.qemu_process.wait(timeout=2)
         logger.info(f"Process exited with code: {ret}")
 
@@ -39,8 +39,8 @@ class SBIEIDFuzzer(SBIFuzzer):
             f"-a3 {fuzz_data['a3']:#x}",
             f"-a4 {fuzz_data['a4']:#x}",
             f"-a5 {fuzz_data['a5']:#x}",
-            f"-o {self.test_dir}",
+            f"-o {self.harness_output_dir()}",
         ]
 
         args_str = " ".join(args)
-        return self.ssh_client.exec_command(args_str, retry_max=1)
+        return self.exec_harness(args_str)
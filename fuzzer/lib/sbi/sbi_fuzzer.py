@@ -1,19 +1,44 @@
 import logging
 logger = logging.getLogger("mtcfuzz")
 
+import json
+import os
+
 from ..qemu_fuzzer import QemuFuzzer
+from ..coverage import split_trace
+from ..ssh_client import split_guest_timing
 from .sbi_mutator import SbiMutator
 
-import shutil
+# order of the values on a batch input line of the ecall harness
+BATCH_REGS = ("a7", "a6", "a0", "a1", "a2", "a3", "a4", "a5")
 
 class SBIFuzzer(QemuFuzzer):
+    supports_batch = True
+
     def __init__(self, config: dict, task_id: int, ssh_client: "SSHClient", qmp_socket_path: str, 
                  serial_socket_path0: str, serial_socket_path1: str, gdb_port: int) -> None:
         super().__init__(config, task_id, ssh_client, qmp_socket_path, serial_socket_path0, serial_socket_path1, gdb_port)
 
         self.mutator = SbiMutator()
+        self.use_rootfs_overlay = config["fuzzing"].get("rootfs_overlay", False)
+
+        if self.harness_output == "hostshare":
+            self.hostshare_dir = f"{self.local_work_dir}/{task_id}-hostshare"
+            os.makedirs(self.hostshare_dir, exist_ok=True)
+            self.remote_hostshare_dir = self.config["fuzzing"].get("hostshare_9p", "/mnt/hostshare")
+
+        # PC executed once per input in batch mode, the ioctl handler of the sbi_fuzz driver by default
+        self.batch_boundary_pc = None
+        if "batch_boundary_pc" in config["fuzzing"]:
+            self.batch_boundary_pc = int(config["fuzzing"]["batch_boundary_pc"], 16)
+        self.batch_boundary_symbol = config["fuzzing"].get("batch_boundary_symbol", "sbi_fuzz_ioctl")
 
     def extra_qemu_params(self) -> list[str]:
+        if self.harness_output == "hostshare":
+            return [
+                "-fsdev", f"local,id=fsdev0,path={self.hostshare_dir},security_model=none",
+                "-device", "virtio-9p-device,fsdev=fsdev0,mount_tag=hostshare",
+            ]
         return []
     
     def copy_files(self) -> bool:
@@ -29,16 +54,35 @@ class SBIFuzzer(QemuFuzzer):
         
         copy_to = f"{self.local_work_dir}/{self.task_id}-{copy_from_name}"
         self.rootfs_file = copy_to
-        shutil.copy(copy_from_path, copy_to)
+
+        if self.use_rootfs_overlay and "rootfs" in self.config["qemu_params"]:
+            self.rootfs_file = f"{self.local_work_dir}/{self.task_id}-overlay-{copy_from_name}"
+            base_format = self.config["qemu_params"].get("rootfs_format", "qcow2")
+            logger.info(f"Creating rootfs overlay {self.rootfs_file} backed by {copy_from_path}")
+            return self.artifact_stager.create_overlay(copy_from_path, self.rootfs_file, base_format=base_format)
+
+        method = self.artifact_stager.stage_file(copy_from_path, copy_to, writable=True)
+        logger.info(f"Staged {copy_from_path} to {copy_to} ({method})")
     
         return True
     
+    def reset_files(self) -> None:
+        if self.use_rootfs_overlay and "rootfs" in self.config["qemu_params"]:
+            logger.info(f"Resetting rootfs overlay {self.rootfs_file}")
+            self.artifact_stager.reset_overlay(self.rootfs_file)
+
     def prepare_harness(self) -> bool:
         exec_result = self.ssh_client.exec_command(f"mkdir -p {self.remote_work_dir}")
         if not exec_result["returncode"] == 0:
             logger.error(f"Failed to create remote work directory: {self.remote_work_dir}")
             return False
         
+        if self.harness_output == "hostshare":
+            exec_result = self.ssh_client.exec_command(f"mkdir -p {self.remote_hostshare_dir} && mount -t 9p -o trans=virtio {self.config['fuzzing'].get('tag_9p', 'hostshare')} {self.remote_hostshare_dir}")
+            if not exec_result["returncode"] == 0:
+                logger.error(f"Failed to mount 9p file system: {self.remote_hostshare_dir}")
+                return False
+
         self.send_module()
         self.send_harness()
 
@@ -47,7 +91,21 @@ class SBIFuzzer(QemuFuzzer):
             logger.error(f"Failed to insert module: {self.remote_module_path}")
             return False
 
+        if self.config["fuzzing"].get("batch_size", 1) > 1 and self.batch_boundary_pc is None:
+            self.resolve_batch_boundary()
+
         return True
+
+    def resolve_batch_boundary(self) -> None:
+        exec_result = self.ssh_client.exec_command(f"grep -w {self.batch_boundary_symbol} /proc/kallsyms")
+        fields = exec_result["stdout"].split()
+        addr = int(fields[0], 16) if exec_result["returncode"] == 0 and fields else 0
+        if addr == 0:
+            logger.error(f"Failed to resolve {self.batch_boundary_symbol} for batch mode, set batch_boundary_pc")
+            return
+
+        self.batch_boundary_pc = addr
+        logger.info(f"Batch boundary: {self.batch_boundary_symbol} at {addr:#x}")
     
     def init_sbi_params(self) -> dict:
         return  {
@@ -72,6 +130,10 @@ class SBIFuzzer(QemuFuzzer):
                 params[reg] = self.mutator.mutate(d["value"])
                 
         return params
+
+    def harness_output_dir(self) -> str:
+        # "-" makes the harness print its result to stdout instead of a file
+        return self.test_dir if self.test_dir else "-"
     
     def run_test(self, fuzz_data: dict) -> dict:
 
@@ -85,8 +147,48 @@ class SBIFuzzer(QemuFuzzer):
             f"-a3 {fuzz_data['a3']:#x}",
             f"-a4 {fuzz_data['a4']:#x}",
             f"-a5 {fuzz_data['a5']:#x}",
-            f"-o {self.test_dir}",
+            f"-o {self.harness_output_dir()}",
         ]
 
         args_str = " ".join(args)
-        return self.ssh_client.exec_command(args_str, retry_max=1)
+        return self.exec_harness(args_str)
+
+    def exec_harness(self, args_str: str) -> dict:
+        exec_result = self.executor.exec_command(args_str, retry_max=1)
+        # the harness times the ioctl itself, the same span as the per-input times of run_batch()
+        exec_result["stderr"], harness_elapsed_us = split_guest_timing(exec_result["stderr"])
+        if harness_elapsed_us is not None:
+            exec_result["guest_elapsed_us"] = harness_elapsed_us
+        return exec_result
+
+    def run_batch(self, fuzz_data_list: list[dict]) -> dict:
+        lines = [" ".join(f"{fuzz_data[reg]:#x}" for reg in BATCH_REGS) for fuzz_data in fuzz_data_list]
+        inputs = " ".join(f"'{line}'" for line in lines)
+        args_str = f"printf '%s\\n' {inputs} | {self.remote_harness_path} -batch"
+
+        timeout = self.executor.remote_command_exec_timeout * len(fuzz_data_list)
+        exec_result = self.executor.exec_command(args_str, retry_max=1, remote_command_exec_timeout=timeout)
+
+        results = []
+        for line in exec_result["stdout"].splitlines():
+            try:
+                result = json.loads(line)
+                ret = result["ret"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            results.append({
+                "returncode": 0 if ret == 0 else 1,
+                "stdout": line + "\n",
+                "stderr": "",
+                "elapsed_us": exec_result["elapsed_us"] / len(fuzz_data_list),
+                # the harness times every ecall itself
+                "guest_elapsed_us": result.get("elapsed_us"),
+            })
+
+        exec_result["results"] = results
+        return exec_result
+
+    def split_batch_trace(self, cover_pcs: list[str]) -> list[list[str]]:
+        if self.batch_boundary_pc is None:
+            return [cover_pcs]
+        return split_trace(cover_pcs, self.batch_boundary_pc)
@@ -40,6 +40,9 @@ class SeedManager:
                 "id": seed_id,
                 "seed": sorted_data,
                 "elapsed_us": 0,
+                # sum and number of the execution times measured with this seed
+                "total_elapsed_us": 0,
+                "timed_count": 0,
                 "traced_pcs_a": {},
                 "traced_pcs_b": {},
                 "total_trace_length": 0,
@@ -68,6 +71,8 @@ class SeedManager:
             "id": new_seed_id,
             "seed": new_seed,
             "elapsed_us": 1,
+            "total_elapsed_us": elapsed_us,
+            "timed_count": 1,
             "traced_pcs_a": coverages[0],
             "traced_pcs_b": coverages[1],
             "total_trace_length": len(coverages[0]) + len(coverages[1]),
@@ -84,6 +89,9 @@ class SeedManager:
         if seed["elapsed_us"] == 0:
             seed["elapsed_us"] = elapsed_us
 
+        seed["total_elapsed_us"] += elapsed_us
+        seed["timed_count"] += 1
+
         seed["total_tested_count"] += 1
 
     def update_coverage_hash(self, seed_id: str, coverage_hash: str, total_same_coverage_seed_count: int) -> None:
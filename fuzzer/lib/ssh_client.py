@@ -6,6 +6,30 @@ import time
 
 from .ssh_error import SSHError
 
+GUEST_TIMING_MARKER = "@@mtcfuzz-elapsed"
+
+def wrap_guest_timing(cmd: str) -> str:
+    """
+    Time cmd in the guest and print the start/end in ns as the last stderr line (cmd must not call exit).
+    """
+    return (f"s=$(date +%s%N); {cmd}; rc=$?; e=$(date +%s%N); "
+            f"echo \"{GUEST_TIMING_MARKER} $s $e\" >&2; exit $rc")
+
+def split_guest_timing(stderr: str) -> tuple[str, float | None]:
+    """
+    Remove the line added by wrap_guest_timing() and return (stderr, guest elapsed us or None).
+    """
+    head, sep, tail = stderr.rpartition(GUEST_TIMING_MARKER)
+    if not sep:
+        return stderr, None
+
+    try:
+        start_ns, end_ns = (int(x) for x in tail.split())
+    except ValueError:
+        # date of the guest has no %N
+        return head, None
+    return head, (end_ns - start_ns) / 1000
+
 class SSHClient:
     def __init__(self, config: dict, qemu_ssh_port: int) -> None:
         self.config = config
@@ -20,7 +44,11 @@ class SSHClient:
         self.ssh_retry_max = config["fuzzing"].get("ssh_retry_max", 5)
         self.remote_command_exec_timeout = config["fuzzing"].get("remote_command_exec_timeout", 2)
 
-    def exec_command(self, cmd: str, *,retry_max: int = None, connect_time_out: int = 5, remote_command_exec_timeout: int = None) -> dict:
+    def exec_command(self, cmd: str, *,retry_max: int = None, connect_time_out: int = 5, remote_command_exec_timeout: int = None,
+                     guest_timing: bool = False) -> dict:
+        if guest_timing:
+            cmd = wrap_guest_timing(cmd)
+
         ssh_cmd = [
             "ssh",
             "-o", "StrictHostKeyChecking=no",
@@ -56,11 +84,18 @@ class SSHClient:
                 # Calculate elapsed time in microseconds
                 elapsed_us = (end - start) * 1_000_000
 
+                stderr = result.stderr
+                guest_elapsed_us = None
+                if guest_timing:
+                    stderr, guest_elapsed_us = split_guest_timing(stderr)
+
                 return {
                     "returncode": result.returncode,
                     "stdout": result.stdout,
-                    "stderr": result.stderr,
+                    "stderr": stderr,
                     "elapsed_us": elapsed_us,
+                    # time spent in the guest, without the SSH login
+                    "guest_elapsed_us": guest_elapsed_us,
                 }
 
             except subprocess.TimeoutExpired as e:
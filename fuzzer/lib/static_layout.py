@@ -0,0 +1,178 @@
+import os
+import re
+import struct
+import subprocess
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+
+from .symbolizer import default_symbol_cache_path, elf_cache_key
+
+# bump when the leader detection changes so that cached layouts are rebuilt
+LAYOUT_VERSION = 1
+LAYOUT_MAGIC = b"MTCLAYT\0"
+# magic, version, number of functions, number of block leaders, size of the names blob
+LAYOUT_HEADER = struct.Struct("<8sIQQQ")
+
+# 0000000080001234 g     F .text	0000000000000040 sbi_ecall_handler
+SYMBOL_LINE = re.compile(r"^([0-9a-fA-F]+)\s+.*\sF\s+\S+\s+([0-9a-fA-F]+)\s+(\S+)$")
+# 80001234:	beqz	a0,80001240 <sbi_ecall_handler+0xc>
+INSN_LINE = re.compile(r"^\s*([0-9a-fA-F]+):\s+(\S+)(?:\s+(.*))?$")
+TARGET = re.compile(r"\b([0-9a-fA-F]+)\s+<[^>]+>")
+# control transfers of RISC-V, AArch64 and x86, calls end a block as in angr's CFGFast
+BRANCH = re.compile(r"^(?:"
+                    r"j\w*|call\w*|tail|ret\w*|loop\w*|[ms]ret|eret\w*"
+                    r"|b|bl|br\w*|blr\w*|b\.\w+|bc\.\w+|cbn?z|tbn?z"
+                    r"|beq|bne|blt|bge|bltu|bgeu|bgt|ble|bgtu|bleu|beqz|bnez|blez|bgez|bltz|bgtz"
+                    r")$")
+
+def default_layout_cache_dir() -> str:
+    return os.path.join(os.path.dirname(default_symbol_cache_path()), "layout")
+
+def read_function_ranges(objdump: str, elf_path: str) -> list[tuple[int, int, str]]:
+    """
+    Sorted (start, end, name) of the sized function symbols of an ELF, end is exclusive.
+    Aliases at the same address are listed once.
+    """
+    res = subprocess.run([objdump, "-t", elf_path], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    functions = {}
+    for line in res.stdout.splitlines():
+        match = SYMBOL_LINE.match(line.strip())
+        if not match:
+            continue
+        start, size, name = int(match.group(1), 16), int(match.group(2), 16), match.group(3)
+        if size > 0 and start not in functions:
+            functions[start] = (start, start + size, name)
+    return sorted(functions.values())
+
+def _find_leaders(objdump: str, elf_path: str, start: int, stop: int) -> list[int]:
+    """
+    Block leaders of [start, stop): branch targets and instructions following a branch.
+    """
+    res = subprocess.run([objdump, "-d", "--no-show-raw-insn", f"--start-address={start:#x}", f"--stop-address={stop:#x}", elf_path],
+                         check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    leaders = set()
+    after_branch = False
+    for line in res.stdout.splitlines():
+        match = INSN_LINE.match(line)
+        if not match:
+            continue
+        addr = int(match.group(1), 16)
+        if after_branch:
+            leaders.add(addr)
+        after_branch = BRANCH.match(match.group(2)) is not None
+        if after_branch and match.group(3):
+            target = TARGET.search(match.group(3))
+            if target:
+                leaders.add(int(target.group(1), 16))
+    return sorted(leaders)
+
+class StaticLayout:
+    """
+    Function ranges and basic-block leaders of an ELF, addresses are ELF addresses.
+    A block runs from its leader to the next leader, every function start is a leader.
+    """
+    def __init__(self, functions: list[tuple[int, int, str]], leaders) -> None:
+        self.starts = array("Q", (start for start, _, _ in functions))
+        self.ends = array("Q", (end for _, end, _ in functions))
+        self.names = [name for _, _, name in functions]
+        self.leaders = leaders if isinstance(leaders, array) else array("Q", leaders)
+
+    @classmethod
+    def build(cls, elf_path: str, objdump: str = "objdump", jobs: int = None) -> "StaticLayout":
+        functions = read_function_ranges(objdump, elf_path)
+        if not functions:
+            return cls([], [])
+
+        # contiguous runs of functions, each disassembled by its own objdump
+        jobs = max(jobs or os.cpu_count() or 1, 1)
+        per_chunk = max(len(functions) // (jobs * 4), 1)
+        chunks = [functions[i:i + per_chunk] for i in range(0, len(functions), per_chunk)]
+        args = [(objdump, elf_path, chunk[0][0], max(end for _, end, _ in chunk)) for chunk in chunks]
+        if jobs > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                results = list(executor.map(_find_leaders, *zip(*args)))
+        else:
+            results = [_find_leaders(*arg) for arg in args]
+
+        leaders = {start for start, _, _ in functions}
+        for result in results:
+            leaders.update(result)
+
+        layout = cls(functions, [])
+        # branch targets outside of any function (PLT, data, ...) are not blocks
+        layout.leaders = array("Q", sorted(addr for addr in leaders if layout.function_index(addr) is not None))
+        return layout
+
+    def function_index(self, addr: int) -> int | None:
+        idx = bisect_right(self.starts, addr) - 1
+        if idx < 0 or addr >= self.ends[idx]:
+            return None
+        return idx
+
+    def block_index(self, addr: int) -> int | None:
+        """
+        Index of the leader of the block holding addr, None outside of the functions.
+        """
+        if self.function_index(addr) is None:
+            return None
+        return bisect_right(self.leaders, addr) - 1
+
+    def count_blocks(self, start: int, end: int) -> int:
+        return bisect_left(self.leaders, end) - bisect_left(self.leaders, start)
+
+    def functions_in(self, lower: int, upper: int) -> range:
+        """
+        Indexes of the functions overlapping [lower, upper].
+        """
+        first = bisect_right(self.starts, lower) - 1
+        if first < 0 or self.ends[first] <= lower:
+            first += 1
+        return range(first, bisect_right(self.starts, upper))
+
+    def save(self, path: str) -> None:
+        names = "\0".join(self.names).encode()
+        tmp_file = f"{path}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(LAYOUT_HEADER.pack(LAYOUT_MAGIC, LAYOUT_VERSION, len(self.starts), len(self.leaders), len(names)))
+            self.starts.tofile(f)
+            self.ends.tofile(f)
+            self.leaders.tofile(f)
+            f.write(names)
+        os.replace(tmp_file, path)
+
+    @classmethod
+    def load(cls, path: str) -> "StaticLayout | None":
+        """
+        Return None if the file is not a layout of the current version.
+        """
+        with open(path, "rb") as f:
+            magic, version, num_functions, num_leaders, names_size = LAYOUT_HEADER.unpack(f.read(LAYOUT_HEADER.size))
+            if magic != LAYOUT_MAGIC or version != LAYOUT_VERSION:
+                return None
+            layout = cls([], [])
+            layout.starts.fromfile(f, num_functions)
+            layout.ends.fromfile(f, num_functions)
+            layout.leaders.fromfile(f, num_leaders)
+            names = f.read(names_size).decode()
+        layout.names = names.split("\0") if num_functions else []
+        return layout
+
+    @classmethod
+    def load_or_build(cls, elf_path: str, objdump: str = "objdump", cache_dir: str = None, jobs: int = None) -> "StaticLayout":
+        """
+        The layout of an ELF from the cache, keyed by its build-id, built and cached on a miss.
+        """
+        cache_dir = cache_dir if cache_dir else default_layout_cache_dir()
+        path = os.path.join(cache_dir, f"{elf_cache_key(elf_path)}.layout")
+        try:
+            layout = cls.load(path)
+            if layout is not None:
+                return layout
+        except (FileNotFoundError, EOFError, struct.error):
+            pass
+
+        layout = cls.build(elf_path, objdump, jobs)
+        os.makedirs(cache_dir, exist_ok=True)
+        layout.save(path)
+        return layout
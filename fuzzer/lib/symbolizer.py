@@ -0,0 +1,172 @@
+import hashlib
+import os
+import re
+import sqlite3
+import struct
+import subprocess
+
+SHT_NOTE = 7
+NT_GNU_BUILD_ID = 3
+
+# addr2line without -p prints "function" and "file:line" (or "file:line (discriminator N)") per address
+FILE_LINE = re.compile(r"^(.+):(\d+)(?:\s+\(discriminator\s+\d+\))?$")
+
+def default_symbol_cache_path() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(cache_home, "mtcfuzz", "symbols.sqlite3")
+
+def read_elf_build_id(elf_path: str) -> str | None:
+    """
+    Return the GNU build-id of an ELF file as hex, None if it has none.
+    """
+    with open(elf_path, "rb") as f:
+        ident = f.read(16)
+        if ident[:4] != b"\x7fELF":
+            return None
+        is64 = ident[4] == 2
+        endian = "<" if ident[5] == 1 else ">"
+
+        if is64:
+            f.seek(0x28)
+            shoff, = struct.unpack(endian + "Q", f.read(8))
+            f.seek(0x3a)
+        else:
+            f.seek(0x20)
+            shoff, = struct.unpack(endian + "I", f.read(4))
+            f.seek(0x2e)
+        shentsize, shnum = struct.unpack(endian + "HH", f.read(4))
+
+        for i in range(shnum):
+            f.seek(shoff + i * shentsize)
+            if is64:
+                _, sh_type, _, _, offset, size = struct.unpack(endian + "IIQQQQ", f.read(40))
+            else:
+                _, sh_type, _, _, offset, size = struct.unpack(endian + "IIIIII", f.read(24))
+            if sh_type != SHT_NOTE:
+                continue
+
+            f.seek(offset)
+            notes = f.read(size)
+            pos = 0
+            while pos + 12 <= len(notes):
+                namesz, descsz, note_type = struct.unpack_from(endian + "III", notes, pos)
+                pos += 12
+                name = notes[pos:pos + namesz]
+                pos += (namesz + 3) & ~3
+                desc = notes[pos:pos + descsz]
+                pos += (descsz + 3) & ~3
+                if note_type == NT_GNU_BUILD_ID and name.rstrip(b"\0") == b"GNU":
+                    return desc.hex()
+    return None
+
+def elf_cache_key(elf_path: str) -> str:
+    """
+    Build-id of the ELF, or a hash of its contents for binaries linked without one.
+    """
+    build_id = read_elf_build_id(elf_path)
+    if build_id:
+        return build_id
+
+    digest = hashlib.sha256()
+    with open(elf_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return f"sha256-{digest.hexdigest()}"
+
+class SymbolCache:
+    """
+    Persistent (elf key, offset) -> (function, file, line) table shared by the report tools.
+    line is None when addr2line has no line number for the address.
+    """
+    # stays below the SQLite host parameter limit
+    LOOKUP_BATCH = 500
+
+    def __init__(self, path: str = None) -> None:
+        self.path = path if path else default_symbol_cache_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=60)
+        self.db.execute("CREATE TABLE IF NOT EXISTS symbols (elf TEXT, offset TEXT, function TEXT, file TEXT, line INTEGER, PRIMARY KEY (elf, offset))")
+
+    def lookup(self, elf_key: str, offsets: list[int]) -> dict[int, tuple]:
+        result = {}
+        keys = [f"{offset:#x}" for offset in dict.fromkeys(offsets)]
+        for i in range(0, len(keys), self.LOOKUP_BATCH):
+            batch = keys[i:i + self.LOOKUP_BATCH]
+            rows = self.db.execute(f"SELECT offset, function, file, line FROM symbols WHERE elf = ? AND offset IN ({','.join('?' * len(batch))})",
+                                   (elf_key, *batch))
+            for offset_s, function, file, line in rows:
+                result[int(offset_s, 16)] = (function, file, line)
+        return result
+
+    def store(self, elf_key: str, symbols: dict[int, tuple]) -> None:
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO symbols VALUES (?, ?, ?, ?, ?)",
+                                [(elf_key, f"{offset:#x}", *symbol) for offset, symbol in symbols.items()])
+
+    def close(self) -> None:
+        self.db.close()
+
+class Addr2LineProcess:
+    """
+    addr2line co-process reading addresses on stdin, the ELF and its DWARF line tables are loaded once.
+    """
+    # addresses written before reading their answers, small enough that neither pipe fills up
+    BATCH_SIZE = 128
+
+    def __init__(self, addr2line: str, elf_path: str) -> None:
+        self.proc = subprocess.Popen([addr2line, "-e", elf_path, "-f"],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+
+    def resolve(self, offsets: list[int]) -> dict[int, tuple]:
+        result = {}
+        for i in range(0, len(offsets), self.BATCH_SIZE):
+            batch = offsets[i:i + self.BATCH_SIZE]
+            self.proc.stdin.write("".join(f"{offset:#x}\n" for offset in batch))
+            self.proc.stdin.flush()
+            for offset in batch:
+                function = self.proc.stdout.readline()
+                file_line = self.proc.stdout.readline()
+                if not file_line:
+                    raise RuntimeError(f"addr2line exited with {self.proc.wait()}")
+                function = function.rstrip("\n")
+                file_line = file_line.rstrip("\n")
+                match = FILE_LINE.match(file_line)
+                if function == "??" and file_line == "??:0":
+                    # address not found, -p would print "?? ??:0" without " at "
+                    result[offset] = (function, "??", None)
+                elif match:
+                    result[offset] = (function, match.group(1), int(match.group(2)))
+                else:
+                    result[offset] = (function, file_line.rsplit(":", 1)[0], None)
+        return result
+
+    def close(self) -> None:
+        self.proc.stdin.close()
+        self.proc.wait()
+
+class Symbolizer:
+    """
+    Resolve ELF offsets to (function, file, line) through the symbol cache, starting addr2line only for misses.
+    """
+    def __init__(self, addr2line: str, elf_path: str, cache: SymbolCache) -> None:
+        self.addr2line = addr2line
+        self.elf_path = elf_path
+        self.elf_key = elf_cache_key(elf_path)
+        self.cache = cache
+        self.process = None
+
+    def symbolize(self, offsets: list[int]) -> dict[int, tuple]:
+        result = self.cache.lookup(self.elf_key, offsets)
+        missing = [offset for offset in dict.fromkeys(offsets) if offset not in result]
+        if missing:
+            if self.process is None:
+                self.process = Addr2LineProcess(self.addr2line, self.elf_path)
+            resolved = self.process.resolve(missing)
+            self.cache.store(self.elf_key, resolved)
+            result.update(resolved)
+        return result
+
+    def close(self) -> None:
+        if self.process:
+            self.process.close()
+            self.process = None
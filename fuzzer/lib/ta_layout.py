@@ -0,0 +1,153 @@
+import logging
+logger = logging.getLogger("mtcfuzz")
+
+import json
+import os
+import re
+import time
+
+# name of the TA in Coverage.relocated, the static layouts and the live coverage binaries ("ta_binary")
+TA_TARGET = "ta"
+
+class TaLayout:
+    """
+    Where OP-TEE loaded a TA in the current boot, found in the console logs of the VM.
+
+    The TA range [load address, load address + page aligned size] replaces the firmware filters
+    overlapping it or the range of an earlier boot, like tools/calc_address_range.py would compute it,
+    and is saved with the addr2line base of the TA in <machine_info_dir>/ta_layout.json.
+    configured_range is the TA filter of the config, replaced by the first relocation of a run
+    even when it does not overlap the TA range.
+    """
+    def __init__(self, uuid: str, load_pattern: re.Pattern, size_pattern: re.Pattern,
+                 console_logs: list[str], layout_file: str, *, align: int = 0x1000,
+                 configured_range: tuple[int, int] = None) -> None:
+        self.uuid = uuid
+        self.load_pattern = load_pattern
+        self.size_pattern = size_pattern
+        self.console_logs = console_logs
+        self.layout_file = layout_file
+        self.align = align
+        self.configured_range = configured_range
+        self.relocated = False
+        # console log sizes when the VM was started, the logs are appended to by every boot
+        self.boot_offsets = {}
+
+        self.layout = None
+        try:
+            with open(layout_file, "r") as f:
+                self.layout = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    def mark_boot(self) -> None:
+        """
+        Call right before the VM is started.
+        """
+        self.boot_offsets = {}
+        for path in self.console_logs:
+            try:
+                self.boot_offsets[path] = os.path.getsize(path)
+            except FileNotFoundError:
+                self.boot_offsets[path] = 0
+
+    def _read_boot_log(self) -> str:
+        text = []
+        for path in self.console_logs:
+            try:
+                with open(path, "rb") as f:
+                    f.seek(self.boot_offsets.get(path, 0))
+                    text.append(f.read().decode(errors="replace"))
+            except FileNotFoundError:
+                continue
+        return "\n".join(text)
+
+    def find(self) -> tuple[int, int] | None:
+        """
+        Return the load address and the uncompressed size of the TA in this boot, None if they are not logged.
+        """
+        text = self._read_boot_log()
+        loads = self.load_pattern.findall(text)
+        sizes = self.size_pattern.findall(text)
+        if not loads or not sizes:
+            return None
+        # the last load is the one still mapped if the TA was loaded more than once
+        return int(loads[-1], 16), int(sizes[-1])
+
+    def relocate(self, coverage: "Coverage") -> bool:
+        found = self.find()
+        if found is None:
+            logger.warning(f"Load address of TA {self.uuid} not found in the console log, firmware filters are not relocated")
+            return False
+
+        load_address, size = found
+        aligned_size = (size + self.align - 1) & ~(self.align - 1)
+        new_range = (load_address, load_address + aligned_size)
+
+        old_ranges = []
+        if self.layout:
+            old_ranges.append((int(self.layout["lower"], 16), int(self.layout["upper"], 16)))
+            if old_ranges[0] != new_range:
+                logger.warning(f"TA {self.uuid} moved from {self.layout['lower']} to {load_address:#x}")
+        # the filters of a new run still have the configured range, there is no layout yet on the first boot
+        if self.configured_range and not self.relocated and self.configured_range not in old_ranges:
+            old_ranges.append(self.configured_range)
+        coverage.relocate_filter("firmware", new_range, old_ranges, name=TA_TARGET, base_addr=load_address)
+        logger.info(f"TA {self.uuid} loaded at {load_address:#x}, size {size}, firmware filter {new_range[0]:#x}-{new_range[1]:#x}")
+        self.relocated = True
+
+        boots = self.layout.get("boots", []) if self.layout else []
+        boots.append({"time": time.time(), "load_address": hex(load_address), "size": size})
+        self.layout = {
+            "uuid": self.uuid,
+            "load_address": hex(load_address),
+            "size": size,
+            "lower": hex(new_range[0]),
+            "upper": hex(new_range[1]),
+            # min_addr/max_addr/base_addr of the TA in the tools/addr2line.py config
+            "addr2line": {
+                "min_addr": hex(new_range[0]),
+                "max_addr": hex(new_range[1]),
+                "base_addr": hex(load_address),
+            },
+            "boots": boots,
+        }
+        tmp_file = f"{self.layout_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self.layout, f, indent=4)
+        os.replace(tmp_file, self.layout_file)
+        return True
+
+class TaLayoutMixin:
+    """
+    For QemuFuzzer subclasses fuzzing an early TA: the TA range of the firmware filters follows the
+    load address logged at each boot. Set the ta_* attributes and call init_ta_layout() from __init__().
+    """
+    ta_uuid: str = None
+    # the load address and the uncompressed size of the TA in the console log
+    ta_load_pattern: re.Pattern = None
+    ta_size_pattern: re.Pattern = None
+
+    def init_ta_layout(self, serial_socket_path1: str) -> None:
+        self.ta_layout = None
+        if not self.config["fuzzing"].get("relocate_ta_filter", True):
+            return
+        console_logs = [f"{self.local_work_dir}/{self.task_id}-console0.log"]
+        if serial_socket_path1:
+            console_logs.append(f"{self.local_work_dir}/{self.task_id}-console1.log")
+        # {"lower", "upper"} of the TA in the firmware address filters
+        ta_filter = self.config["fuzzing"].get("ta_filter")
+        configured_range = (int(ta_filter["lower"], 16), int(ta_filter["upper"], 16)) if ta_filter else None
+        self.ta_layout = TaLayout(self.ta_uuid, self.ta_load_pattern, self.ta_size_pattern, console_logs,
+                                  f"{self.local_work_dir}/{self.machine_info_dir}/ta_layout.json",
+                                  align=int(self.config["fuzzing"].get("ta_align", "0x1000"), 16),
+                                  configured_range=configured_range)
+
+    def start_machine(self) -> bool:
+        if self.ta_layout and not self.started:
+            self.ta_layout.mark_boot()
+        return super().start_machine()
+
+    def relocate_coverage(self, coverage: "Coverage") -> None:
+        if self.ta_layout:
+            self.ta_layout.relocate(coverage)
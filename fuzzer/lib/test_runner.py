@@ -0,0 +1,52 @@
+import logging
+logger = logging.getLogger("mtcfuzz")
+
+import asyncio
+
+from .console_reader import ConsoleReader
+from .crash_detector import CrashDetector
+from .ssh_error import SSHError
+
+async def open_console(serial_socket_path: str, config: dict, crash_detector: CrashDetector) -> ConsoleReader | None:
+    buffer_size = config["fuzzing"].get("console_buffer_size", 4 * 1024 * 1024)
+    console = ConsoleReader(serial_socket_path, buffer_size=buffer_size)
+    if not await console.open():
+        return None
+    console.add_listener(crash_detector.feed)
+    return console
+
+async def run_test_watching_console(fuzzer, fuzz_params: dict, crash_event: asyncio.Event, crash_grace_sec: float, *, run=None) -> tuple[dict | None, bool]:
+    """
+    Run the harness (fuzzer.run_test unless run is given) in a thread so the console readers keep streaming meanwhile.
+    If a crash signature shows up on the console and the harness does not return within
+    crash_grace_sec, the machine is stopped right away instead of waiting for SSH timeouts.
+    Returns (exec_result, torn_down).
+    """
+    run_task = asyncio.ensure_future(asyncio.to_thread(run or fuzzer.run_test, fuzz_params))
+    crash_wait = asyncio.ensure_future(crash_event.wait())
+    torn_down = False
+
+    try:
+        await asyncio.wait({run_task, crash_wait}, return_when=asyncio.FIRST_COMPLETED)
+        if not run_task.done():
+            done, _ = await asyncio.wait({run_task}, timeout=crash_grace_sec)
+            if not done:
+                logger.info("Guest did not return after a crash, stopping machine")
+                fuzzer.stop_machine()
+                torn_down = True
+
+        try:
+            exec_result = await run_task
+        except SSHError:
+            if not torn_down:
+                raise
+            exec_result = None
+    finally:
+        crash_wait.cancel()
+
+    return exec_result, torn_down
+
+async def close_consoles(*consoles) -> None:
+    for console in consoles:
+        if console:
+            await console.close()
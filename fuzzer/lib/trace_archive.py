@@ -0,0 +1,186 @@
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections import Counter
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+# magic, version, codec, number of unique PCs, compressed size of the PC column, compressed size of the count column
+RECORD_HEADER = struct.Struct("<4sBBxxIII")
+RECORD_MAGIC = b"MTCT"
+RECORD_VERSION = 1
+
+def count_trace_pcs(cover_pcs: list[str]) -> dict[int, int]:
+    """
+    Turn the raw trace lines into {pc: hit count}, converting every distinct line only once.
+    """
+    result = {}
+    for pc_str, count in Counter(cover_pcs).items():
+        try:
+            pc = int(pc_str, 16)
+        except ValueError:
+            continue
+        # int() also takes "-0x10" or "1_0", only 64-bit addresses can be stored
+        if not 0 <= pc < 1 << 64:
+            continue
+        result[pc] = result.get(pc, 0) + count
+    return result
+
+def _compress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 6)
+
+def _decompress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard module is required to read this trace archive")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+def _native_to_le(arr: array) -> bytes:
+    if sys.byteorder != "little":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+def _le_to_native(typecode: str, data: bytes) -> array:
+    arr = array(typecode)
+    arr.frombytes(data)
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr
+
+def encode_record(pc_counts: dict[int, int], codec: int) -> bytes:
+    pcs = sorted(pc_counts)
+    # sorted PCs are stored as deltas, which compress far better than absolute addresses
+    deltas = array("Q", (pc - prev for pc, prev in zip(pcs, [0] + pcs[:-1])))
+    counts = array("I", (min(pc_counts[pc], 0xffffffff) for pc in pcs))
+
+    pcs_blob = _compress(codec, _native_to_le(deltas))
+    counts_blob = _compress(codec, _native_to_le(counts))
+    header = RECORD_HEADER.pack(RECORD_MAGIC, RECORD_VERSION, codec, len(pcs), len(pcs_blob), len(counts_blob))
+    return header + pcs_blob + counts_blob
+
+def decode_record(data: bytes) -> tuple[list[int], list[int]]:
+    magic, version, codec, num_pcs, pcs_len, counts_len = RECORD_HEADER.unpack_from(data)
+    if magic != RECORD_MAGIC or version != RECORD_VERSION:
+        raise ValueError("Not a trace archive record")
+
+    offset = RECORD_HEADER.size
+    deltas = _le_to_native("Q", _decompress(codec, data[offset:offset + pcs_len]))
+    offset += pcs_len
+    counts = _le_to_native("I", _decompress(codec, data[offset:offset + counts_len]))
+
+    pcs = []
+    pc = 0
+    for delta in deltas:
+        pc += delta
+        pcs.append(pc)
+
+    return pcs, list(counts)
+
+class TraceArchiveWriter:
+    """
+    Store per-test unique PCs and hit counts in compressed, rotating segment files instead of raw traces.
+
+    index.jsonl has one record per test:
+      {"test_no", "test", "task", "time", "segment", "offset", "length", "num_pcs", "total"}
+    """
+    def __init__(self, archive_dir: str, task_id: str, *, max_segment_size: int = 64 * 1024 * 1024) -> None:
+        self.archive_dir = archive_dir
+        self.task_id = task_id
+        self.max_segment_size = max_segment_size
+        self.codec = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+        numbers = [int(name[len("traces-"):-len(".seg")]) for name in os.listdir(self.archive_dir)
+                   if name.startswith("traces-") and name.endswith(".seg")]
+        self.segment_no = max(numbers) if numbers else 0
+        self.segment = open(os.path.join(self.archive_dir, self._segment_name()), "ab")
+        self.index = open(os.path.join(self.archive_dir, "index.jsonl"), "a")
+
+    def _segment_name(self) -> str:
+        return f"traces-{self.segment_no:05d}.seg"
+
+    def append(self, test_no: int, test_dir_name: str, timestamp: float, pc_counts: dict[int, int], extra: dict = None) -> None:
+        if self.segment.tell() >= self.max_segment_size:
+            self.segment.close()
+            self.segment_no += 1
+            self.segment = open(os.path.join(self.archive_dir, self._segment_name()), "ab")
+
+        data = encode_record(pc_counts, self.codec)
+        offset = self.segment.tell()
+        self.segment.write(data)
+        self.segment.flush()
+
+        record = {
+            "test_no": test_no,
+            "test": test_dir_name,
+            "task": self.task_id,
+            "time": timestamp,
+            "segment": self._segment_name(),
+            "offset": offset,
+            "length": len(data),
+            "num_pcs": len(pc_counts),
+            "total": sum(pc_counts.values()),
+        }
+        if extra:
+            record.update(extra)
+        self.index.write(json.dumps(record) + "\n")
+        self.index.flush()
+
+    def close(self) -> None:
+        if self.segment:
+            self.segment.close()
+            self.segment = None
+        if self.index:
+            self.index.close()
+            self.index = None
+
+def read_trace_archive_index(archive_dir: str) -> list[dict]:
+    records = []
+    with open(os.path.join(archive_dir, "index.jsonl"), "r") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+def iter_trace_archive(archive_dir: str, records: list[dict] = None):
+    """
+    Yield (index record, pcs, counts) for every test in the archive, or only for the given index records.
+    """
+    if records is None:
+        records = read_trace_archive_index(archive_dir)
+
+    segments = {}
+    try:
+        for record in records:
+            seg = segments.get(record["segment"])
+            if seg is None:
+                seg = open(os.path.join(archive_dir, record["segment"]), "rb")
+                segments[record["segment"]] = seg
+            seg.seek(record["offset"])
+            pcs, counts = decode_record(seg.read(record["length"]))
+            yield record, pcs, counts
+    finally:
+        for seg in segments.values():
+            seg.close()
+
+def find_trace_archives(result_dir: str) -> list[str]:
+    archives = []
+    for root, dirs, files in os.walk(result_dir):
+        # hidden dirs like the trace index of report tools are not fuzzer archives
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        if "index.jsonl" in files and any(f.startswith("traces-") and f.endswith(".seg") for f in files):
+            archives.append(root)
+    return sorted(archives)
@@ -0,0 +1,139 @@
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from .trace_archive import TraceArchiveWriter, count_trace_pcs, find_trace_archives, iter_trace_archive, read_trace_archive_index
+
+TRACE_INDEX_DIR = ".trace_index"
+TRACE_INDEX_VERSION = 1
+QEMU_TRACE_LOG_FILE = "qemu_trace_log.log"
+CRASH_FLAG_FILE = "crashed.txt"
+
+# <task id>-<YYYYmmddHHMMSS>-<uuid>, see start_fuzzing()
+TEST_DIR_NAME = re.compile(r"^(?P<task>.+)-(?P<timestamp>\d{14})-(?P<uuid>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})$")
+
+def parse_test_dir_name(name: str) -> tuple[str | None, float | None]:
+    """
+    Return the task id and the start time embedded in a test dir name, (None, None) if it doesn't follow the scheme.
+    """
+    m = TEST_DIR_NAME.match(name)
+    if not m:
+        return None, None
+    return m.group("task"), datetime.strptime(m.group("timestamp"), "%Y%m%d%H%M%S").timestamp()
+
+def _read_raw_test(test_dir: str) -> tuple[dict[int, int], float, bool]:
+    trace_log = os.path.join(test_dir, QEMU_TRACE_LOG_FILE)
+    with open(trace_log, "r") as f:
+        pc_counts = count_trace_pcs(f.readlines())
+    return pc_counts, os.path.getmtime(trace_log), os.path.exists(os.path.join(test_dir, CRASH_FLAG_FILE))
+
+def _find_new_raw_tests(result_dir: str, indexed_paths: set[str], indexed_tests: set[str]) -> list[str]:
+    test_dirs = []
+    for root, dirs, files in os.walk(result_dir):
+        if QEMU_TRACE_LOG_FILE in files:
+            test_dirs.append(root)
+            dirs[:] = []
+            continue
+        # indexed test dirs are never listed again
+        rel_root = os.path.relpath(root, result_dir)
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d not in indexed_tests
+                         and os.path.normpath(os.path.join(rel_root, d)) not in indexed_paths)
+    return test_dirs
+
+def load_trace_index(result_dir: str) -> tuple[str, list[dict]]:
+    """
+    Return the index dir and its records, without updating it.
+    """
+    index_dir = os.path.join(result_dir, TRACE_INDEX_DIR)
+    if not os.path.exists(os.path.join(index_dir, "index.jsonl")):
+        return index_dir, []
+    return index_dir, read_trace_archive_index(index_dir)
+
+def update_trace_index(result_dir: str, *, jobs: int = 1) -> tuple[str, list[dict]]:
+    """
+    Index the tests of a result dir that are not indexed yet and return the index dir and all records.
+
+    The index is a trace archive in <result_dir>/.trace_index holding the unique PCs and hit counts
+    of every test, from raw qemu_trace_log.log files as well as from the fuzzer's trace archives.
+    On top of the trace archive fields each record has:
+      {"name_time", "crashed", "path"} for raw tests, "path" relative to result_dir
+      {"name_time", "crashed", "archive", "archive_test_no"} for archived tests
+    A fuzzer test is indexed once by its (unique) dir name, so tests both archived and kept raw are not counted twice.
+    Read the traces back with iter_trace_archive(index_dir, records).
+    """
+    result_dir = os.path.abspath(result_dir)
+    index_dir, records = load_trace_index(result_dir)
+    indexed_paths = {record["path"] for record in records if "path" in record}
+    # names of other dirs holding a trace log are not unique, those are known by path only
+    indexed_tests = {record["test"] for record in records if record["name_time"] is not None}
+    archived = {}
+    for record in records:
+        if "archive" in record:
+            archived[record["archive"]] = archived.get(record["archive"], 0) + 1
+
+    writer = TraceArchiveWriter(index_dir, "index")
+    next_test_no = len(records)
+
+    def append(test_dir_name, task, timestamp, pc_counts, extra):
+        nonlocal next_test_no
+        writer.append(next_test_no, test_dir_name, timestamp, pc_counts, extra={"task": task, **extra})
+        next_test_no += 1
+        if extra["name_time"] is not None:
+            indexed_tests.add(test_dir_name)
+
+    try:
+        # archives are append-only, only their records past the ones already indexed are read
+        for archive_dir in find_trace_archives(result_dir):
+            rel_archive_dir = os.path.relpath(archive_dir, result_dir)
+            archive_records = read_trace_archive_index(archive_dir)[archived.get(rel_archive_dir, 0):]
+            for record, pcs, counts in iter_trace_archive(archive_dir, archive_records):
+                if record["test"] in indexed_tests:
+                    continue
+                _, name_time = parse_test_dir_name(record["test"])
+                crashed = os.path.exists(os.path.join(os.path.dirname(archive_dir), record["test"], CRASH_FLAG_FILE))
+                append(record["test"], record["task"], record["time"], dict(zip(pcs, counts)), {
+                    "name_time": name_time,
+                    "crashed": crashed,
+                    "archive": rel_archive_dir,
+                    "archive_test_no": record["test_no"],
+                })
+
+        test_dirs = _find_new_raw_tests(result_dir, indexed_paths, indexed_tests)
+        if jobs > 1 and len(test_dirs) > 1:
+            executor = ProcessPoolExecutor(max_workers=jobs)
+            results = executor.map(_read_raw_test, test_dirs, chunksize=64)
+        else:
+            executor = None
+            results = map(_read_raw_test, test_dirs)
+
+        try:
+            for test_dir, (pc_counts, mtime, crashed) in zip(test_dirs, results):
+                test_dir_name = os.path.basename(test_dir)
+                task, name_time = parse_test_dir_name(test_dir_name)
+                append(test_dir_name, task, mtime, pc_counts, {
+                    "name_time": name_time,
+                    "crashed": crashed,
+                    "path": os.path.relpath(test_dir, result_dir),
+                })
+        finally:
+            if executor:
+                executor.shutdown()
+    finally:
+        writer.close()
+
+    records = read_trace_archive_index(index_dir)
+    manifest = {
+        "version": TRACE_INDEX_VERSION,
+        "result_dir": result_dir,
+        "tests": len(records),
+        "crashes": sum(1 for record in records if record["crashed"]),
+        "tasks": sorted({record["task"] for record in records if record["task"] is not None}),
+    }
+    tmp_file = os.path.join(index_dir, "manifest.json.tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_file, os.path.join(index_dir, "manifest.json"))
+
+    return index_dir, records
@@ -12,6 +12,9 @@ import os
 import asyncio
 import uuid
 import signal
+import subprocess
+import shutil
+import time
 from datetime import datetime
 
 from lib.fuzzer_factory import fuzzer_factory
@@ -20,12 +23,21 @@ from lib.seed_manager_factory import seed_manager_factory
 from lib.ssh_client import SSHClient
 import lib.fuzzer_lib as fuzzer_lib
 from lib.ssh_error import SSHError
-from lib.serial import Serial
+from lib.crash_detector import CrashDetector
+from lib.test_runner import open_console, close_consoles, run_test_watching_console
 from lib.qemu_tracer import QemuTracer
 from lib.coverage_manager import CoverageManager
 from lib.gdb_helper import GDBHelper
 from lib.powerscheduler import PowerScheduler
 from lib.crashed_testcase_manager import CrashedTestcaseManager
+from lib.crash_triage import extract_crash_signature
+from lib.artifact_segment import ArtifactSegmentWriter, ARTIFACT_POLICIES
+from lib.trace_archive import TraceArchiveWriter, count_trace_pcs
+from lib.phase_stats import PhaseStats
+from lib.campaign_stats import CampaignStats
+from lib.live_coverage import LiveCoverage, binaries_from_config
+from lib.static_layout import StaticLayout
+import lib.log_pipeline as log_pipeline
 
 import pprint
 
@@ -54,15 +66,6 @@ def is_pid_exist(pid):
     except OSError:
         return False
 
-def is_crashed(console0_log, console1_log):
-    if fuzzer_lib.is_crashed(console0_log):
-        return True
-    
-    if console1_log:
-        if fuzzer_lib.is_crashed(console1_log):
-            return True
-    return False
-
 def parser_argument():
     parser = argparse.ArgumentParser(description="Fuzzer for SBI")
     parser.add_argument("-c", "--config", type=str, default="config.json", help="Path to the configuration file")
@@ -76,24 +79,62 @@ def save_config(config_file_name: str, config: dict, local_work_dir: str) -> Non
     with open(filename, "w") as f:
         json.dump(config, f, indent=4)
 
-async def start_fuzzing(config_file_name, config, task_num, crashedTestcaseManager):
+def keep_test_dir(local_test_dir: str, trace_log: str, files: dict[str, bytes]) -> str:
+    """
+    Write the files of a kept test to its dir and move the trace there if it was written elsewhere.
+    Return the path of the trace.
+    """
+    os.makedirs(local_test_dir, exist_ok=True)
+    for name, data in files.items():
+        with open(f"{local_test_dir}/{name}", "wb") as f:
+            f.write(data)
+    if os.path.dirname(trace_log) != local_test_dir and os.path.exists(trace_log):
+        os.replace(trace_log, f"{local_test_dir}/qemu_trace_log.log")
+        return f"{local_test_dir}/qemu_trace_log.log"
+    return trace_log
+
+async def start_fuzzing(config_file_name, config, task_num, crashedTestcaseManager, campaignStats, staticLayouts):
     tracing = False
     snapshot_created = False
     pid = None
+    main_console = None
+    extra_console = None
+    artifact_segment = None
+    trace_archive = None
 
     task_id = f"task-{task_num}"
     local_work_dir = config["fuzzing"]["local_work_dir"]
 
-    file_handler = logging.FileHandler(f"{local_work_dir}/mtcfuzz-{task_id}.log", mode="a", encoding="utf-8")
-    file_handler.setFormatter(logging.Formatter("%(asctime)s:%(levelname)s: %(message)s"))
-    logger.addHandler(file_handler)
+    # records of this task go to its own log file only
+    log_pipeline.add_task_log(task_id, f"{local_work_dir}/mtcfuzz-{task_id}.log")
 
     qemu_ssh_port = config["qemu_params"].get("port", 10022) + task_num
     gdb_port =  config["fuzzing"].get("gdb_port", 1234) + task_num
     use_gdb = config["fuzzing"].get("use_gdb", False)
     gdb = None
     qemu_wait_sec = config["fuzzing"]["wait_for_qemu_seconds"]
+    console_quiet_sec = config["fuzzing"].get("console_drain_quiet_seconds", 0.02)
+    console_timeout_sec = config["fuzzing"].get("console_drain_timeout_seconds", 0.5)
+    crash_grace_sec = config["fuzzing"].get("crash_grace_seconds", 1.0)
+    crash_trace_tail = config["fuzzing"].get("crash_trace_tail", 8)
+    keep_duplicate_crashes = config["fuzzing"].get("keep_duplicate_crashes", False)
+    # "all": keep every test dir, "interesting": keep dirs of crashes and new coverage only
+    artifact_policy = config["fuzzing"].get("artifact_policy", "all")
+    if artifact_policy not in ARTIFACT_POLICIES:
+        raise ValueError(f"Unknown artifact_policy {artifact_policy}, must be one of {ARTIFACT_POLICIES}")
+    use_trace_archive = config["fuzzing"].get("trace_archive", False)
+    keep_raw_trace = config["fuzzing"].get("keep_raw_trace", False)
+    # "ssh": dmesg -c every test, "lazy": dmesg over SSH for new coverage only, "console": kernel lines of the console capture
+    dmesg_source = config["fuzzing"].get("dmesg_source", "ssh")
+    # the console only has the printk lines with CONFIG_PRINTK_TIME and a console loglevel that lets them through,
+    # the first test compares it with dmesg over SSH once
+    check_console_dmesg = dmesg_source == "console"
     max_fuzzing_loop = config["fuzzing"].get("max_fuzzing_loop", 1000)
+    phase_stats = PhaseStats(f"{local_work_dir}/{task_id}-phase_stats.json",
+                             dump_interval=config["fuzzing"].get("phase_stats_interval", 100),
+                             enabled=config["fuzzing"].get("phase_stats", True))
+    # number of inputs run per SSH round trip, only for fuzzers that support it
+    batch_size = config["fuzzing"].get("batch_size", 1)
 
     default_energy = config["fuzzing"].get("default_energy", 100)
     ps = PowerScheduler(config["fuzzing"]["assign_energy_function"], M = default_energy)
@@ -106,10 +147,13 @@ async def start_fuzzing(config_file_name, config, task_num, crashedTestcaseManag
 
         Coverage = coverage_factory(config)
         coverage = Coverage(config)
+        for target, (layout, base_addr) in staticLayouts.items():
+            coverage.set_static_layout(target, layout, base_addr)
 
         seed_dir = config["fuzzing"]["seed_dir"]
         SeedManager = seed_manager_factory(config)
         seedManager = SeedManager(seed_dir, task_id)
+        campaignStats.register_task(task_id, coverage, seedManager)
 
         
         if not os.path.exists(local_work_dir):
@@ -121,13 +165,16 @@ async def start_fuzzing(config_file_name, config, task_num, crashedTestcaseManag
         has_extra_serial = config["qemu_params"].get("extra_serial", False)
         if has_extra_serial:
             serial_socket_path1 = f"{local_work_dir}/qemu_fuzzer_{task_id}_serial1.sock"
-        
-        main_serial = None
-        extra_serial = None
 
         if use_gdb:
             gdb = GDBHelper(config, gdb_port, task_id, local_work_dir)
 
+        if artifact_policy == "interesting":
+            artifact_segment = ArtifactSegmentWriter(f"{local_work_dir}/{task_id}-artifacts")
+
+        if use_trace_archive:
+            trace_archive = TraceArchiveWriter(f"{local_work_dir}/{task_id}-trace-archive", task_id)
+
         qt = QemuTracer(task_id, qmp_socket_path)
 
         loop_cnt = 0
@@ -141,6 +188,21 @@ async def start_fuzzing(config_file_name, config, task_num, crashedTestcaseManag
             return
         fuzzer = Fuzzer(config, task_id, ssh_client, qmp_socket_path, serial_socket_path0, serial_socket_path1, gdb_port)
 
+        round_size = 1
+        if batch_size > 1:
+            if fuzzer.supports_batch:
+                round_size = batch_size
+            else:
+                logger.warning(f"{Fuzzer.__name__} does not support batched execution, ignoring batch_size")
+        # inputs of a batch that did not run or could not be told apart, run first in the next round
+        retry_inputs = []
+        unbatched_inputs = 0
+
+        crash_event = asyncio.Event()
+        crash_patterns = config["fuzzing"].get("crash_signatures", []) + fuzzer.crash_patterns
+        main_crash_detector = CrashDetector(crash_patterns, event=crash_event)
+        extra_crash_detector = CrashDetector(crash_patterns, event=crash_event)
+
         machine_info_dir = f"{local_work_dir}/{fuzzer.machine_info_dir}"
         if not os.path.exists(machine_info_dir):
             os.makedirs(machine_info_dir)
@@ -155,9 +217,21 @@ async def start_fuzzing(config_file_name, config, task_num, crashedTestcaseManag
 
         fuzzer.wait_for_ready(timeout=qemu_wait_sec)
 
+        main_console = await open_console(serial_socket_path0, config, main_crash_detector)
+        if has_extra_serial:
+            extra_console = await open_console(serial_socket_path1, config, extra_crash_detector)
+
+        if main_console is None or (has_extra_serial and extra_console is None):
+            logger.error("Failed to connect to serial console.")
+            return -1
+
         ret, pid = await fuzzer.initial_setup(local_work_dir, True)
         if not ret:
             return -1
+        fuzzer.relocate_coverage(coverage)
+        if check_console_dmesg:
+            # drop the boot messages so the check sees the messages of the first test only
+            ssh_client.exec_command("dmesg -c")
         
         save_config(config_file_name, config, local_work_dir)
 
@@ -173,63 +247,97 @@ async def start_fuzzing(config_file_name, config, task_num, crashedTestcaseManag
 
             seed_id = seed["id"]
             coverManager.count_other_seeds_with_same_coverage(seed["coverage_hash"], seed_id)
-            energy = ps.assign_energy(seed, total_tested_count, total_elapsed_us)
-            logger.info(f"Loop {loop_cnt}, Seed ID: {seed_id}, Energy: {energy}")
+            # the aflfast energy is a float, fuzz_i > energy gives the same number of tests with its integer part
+            energy = int(ps.assign_energy(seed, total_tested_count, total_elapsed_us))
+            logger.info("Loop %d, Seed ID: %s, Energy: %s", loop_cnt, seed_id, energy)
             # seed loop start
             fuzz_i = 0
             while True:
-                logger.info("===========================")
+                logger.debug("===========================")
                 need_restart = False
-                if fuzz_i > energy:
+                tested_in_round = 0
+                # inputs waiting for a rerun still belong to this seed
+                if fuzz_i > energy and not retry_inputs:
                     logger.info("Energy exhausted, moving to next seed.")
                     break
                 try:
-                    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-                    uuid_str = f"{timestamp}-{str(uuid.uuid4())}"
-                    test_dir_name = f"{task_id}-{uuid_str}"
-                    local_test_dir = f"{local_work_dir}/{test_dir_name}"
-                    fuzzer.local_test_dir = local_test_dir
-
-                    logger.info(f"Test: {test_dir_name}")
-                    console0_log = f"{local_test_dir}/console0.log"
-                    console1_log = None
+                    tests = []
+                    num_tests = max(min(round_size, energy - fuzz_i + 1), 1)
+                    if unbatched_inputs > 0:
+                        unbatched_inputs -= 1
+                        num_tests = 1
+                    for _ in range(num_tests):
+                        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+                        uuid_str = f"{timestamp}-{str(uuid.uuid4())}"
+                        test_dir_name = f"{task_id}-{uuid_str}"
+                        local_test_dir = f"{local_work_dir}/{test_dir_name}"
+                        logger.info("Test: %s", test_dir_name, extra={"rate_limit": "test"})
+                        if artifact_policy == "all":
+                            with phase_stats.measure("make_test_dir"):
+                                os.makedirs(local_test_dir)
+                            trace_log = f"{local_test_dir}/qemu_trace_log.log"
+                        else:
+                            # the test dir is only created if the test is kept, see keep_test_dir()
+                            trace_log = f"{local_work_dir}/{task_id}-qemu_trace_log-{len(tests)}.log"
+
+                        with phase_stats.measure("generate_input"):
+                            fuzz_params = retry_inputs.pop(0) if retry_inputs else fuzzer.generate_input(seed["seed"])
+                        tests.append({
+                            "name": test_dir_name,
+                            "dir": local_test_dir,
+                            "params": fuzz_params,
+                            "trace_log": trace_log,
+                            "cover_pcs": None,
+                            "exec_result": None,
+                        })
+
+                    batched = len(tests) > 1
+                    fuzzer.local_test_dir = tests[0]["dir"]
 
                     # setup work dir
-                    
-                    fuzzer.create_remote_test_dir(test_dir_name)
-                    os.makedirs(local_test_dir)
+                    if batched:
+                        # results of a batch come back on stdout
+                        fuzzer.test_dir = None
+                    else:
+                        with phase_stats.measure("setup_test_dir"):
+                            fuzzer.setup_test_dir(tests[0]["name"])
                     
                     if not snapshot_created:
-                        ret = await fuzzer.save_state()
+                        with phase_stats.measure("save_state"):
+                            ret = await fuzzer.save_state()
                         if not ret:
                             logger.error("Failed to save state.")
                             return -1
                         snapshot_created = True
 
-                    trace_log = f"{local_test_dir}/qemu_trace_log.log"
-                    fuzz_params = fuzzer.generate_input(seed["seed"])
+                    trace_log = tests[0]["trace_log"]
 
                     if use_gdb:
-                        gdb.write_gdb_data_file(fuzz_params)
+                        gdb.write_gdb_data_file(tests[0]["params"])
                     
-                    elapsed_us = 0
-                    main_serial = Serial(serial_socket_path0, console0_log)
-                    main_serial.open()
-
+                    main_crash_detector.reset()
+                    extra_crash_detector.reset()
+                    console0_start = main_console.offset
                     if has_extra_serial:
-                        console1_log = f"{local_test_dir}/console1.log"
-                        extra_serial = Serial(serial_socket_path1, console1_log)
-                        extra_serial.open()
+                        console1_start = extra_console.offset
                     
                     # pprint.pprint(f"test: {test_no}, params: {fuzz_params}")
-                    await qt.tracer_on(trace_log)
+                    with phase_stats.measure("tracer_on"):
+                        await qt.tracer_on(trace_log)
                     tracing = True
                     
                     exec_result = None
                     maybe_crashed = False
 
                     try:
-                        exec_result = fuzzer.run_test(fuzz_params)
+                        with phase_stats.measure("run_test"):
+                            if batched:
+                                exec_result, torn_down = await run_test_watching_console(fuzzer, [t["params"] for t in tests], crash_event, crash_grace_sec, run=fuzzer.run_batch)
+                            else:
+                                exec_result, torn_down = await run_test_watching_console(fuzzer, tests[0]["params"], crash_event, crash_grace_sec)
+                        if torn_down:
+                            maybe_crashed = True
+                            need_restart = True
                     except SSHError as e:
                         logger.info("Maybe got a crash")
                         maybe_crashed = True
@@ -237,49 +345,169 @@ async def start_fuzzing(config_file_name, config, task_num, crashedTestcaseManag
 
                     if not maybe_crashed:
                         # We don't have to off the qmp command because we should reboot qemu
-                        await qt.tracer_off()
+                        with phase_stats.measure("tracer_off"):
+                            await qt.tracer_off()
 
                     tracing = False
-                    main_serial.read()
-                    main_serial.close()
+                    with phase_stats.measure("console_drain"):
+                        await asyncio.gather(*[
+                            console.drain(quiet=console_quiet_sec, timeout=console_timeout_sec)
+                            for console in (main_console, extra_console) if console
+                        ])
 
-                    if has_extra_serial:
-                        extra_serial.read()
-                        extra_serial.close()    
-
-                    total_tested_count += 1
-
-                    if exec_result:
-                        elapsed_us = exec_result["elapsed_us"]
-                        total_elapsed_us += elapsed_us
+                    crashed = maybe_crashed or main_crash_detector.crashed() or extra_crash_detector.crashed()
+                    crash_index = 0 if crashed else None
 
-                        with open(f"{local_test_dir}/stdout.txt", "w") as f:
-                            f.write(exec_result["stdout"])
-                        with open(f"{local_test_dir}/stderr.txt", "w") as f:
-                            f.write(exec_result["stderr"])
-                            
-                    if maybe_crashed or is_crashed(console0_log, console1_log):
-                        logger.info(f"[+]Found crash! : Test dir: {local_test_dir}")
-                        await crashedTestcaseManager.add_crashed_testcase(fuzz_params)
-                        crashedTestcaseManager.save_params(local_test_dir, fuzz_params)
+                    if not batched:
+                        tests[0]["exec_result"] = exec_result
                     else:
-                        exec_result = ssh_client.exec_command("dmesg -c")
-                        fuzzer_lib.save_cmd_output(exec_result["stdout"], f"{local_test_dir}/dmesg.log")
-
-                        ssh_client.copy_remote_files(fuzzer.test_dir, local_work_dir)
-                        cover_pcs = coverage.read_coverage(trace_log)
-                        kcov_found, fcov_found, trace_hash = coverage.analyze_coverage(cover_pcs)
-                        if kcov_found or fcov_found:
-                            seedManager.add_seed(seed_id, fuzz_params, elapsed_us, coverage.get_coverages())
+                        segments = [] if crashed else fuzzer.split_batch_trace(coverage.read_coverage(trace_log))
+                        results = exec_result["results"] if exec_result else []
+
+                        if crashed or len(segments) != len(tests) or len(results) != len(tests):
+                            if crashed:
+                                # the tail of the trace may be lost with the machine, let single runs tell which input crashed
+                                logger.info(f"Crash in a batch, running its {len(tests)} inputs one by one")
+                                unbatched_inputs = len(tests)
+                            else:
+                                logger.warning(f"Batch of {len(tests)} inputs produced {len(segments)} trace segments and {len(results)} results, disabling batch mode")
+                                round_size = 1
+                            crash_index = None
+                            retry_inputs[:0] = [t["params"] for t in tests]
+                            for t in tests:
+                                shutil.rmtree(t["dir"], ignore_errors=True)
+                                if os.path.exists(t["trace_log"]):
+                                    os.unlink(t["trace_log"])
+                            tests = []
+
+                        for i, t in enumerate(tests):
+                            t["cover_pcs"] = segments[i]
+                            if i < len(results):
+                                t["exec_result"] = results[i]
+                            with open(t["trace_log"], "w") as f:
+                                f.writelines(segments[i])
+
+                    console0 = main_console.get(console0_start)
+                    console1 = extra_console.get(console1_start) if has_extra_serial else None
+
+                    dmesg_output = None
+                    with phase_stats.measure("dmesg"):
+                        if dmesg_source == "console":
+                            dmesg_output = fuzzer_lib.extract_kernel_log(console0)
+                            if check_console_dmesg and not crashed:
+                                check_console_dmesg = False
+                                exec_result = ssh_client.exec_command("dmesg -c")
+                                if exec_result["stdout"] and not dmesg_output:
+                                    logger.warning("No timestamped kernel lines on the console but dmesg has messages, "
+                                                   "is CONFIG_PRINTK_TIME set? Falling back to dmesg -c over SSH")
+                                    dmesg_source = "ssh"
+                                    dmesg_output = exec_result["stdout"]
+                        elif dmesg_source == "ssh" and not crashed:
+                            exec_result = ssh_client.exec_command("dmesg -c")
+                            dmesg_output = exec_result["stdout"]
+
+                    # the inputs of a batch share one console capture, it is saved with the first test of the batch
+                    # and the dmesg with the first test that saves it, the other tests refer to them in batch.json
+                    dmesg_test = None
+                    for i, t in enumerate(tests):
+                        local_test_dir = t["dir"]
+                        test_dir_name = t["name"]
+                        fuzz_params = t["params"]
+                        trace_log = t["trace_log"]
+                        tested_in_round += 1
+
+                        # files of the test, written to its dir if it is kept, else to the artifact segment
+                        files = {}
+                        if i == 0:
+                            files["console0.log"] = console0
+                            if has_extra_serial:
+                                files["console1.log"] = console1
+
+                        total_tested_count += 1
+                        if artifact_segment:
+                            artifact_segment.count("tests")
+
+                        elapsed_us = 0
+                        if t["exec_result"]:
+                            elapsed_us = fuzzer_lib.exec_elapsed_us(t["exec_result"])
+                            total_elapsed_us += elapsed_us
+
+                        if t["exec_result"] and fuzzer.harness_output != "none":
+                            files["stdout.txt"] = t["exec_result"]["stdout"].encode()
+                            files["stderr.txt"] = t["exec_result"]["stderr"].encode()
+                                
+                        if crash_index == i:
+                            trace_log = keep_test_dir(local_test_dir, trace_log, files)
+                            console_logs = [console0.decode("utf-8", errors="replace")]
+                            if has_extra_serial:
+                                console_logs.append(console1.decode("utf-8", errors="replace"))
+                            fuzzer.collect_test_output(local_test_dir, fetch_remote=False)
+                            signature = extract_crash_signature(console_logs, trace_log, trace_tail=crash_trace_tail)
+
+                            is_new_crash = await crashedTestcaseManager.add_crashed_testcase(fuzz_params, local_test_dir, signature)
+                            if artifact_segment:
+                                artifact_segment.count("crashes")
+                            if is_new_crash or keep_duplicate_crashes:
+                                logger.info(f"[+]Found crash! : Test dir: {local_test_dir}, bucket: {signature['bucket']} ({signature['kind']})")
+                                crashedTestcaseManager.save_params(local_test_dir, fuzz_params, signature)
+                            else:
+                                logger.info(f"Known crash, bucket: {signature['bucket']}")
+                                shutil.rmtree(local_test_dir, ignore_errors=True)
                         else:
-                            seedManager.update_seed(seed, elapsed_us)
-                            
-                        coverManager.merge_coverage(coverage.get_coverages())
-
-                        total_same_coverage_count = coverManager.count_other_seeds_with_same_coverage(trace_hash, seed_id)
-                        seedManager.update_coverage_hash(seed_id, trace_hash, total_same_coverage_count)
-
-                        logger.info(f"kernel coverage: {kcov_found}, firmware coverage: {fcov_found}")
+                            if dmesg_output and dmesg_test is None:
+                                files["dmesg.log"] = dmesg_output.encode()
+                                dmesg_test = test_dir_name
+
+                            with phase_stats.measure("collect_output"):
+                                fuzzer.collect_test_output(local_test_dir, fetch_remote=not crashed)
+                            with phase_stats.measure("coverage"):
+                                cover_pcs = t["cover_pcs"] if t["cover_pcs"] is not None else coverage.read_coverage(trace_log)
+                                kcov_found, fcov_found, trace_hash = coverage.analyze_coverage(cover_pcs)
+                            if trace_archive:
+                                trace_archive.append(total_tested_count, test_dir_name, time.time(), count_trace_pcs(cover_pcs))
+                                if not keep_raw_trace:
+                                    os.unlink(trace_log)
+                            if kcov_found or fcov_found:
+                                campaignStats.new_path(task_id)
+                                seedManager.add_seed(seed_id, fuzz_params, elapsed_us, coverage.get_coverages())
+                            else:
+                                seedManager.update_seed(seed, elapsed_us)
+                                
+                            coverManager.merge_coverage(coverage.get_coverages())
+
+                            total_same_coverage_count = coverManager.count_other_seeds_with_same_coverage(trace_hash, seed_id)
+                            seedManager.update_coverage_hash(seed_id, trace_hash, total_same_coverage_count)
+
+                            # new coverage is always logged, the common nothing-new case is rate limited
+                            logger.info("kernel coverage: %s, firmware coverage: %s", kcov_found, fcov_found,
+                                        extra=None if kcov_found or fcov_found else {"rate_limit": "coverage"})
+
+                            if dmesg_source == "lazy" and (kcov_found or fcov_found) and not crashed:
+                                if dmesg_output is None:
+                                    with phase_stats.measure("dmesg"):
+                                        exec_result = ssh_client.exec_command("dmesg -c")
+                                    dmesg_output = exec_result["stdout"]
+                                if dmesg_output and dmesg_test is None:
+                                    files["dmesg.log"] = dmesg_output.encode()
+                                    dmesg_test = test_dir_name
+
+                            if batched:
+                                files["batch.json"] = json.dumps({"batch": tests[0]["name"], "index": i, "size": len(tests), "dmesg": dmesg_test}).encode()
+
+                            if not artifact_segment:
+                                keep_test_dir(local_test_dir, trace_log, files)
+                            elif kcov_found or fcov_found:
+                                artifact_segment.count("new_coverage")
+                                keep_test_dir(local_test_dir, trace_log, files)
+                            else:
+                                if os.path.isdir(local_test_dir):
+                                    # harness output collected to disk
+                                    artifact_segment.append_test_dir(test_dir_name, local_test_dir, files)
+                                    shutil.rmtree(local_test_dir, ignore_errors=True)
+                                else:
+                                    artifact_segment.append_files(test_dir_name, files)
+                                if os.path.exists(trace_log):
+                                    os.unlink(trace_log)
 
                 except KeyboardInterrupt:
                     logger.info("Ctrl-C detected, finish fuzzing loop...")
@@ -289,43 +517,58 @@ async def start_fuzzing(config_file_name, config, task_num, crashedTestcaseManag
                     traceback.print_exc()
                     fuzzing_done = True
                 finally:
-                    fuzz_i += 1
-
-                    if main_serial:
-                        main_serial.close()
-                        main_serial = None
-                    if extra_serial:
-                        extra_serial.close()
-                        extra_serial = None
-                    
+                    fuzz_i += max(tested_in_round, 1)
+                    phase_stats.count_test(tested_in_round)
+                    campaignStats.count_execs(task_id, tested_in_round)
+
                     if tracing:
                         await qt.tracer_off()
                     tracing = False
 
                     if not fuzzing_done:
                         if need_restart or not is_pid_exist(pid):
+                            await close_consoles(main_console, extra_console)
+                            main_console = None
+                            extra_console = None
+
                             if is_pid_exist(pid):
                                 logger.info(f"Stop qemu pid: {pid}")
                                 fuzzer.stop_machine()
                             
                             logger.info("Restarting machine...")
+                            campaignStats.count_restart(task_id)
+                            restart_start = time.perf_counter()
                             ret = fuzzer.start_machine()
                             if not ret:
                                 logger.info("Failed to launch machine.")
                                 return
                             fuzzer.wait_for_ready(timeout=qemu_wait_sec)
 
+                            with phase_stats.measure("console_open"):
+                                main_console = await open_console(serial_socket_path0, config, main_crash_detector)
+                                if has_extra_serial:
+                                    extra_console = await open_console(serial_socket_path1, config, extra_crash_detector)
+
+                            if main_console is None or (has_extra_serial and extra_console is None):
+                                logger.info("Failed to connect to serial console.")
+                                return
+
                             ret, pid = await fuzzer.initial_setup(local_work_dir, False)
                             if not ret:
                                 logger.info("Failed to restart machine.")
                                 break
+                            fuzzer.relocate_coverage(coverage)
+                            if check_console_dmesg:
+                                ssh_client.exec_command("dmesg -c")
 
                             snapshot_created = False
+                            phase_stats.record("restart", (time.perf_counter() - restart_start) * 1_000_000)
                             logger.info(f"Restarted machine with PID: {pid}")
 
                         elif fuzzer:
-                            logger.info("Restoring machine state...")
-                            ret = await fuzzer.loadvm()
+                            logger.info("Restoring machine state...", extra={"rate_limit": "loadvm"})
+                            with phase_stats.measure("loadvm"):
+                                ret = await fuzzer.loadvm()
 
                     else:
                         logger.info("Fuzzing done, cleaning up...")
@@ -344,6 +587,14 @@ async def start_fuzzing(config_file_name, config, task_num, crashedTestcaseManag
     except asyncio.CancelledError:
         logger.info("Fuzzing cancelled by user.")
     finally:
+        await close_consoles(main_console, extra_console)
+
+        if artifact_segment:
+            artifact_segment.close()
+        if trace_archive:
+            trace_archive.close()
+        phase_stats.dump()
+
         logger.info(f"check pid {pid}")
         if pid and is_pid_exist(pid):
             logger.info(f"Process with PID {pid} is still running. Terminating...")
@@ -359,12 +610,46 @@ async def main():
     if config is None:
         return
 
-    crashedTestcaseManager = CrashedTestcaseManager()
+    # console and task log files are written by a background thread, per-exec messages at most once per interval
+    log_pipeline.start_logging(logger, rate_limit_seconds=config["fuzzing"].get("log_rate_limit_seconds", 1.0))
+
+    crashedTestcaseManager = CrashedTestcaseManager(config["fuzzing"]["local_work_dir"])
+    campaignStats = CampaignStats(config["fuzzing"]["local_work_dir"], crashedTestcaseManager)
+    stats_task = None
+    liveCoverage = None
+    live_coverage_task = None
+
+    # function ranges and basic blocks of the binaries for block/function coverage, cached per build-id
+    staticLayouts = {}
+    if config["fuzzing"].get("static_layout", False):
+        for target, (elf, base_addr) in binaries_from_config(config).items():
+            try:
+                layout = await asyncio.to_thread(StaticLayout.load_or_build, elf,
+                                                 config["fuzzing"].get("objdump", "objdump"),
+                                                 config["fuzzing"].get("static_layout_cache_dir"))
+            except (OSError, subprocess.CalledProcessError) as e:
+                logger.warning(f"Failed to build the static layout of {elf}: {e}")
+                continue
+            logger.info(f"Static layout of {elf}: {len(layout.starts)} functions, {len(layout.leaders)} basic blocks")
+            staticLayouts[target] = (layout, base_addr)
 
     num_fuzzers = config["fuzzing"].get("num_fuzzers", 1)
     try:
+        # JSON status endpoint, disabled unless a port or a socket path is configured
+        await campaignStats.start_server(http_host=config["fuzzing"].get("stats_http_host", "127.0.0.1"),
+                                         http_port=config["fuzzing"].get("stats_http_port"),
+                                         unix_socket=config["fuzzing"].get("stats_unix_socket"))
+        stats_task = asyncio.create_task(campaignStats.run(config["fuzzing"].get("stats_interval", 5)))
+
+        # symbolized coverage of all tasks on /coverage and /coverage.html of the stats endpoint
+        if config["fuzzing"].get("live_coverage", False):
+            liveCoverage = LiveCoverage(campaignStats, binaries_from_config(config),
+                                        addr2line=config["fuzzing"].get("addr2line", "addr2line"),
+                                        symbol_cache=config["fuzzing"].get("symbol_cache"))
+            live_coverage_task = asyncio.create_task(liveCoverage.run(config["fuzzing"].get("live_coverage_interval", 10)))
+
         tasks = [
-            asyncio.create_task(start_fuzzing(args.config, config, i, crashedTestcaseManager))
+            asyncio.create_task(start_fuzzing(args.config, config, i, crashedTestcaseManager, campaignStats, staticLayouts))
             for i in range(num_fuzzers)
         ]
         await asyncio.gather(*tasks)
@@ -376,6 +661,21 @@ async def main():
         logger.info("All tasks cancelled.")
     except asyncio.CancelledError:
         logger.info("Fuzzing cancelled by user.")
+    finally:
+        if stats_task:
+            stats_task.cancel()
+            await asyncio.gather(stats_task, return_exceptions=True)
+        if live_coverage_task:
+            live_coverage_task.cancel()
+            await asyncio.gather(live_coverage_task, return_exceptions=True)
+        await campaignStats.stop_server()
+        if liveCoverage:
+            liveCoverage.close()
+        try:
+            campaignStats.write()
+        except OSError as e:
+            logger.warning(f"Failed to write {campaignStats.stats_file}: {e}")
+        log_pipeline.stop_logging(logger)
 
 if __name__ == "__main__":
     try:
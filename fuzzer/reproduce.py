@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+logging.basicConfig(level = logging.INFO, format='%(asctime)s:%(levelname)s: %(message)s')
+logger = logging.getLogger("mtcfuzz")
+
+import argparse
+import asyncio
+import copy
+import json
+import os
+import string
+import uuid
+from collections import Counter
+
+from lib.fuzzer_factory import fuzzer_factory
+from lib.ssh_client import SSHClient
+from lib.ssh_error import SSHError
+from lib.qemu_tracer import QemuTracer
+from lib.crash_detector import CrashDetector
+from lib.crash_triage import extract_crash_signature
+from lib.test_runner import open_console, close_consoles, run_test_watching_console
+import lib.fuzzer_lib as fuzzer_lib
+
+def parser_argument():
+    parser = argparse.ArgumentParser(description="Reproduce and minimize a crashing input")
+    parser.add_argument("command", choices=["reproduce", "minimize"], help="reproduce: re-run the input, minimize: also shrink it")
+    parser.add_argument("-c", "--config", type=str, required=True, help="Path to the configuration file")
+    parser.add_argument("--input", type=str, required=True, help="saved_seed.json of the crash")
+    parser.add_argument("--seed", type=str, default=None, help="Seed file the crash was generated from, fields marked fixed are not minimized")
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs used to check stability")
+    parser.add_argument("--workers", type=int, default=1, help="Number of guests running in parallel")
+    parser.add_argument("--work-dir", type=str, default=None, help="Work dir for the guests (default: <local_work_dir>/repro)")
+    parser.add_argument("--trace-tail", type=int, default=0, help="Number of trace PCs included in the signature match")
+    parser.add_argument("--output", type=str, default=None, help="Output json file (default: next to --input)")
+
+    return parser.parse_args()
+
+def same_crash(signature: dict, reference: dict) -> bool:
+    return signature is not None and signature["bucket"] == reference["bucket"]
+
+class ReproWorker:
+    """
+    One guest booted once, snapshotted, and restored with loadvm between runs like start_fuzzing() does.
+    """
+    def __init__(self, config: dict, worker_num: int, work_dir: str, trace_tail: int) -> None:
+        self.task_id = f"repro-{worker_num}"
+        self.local_work_dir = f"{work_dir}/{self.task_id}"
+        os.makedirs(self.local_work_dir, exist_ok=True)
+
+        # every worker gets its own work dir so snapshot storage and sockets do not collide
+        self.config = copy.deepcopy(config)
+        self.config["fuzzing"]["local_work_dir"] = self.local_work_dir
+
+        port_offset = self.config["fuzzing"].get("repro_port_offset", 100) + worker_num
+        qemu_ssh_port = self.config["qemu_params"].get("port", 10022) + port_offset
+        gdb_port = self.config["fuzzing"].get("gdb_port", 1234) + port_offset
+
+        self.qmp_socket_path = f"{self.local_work_dir}/qemu_fuzzer_{self.task_id}_qmp.sock"
+        self.serial_socket_path0 = f"{self.local_work_dir}/qemu_fuzzer_{self.task_id}_serial0.sock"
+        self.serial_socket_path1 = None
+        if self.config["qemu_params"].get("extra_serial", False):
+            self.serial_socket_path1 = f"{self.local_work_dir}/qemu_fuzzer_{self.task_id}_serial1.sock"
+
+        self.qemu_wait_sec = self.config["fuzzing"]["wait_for_qemu_seconds"]
+        self.crash_grace_sec = self.config["fuzzing"].get("crash_grace_seconds", 1.0)
+        self.trace_tail = trace_tail
+
+        self.ssh_client = SSHClient(self.config, qemu_ssh_port)
+        Fuzzer = fuzzer_factory(self.config)
+        self.fuzzer = Fuzzer(self.config, self.task_id, self.ssh_client, self.qmp_socket_path,
+                             self.serial_socket_path0, self.serial_socket_path1, gdb_port)
+        self.qt = QemuTracer(self.task_id, self.qmp_socket_path)
+
+        self.crash_event = asyncio.Event()
+        crash_patterns = self.config["fuzzing"].get("crash_signatures", []) + self.fuzzer.crash_patterns
+        self.crash_detectors = [CrashDetector(crash_patterns, event=self.crash_event) for _ in range(2)]
+        self.consoles = []
+        self.pid = None
+
+    async def start(self) -> bool:
+        if not self.fuzzer.start_machine():
+            return False
+        self.fuzzer.wait_for_ready(timeout=self.qemu_wait_sec)
+
+        self.consoles = []
+        for path, detector in zip([self.serial_socket_path0, self.serial_socket_path1], self.crash_detectors):
+            if path is None:
+                continue
+            console = await open_console(path, self.config, detector)
+            if console is None:
+                return False
+            self.consoles.append(console)
+
+        os.makedirs(f"{self.local_work_dir}/{self.fuzzer.machine_info_dir}", exist_ok=True)
+        ret, self.pid = await self.fuzzer.initial_setup(self.local_work_dir, True)
+        if not ret:
+            return False
+
+        return await self.fuzzer.save_state()
+
+    async def restart(self) -> bool:
+        await close_consoles(*self.consoles)
+        self.consoles = []
+        self.fuzzer.stop_machine()
+        return await self.start()
+
+    async def run(self, fuzz_params: dict) -> dict | None:
+        """
+        Run one input and return its crash signature, None if it did not crash.
+        """
+        test_dir_name = f"{self.task_id}-{uuid.uuid4()}"
+        local_test_dir = f"{self.local_work_dir}/{test_dir_name}"
+        os.makedirs(local_test_dir)
+        self.fuzzer.local_test_dir = local_test_dir
+        self.fuzzer.setup_test_dir(test_dir_name)
+
+        for detector in self.crash_detectors:
+            detector.reset()
+        starts = [console.offset for console in self.consoles]
+
+        trace_log = None
+        if self.trace_tail > 0:
+            trace_log = f"{local_test_dir}/qemu_trace_log.log"
+            await self.qt.tracer_on(trace_log)
+
+        need_restart = False
+        try:
+            exec_result, need_restart = await run_test_watching_console(self.fuzzer, fuzz_params, self.crash_event, self.crash_grace_sec)
+        except SSHError:
+            need_restart = True
+
+        if trace_log and not need_restart:
+            await self.qt.tracer_off()
+
+        # the reproducer only needs the consoles, but the 9p share must not fill up
+        self.fuzzer.collect_test_output(local_test_dir, fetch_remote=False)
+
+        crashed = need_restart or any(detector.crashed() for detector in self.crash_detectors)
+        signature = None
+        if crashed:
+            console_logs = [console.get(start).decode("utf-8", errors="replace") for console, start in zip(self.consoles, starts)]
+            signature = extract_crash_signature(console_logs, trace_log, trace_tail=self.trace_tail)
+
+        if need_restart or not self.fuzzer.qemu_process or self.fuzzer.qemu_process.poll() is not None:
+            if not await self.restart():
+                raise RuntimeError(f"{self.task_id}: failed to restart machine")
+        else:
+            await self.fuzzer.loadvm()
+
+        return signature
+
+    async def stop(self) -> None:
+        await close_consoles(*self.consoles)
+        self.consoles = []
+        self.fuzzer.stop_machine()
+
+class ReproPool:
+    def __init__(self, workers: list[ReproWorker]) -> None:
+        self.workers = workers
+        self.idle = asyncio.Queue()
+        for worker in workers:
+            self.idle.put_nowait(worker)
+
+    async def run(self, fuzz_params: dict) -> dict | None:
+        worker = await self.idle.get()
+        try:
+            return await worker.run(fuzz_params)
+        finally:
+            self.idle.put_nowait(worker)
+
+    async def run_all(self, params_list: list[dict]) -> list[dict | None]:
+        return await asyncio.gather(*[self.run(p) for p in params_list])
+
+    async def first_crash(self, candidates: list[dict], reference: dict) -> dict | None:
+        """
+        Run candidates in batches of the pool size and return the first one that still hits the same crash.
+        """
+        batch_size = len(self.workers)
+        for i in range(0, len(candidates), batch_size):
+            batch = candidates[i:i + batch_size]
+            signatures = await self.run_all(batch)
+            for candidate, signature in zip(batch, signatures):
+                if same_crash(signature, reference):
+                    return candidate
+        return None
+
+def is_hex_bytes(value: str) -> bool:
+    return len(value) % 2 == 0 and len(value) > 0 and all(c in string.hexdigits for c in value)
+
+def int_field(value) -> int | None:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.startswith("0x"):
+        try:
+            return int(value, 16)
+        except ValueError:
+            return None
+    return None
+
+def with_field(fuzz_params: dict, key: str, value) -> dict:
+    params = dict(fuzz_params)
+    params[key] = value
+    return params
+
+async def minimize_int_field(pool: ReproPool, fuzz_params: dict, key: str, reference: dict) -> dict:
+    value = int_field(fuzz_params[key])
+    as_str = isinstance(fuzz_params[key], str)
+    fmt = (lambda v: hex(v)) if as_str else (lambda v: v)
+
+    if value == 0:
+        return fuzz_params
+
+    found = await pool.first_crash([with_field(fuzz_params, key, fmt(0))], reference)
+    if found:
+        return found
+
+    # Clear set bits, most significant first, while the crash still reproduces.
+    # Each round tries the remaining bits in parallel and keeps the highest one that worked.
+    remaining = [bit for bit in reversed(range(value.bit_length())) if value & (1 << bit)]
+    while remaining:
+        candidates = [with_field(fuzz_params, key, fmt(value & ~(1 << bit))) for bit in remaining]
+        found = await pool.first_crash(candidates, reference)
+        if found is None:
+            break
+
+        cleared = remaining[candidates.index(found)]
+        value &= ~(1 << cleared)
+        fuzz_params = found
+        remaining = [bit for bit in remaining if bit < cleared]
+
+    return fuzz_params
+
+async def minimize_bytes_field(pool: ReproPool, fuzz_params: dict, key: str, reference: dict) -> dict:
+    data = fuzz_params[key]
+    chunk = (len(data) // 2) & ~1
+
+    while chunk >= 2:
+        candidates = [with_field(fuzz_params, key, data[:i] + data[i + chunk:]) for i in range(0, len(data), chunk)]
+        found = await pool.first_crash(candidates, reference)
+        if found:
+            fuzz_params = found
+            data = found[key]
+            chunk = min(chunk, (len(data) // 2) & ~1)
+        else:
+            chunk = (chunk // 2) & ~1
+
+    return fuzz_params
+
+async def minimize(pool: ReproPool, fuzz_params: dict, fixed_keys: set, reference: dict) -> dict:
+    for key in fuzz_params:
+        if key in fixed_keys:
+            continue
+
+        before = fuzz_params[key]
+        if int_field(before) is not None:
+            fuzz_params = await minimize_int_field(pool, fuzz_params, key, reference)
+        elif isinstance(before, str) and is_hex_bytes(before):
+            fuzz_params = await minimize_bytes_field(pool, fuzz_params, key, reference)
+        else:
+            continue
+
+        logger.info(f"Minimized {key}: {before} -> {fuzz_params[key]}")
+
+    return fuzz_params
+
+def read_fixed_keys(seed_file: str) -> set:
+    if seed_file is None:
+        return set()
+    seed = fuzzer_lib.read_json(seed_file)
+    return {key for key in seed if seed[key].get("fixed", False)}
+
+async def main():
+    args = parser_argument()
+
+    config = fuzzer_lib.read_json(args.config)
+    fuzz_params = fuzzer_lib.read_json(args.input)
+    fixed_keys = read_fixed_keys(args.seed)
+
+    work_dir = args.work_dir if args.work_dir else f"{config['fuzzing']['local_work_dir']}/repro"
+    os.makedirs(work_dir, exist_ok=True)
+    output = args.output if args.output else os.path.join(os.path.dirname(os.path.abspath(args.input)), f"{args.command}_result.json")
+
+    workers = [ReproWorker(config, i, work_dir, args.trace_tail) for i in range(args.workers)]
+    try:
+        for ret in await asyncio.gather(*[worker.start() for worker in workers]):
+            if not ret:
+                logger.error("Failed to start guests.")
+                return
+
+        pool = ReproPool(workers)
+
+        signatures = await pool.run_all([fuzz_params] * args.runs)
+        buckets = Counter(s["bucket"] for s in signatures if s is not None)
+        result = {
+            "input": os.path.abspath(args.input),
+            "runs": args.runs,
+            "crashes": sum(buckets.values()),
+            "signatures": [s for s in signatures if s is not None],
+        }
+
+        if not buckets:
+            logger.info(f"Crash did not reproduce in {args.runs} runs")
+        else:
+            reference_bucket, hits = buckets.most_common(1)[0]
+            reference = next(s for s in signatures if s is not None and s["bucket"] == reference_bucket)
+            result["reference"] = reference
+            result["stability"] = hits / args.runs
+            logger.info(f"Crash {reference['kind']} {reference['keys']} reproduced in {hits}/{args.runs} runs")
+
+            if args.command == "minimize":
+                minimized = await minimize(pool, dict(fuzz_params), fixed_keys, reference)
+                result["minimized"] = minimized
+                logger.info(f"Minimized input: {minimized}")
+
+        with open(output, "w") as f:
+            json.dump(result, f, indent=4)
+        logger.info(f"Result written to {output}")
+    finally:
+        for worker in workers:
+            await worker.stop()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Ctrl-C detected, stopping guests...")
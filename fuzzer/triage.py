@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+logging.basicConfig(level = logging.INFO, format='%(asctime)s:%(levelname)s: %(message)s')
+logger = logging.getLogger("mtcfuzz")
+
+import argparse
+import glob
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from lib.crash_triage import extract_crash_signature_from_dir
+from lib.trace_index import parse_test_dir_name
+
+def parser_argument():
+    parser = argparse.ArgumentParser(description="Re-triage crashes in a result directory into buckets")
+    parser.add_argument("--result-dir", type=str, required=True, help="Result directory (local_work_dir or a tree of them)")
+    parser.add_argument("--output", type=str, default=None, help="Output json file (default: <result-dir>/crash_buckets.json)")
+    parser.add_argument("--trace-tail", type=int, default=8, help="Number of PCs from the end of the trace used in the signature of crashes without a console key")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--remove-duplicates", action="store_true", help="Remove every crash dir except the bucket representative")
+
+    return parser.parse_args()
+
+def find_crashed_test_dirs(result_dir: str) -> list[str]:
+    pattern = os.path.join(result_dir, "**", "crashed.txt")
+    return sorted(os.path.dirname(f) for f in glob.glob(pattern, recursive=True))
+
+def crash_order_key(test_dir: str) -> tuple:
+    """
+    Order by the start time in the test dir name (<task id>-<YYYYmmddHHMMSS>-<uuid>), dirs without one last.
+    """
+    name = os.path.basename(test_dir)
+    _, name_time = parse_test_dir_name(name)
+    return (name_time is None, name_time or 0, name)
+
+def bucket_crashes(signatures: list[tuple[str, dict]]) -> dict:
+    buckets = {}
+    # sorted by start time so the oldest crash of a bucket is kept as its representative
+    for test_dir, signature in sorted(signatures, key=lambda x: crash_order_key(x[0])):
+        bucket = buckets.get(signature["bucket"])
+        if bucket is None:
+            buckets[signature["bucket"]] = {
+                **signature,
+                "count": 1,
+                "representative": test_dir,
+                "duplicates": [],
+            }
+        else:
+            bucket["count"] += 1
+            bucket["duplicates"].append(test_dir)
+    return buckets
+
+def main():
+    args = parser_argument()
+
+    result_dir = os.path.abspath(args.result_dir)
+    test_dirs = find_crashed_test_dirs(result_dir)
+    if not test_dirs:
+        logger.info("No crashed test found.")
+        return
+
+    logger.info(f"Triaging {len(test_dirs)} crashes with {args.jobs} workers")
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        signatures = list(executor.map(partial(extract_crash_signature_from_dir, trace_tail=args.trace_tail), test_dirs, chunksize=64))
+
+    buckets = bucket_crashes(signatures)
+
+    if args.remove_duplicates:
+        for bucket in buckets.values():
+            for test_dir in bucket["duplicates"]:
+                shutil.rmtree(test_dir, ignore_errors=True)
+            bucket["duplicates"] = []
+
+    output = args.output if args.output else f"{result_dir}/crash_buckets.json"
+    with open(output, "w") as f:
+        json.dump(buckets, f, indent=4)
+
+    for bucket_id, bucket in sorted(buckets.items(), key=lambda x: x[1]["count"], reverse=True):
+        logger.info(f"{bucket_id}: {bucket['kind']} {bucket['keys']} hits: {bucket['count']} representative: {bucket['representative']}")
+    logger.info(f"{len(test_dirs)} crashes in {len(buckets)} buckets, written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,19 @@ import argparse
 import json
 import glob
 import os
+import sys
 from bisect import bisect_right
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "fuzzer"))
+from lib.trace_archive import find_trace_archives, iter_trace_archive, read_trace_archive_index
+from lib.trace_index import update_trace_index
 
 def read_json(file_path):
     with open(file_path, 'r') as file:
@@ -29,6 +41,8 @@ def parse_args():
     parser.add_argument("--sort-by-count", action="store_true", help="Sort addresses by count")
     parser.add_argument("--sort-by-address", action="store_true", help="Sort addresses by address")
     parser.add_argument("--output", type=str, default="coverage_report.csv", help="Output file for the report")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--index", action="store_true", help="Read the traces from the trace index, updating it first")
     args = parser.parse_args()
 
     if not args.check_kernel_coverage and not args.check_firmware_coverage:
@@ -56,46 +70,142 @@ def create_merged_filter(check_kernel_coverage, check_firmware_coverage, address
     result.sort(key=lambda x: x[0])
     return result
 
+def select_in_filters(addrs, filters):
+    """
+    Return a keep flag per address. Like a bisect on the range starts, only the range
+    with the last start <= addr is checked.
+    """
+    starts = [pair[0] for pair in filters]
+    if np is None or not addrs or not filters:
+        result = []
+        for addr in addrs:
+            idx = bisect_right(starts, addr) - 1
+            result.append(idx >= 0 and filters[idx][0] <= addr <= filters[idx][1])
+        return result
+
+    # int(x, 16) also accepts strings like "-0x10", which can't be in a filter
+    valid = np.array([0 <= addr < 1 << 64 for addr in addrs])
+    arr = np.array([addr if 0 <= addr < 1 << 64 else 0 for addr in addrs], dtype=np.uint64)
+    idx = np.searchsorted(np.array(starts, dtype=np.uint64), arr, side="right") - 1
+    uppers = np.array([pair[1] for pair in filters], dtype=np.uint64)
+    return (valid & (idx >= 0) & (arr <= uppers[np.maximum(idx, 0)])).tolist()
+
+def reduce_trace_logs(trace_logs, filters):
+    """
+    Count the addresses of some trace logs. Keys are the trace lines as written, in the order
+    they are first seen, like the serial scan did.
+    """
+    counts = Counter()
+    for trace_log in trace_logs:
+        with open(trace_log, "r") as f:
+            counts.update(map(str.strip, f))
+
+    keys = []
+    addrs = []
+    for addr_s in counts:
+        try:
+            addr = int(addr_s, 16)
+        except ValueError:
+            continue
+        keys.append(addr_s)
+        addrs.append(addr)
+
+    return {addr_s: counts[addr_s] for addr_s, keep in zip(keys, select_in_filters(addrs, filters)) if keep}
+
+def reduce_trace_archive(archive_dir, records, filters):
+    """
+    Sum the hit counts of some tests of a trace archive, keyed like the serial scan did.
+    """
+    if np is None:
+        counts = {}
+        for _, pcs, pc_counts in iter_trace_archive(archive_dir, records):
+            for addr, count in zip(pcs, pc_counts):
+                counts[addr] = counts.get(addr, 0) + count
+        addrs = list(counts)
+        sums = list(counts.values())
+    else:
+        pcs_list = []
+        counts_list = []
+        for _, pcs, pc_counts in iter_trace_archive(archive_dir, records):
+            pcs_list.append(np.array(pcs, dtype=np.uint64))
+            counts_list.append(np.array(pc_counts, dtype=np.int64))
+        if not pcs_list:
+            return {}
+
+        all_pcs = np.concatenate(pcs_list)
+        all_counts = np.concatenate(counts_list)
+        uniq, first_seen, inverse = np.unique(all_pcs, return_index=True, return_inverse=True)
+        totals = np.zeros(len(uniq), dtype=np.int64)
+        np.add.at(totals, inverse.reshape(-1), all_counts)
+        # back to first-seen order, the order of the csv rows depends on it when counts tie
+        order = np.argsort(first_seen, kind="stable")
+        addrs = uniq[order].tolist()
+        sums = totals[order].tolist()
+
+    return {f"{addr:#x}": count for addr, count, keep in zip(addrs, sums, select_in_filters(addrs, filters)) if keep}
+
+def merge_counts(partials):
+    """
+    Tree-merge of partial tables. Partials are merged with their right neighbour only,
+    so keys stay in first-seen order.
+    """
+    while len(partials) > 1:
+        merged = []
+        for i in range(0, len(partials) - 1, 2):
+            left, right = partials[i], partials[i + 1]
+            for addr_s, count in right.items():
+                left[addr_s] = left.get(addr_s, 0) + count
+            merged.append(left)
+        if len(partials) % 2:
+            merged.append(partials[-1])
+        partials = merged
+
+    return partials[0] if partials else {}
+
+def split_chunks(items, num_chunks):
+    size = max((len(items) + num_chunks - 1) // num_chunks, 1)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
 def main():
     args = parse_args()
     config = read_json(args.config_json)
 
     test_result_dir = os.path.abspath(args.test_result_dir)
-    trace_log_files = collect_trace_log_files(test_result_dir)
-    if len(trace_log_files) == 0:
-        print("No trace log files found.")
-        return
-    
-    addresses = {}
-
+    jobs = max(args.jobs or 1, 1)
     filters = create_merged_filter(args.check_kernel_coverage, args.check_firmware_coverage, config["address_filters"])
 
-    starts = [pair[0] for pair in filters]
-
-    def addr_in_filters(addr, filters, starts):
-        idx = bisect_right(starts, addr) - 1
-        if idx < 0:
-            return False
-        lower, upper = filters[idx]
-        return lower <= addr <= upper
-
-
-    for trace_log in trace_log_files:
-        with open(trace_log, "r") as f:
-            for line in f:
-                addr_s = line.strip()
-
-                if addr_s in addresses:
-                    addresses[addr_s] += 1
-                    continue
-
-                try:
-                    addr = int(addr_s, 16)
-                except Exception:
-                    continue
-
-                if addr_in_filters(addr, filters, starts):
-                    addresses[addr_s] = 1
+    if args.index:
+        index_dir, records = update_trace_index(test_result_dir, jobs=jobs)
+        if len(records) == 0:
+            print("No trace log files found.")
+            return
+        work = [(reduce_trace_archive, index_dir, chunk, filters) for chunk in split_chunks(records, jobs * 4)]
+    else:
+        trace_log_files = collect_trace_log_files(test_result_dir)
+        trace_archives = find_trace_archives(test_result_dir)
+        if len(trace_log_files) == 0 and len(trace_archives) == 0:
+            print("No trace log files found.")
+            return
+
+        # traces archived by the fuzzer already hold unique PCs with their hit counts
+        archive_records = {archive_dir: read_trace_archive_index(archive_dir) for archive_dir in trace_archives}
+        # a kept test dir (keep_raw_trace) still has its raw trace although the archive has the test too
+        archived_tests = {record["test"] for records in archive_records.values() for record in records}
+        trace_log_files = [f for f in trace_log_files if os.path.basename(os.path.dirname(f)) not in archived_tests]
+
+        # a few chunks per worker to even out differences in trace size
+        work = [(reduce_trace_logs, chunk, filters) for chunk in split_chunks(trace_log_files, jobs * 4)]
+        for archive_dir, records in archive_records.items():
+            work += [(reduce_trace_archive, archive_dir, chunk, filters) for chunk in split_chunks(records, jobs * 4)]
+
+    if jobs > 1 and len(work) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(*w) for w in work]
+            partials = [future.result() for future in futures]
+    else:
+        partials = [w[0](*w[1:]) for w in work]
+
+    addresses = merge_counts(partials)
 
     address_items =list(addresses.items())
     if args.sort_by_count:
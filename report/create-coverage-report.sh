@@ -10,9 +10,12 @@ report_tool_dir="${mtcfuzz_top_dir}/report"
 if [ $# -ne 2 ]; then
     echo "[*]Usage: $0 <config json> <test result dir>"
     echo "e.g: $0 myconfig.json test_result/"
+    echo "    JOBS=<n> sets the number of worker processes (default: number of CPUs)"
     exit 1
 fi
 
+jobs="${JOBS:-$(nproc)}"
+
 config=$(realpath "$1")
 test_result_dir=$(realpath "$2")
 
@@ -27,6 +30,7 @@ for trd in $test_result_dirs; do
         --config-json "${config}" \
         --test-result-dir "${trd}" \
         --check-firmware-coverage \
-        --check-kernel-coverage
+        --check-kernel-coverage \
+        --jobs "${jobs}"
     echo "[+]Finish processing directory: ${trd}"
 done
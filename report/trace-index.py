@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "fuzzer"))
+from lib.trace_index import update_trace_index
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Create or update the trace index (<result dir>/.trace_index) used by the report tools")
+    parser.add_argument("--result-dir", required=True, help="Test result dir")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Number of worker processes")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    result_dir = os.path.abspath(args.result_dir)
+    index_dir, records = update_trace_index(result_dir, jobs=args.jobs)
+    crashes = sum(1 for record in records if record["crashed"])
+    tasks = sorted({record["task"] for record in records if record["task"] is not None})
+    print(f"[+]{len(records)} tests ({crashes} crashed) of {len(tasks)} tasks indexed in {index_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+/*
+ * Persistent in-guest executor for mtcfuzz.
+ *
+ * Runs commands sent by the fuzzer over a virtio-serial port so that a test
+ * does not need a new SSH login. The protocol is:
+ *
+ *   host -> guest: "RUN <id> <length> [<timeout ms>]\n" followed by <length> bytes of shell command
+ *   guest -> host: "DONE <id> <exit code> <elapsed us> <stdout length> <stderr length> <timed out>\n"
+ *                  followed by the stdout and the stderr bytes
+ *
+ * The elapsed time is measured in the guest around the command only.
+ * A command still running after its timeout (--timeout when the request has none, 0 for no limit)
+ * is killed with its process group, <timed out> is 1 then.
+ */
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <dirent.h>
+#include <getopt.h>
+#include <time.h>
+#include <signal.h>
+#include <sys/time.h>
+#include <sys/types.h>
+#include <sys/stat.h>
+#include <sys/wait.h>
+
+#define DEFAULT_PORT_NAME "mtcfuzz.executor"
+#define VIRTIO_PORTS_DIR "/sys/class/virtio-ports"
+#define MAX_CMD_LEN (1024 * 1024)
+
+static struct option long_options[] = {
+    { "device", required_argument, NULL, 'd'},
+    { "name", required_argument, NULL, 'n'},
+    { "timeout", required_argument, NULL, 't'},
+    { "help", no_argument, NULL, 'h' },
+    {0, 0, NULL, 0}
+};
+
+/* find /dev/vportXpY whose port name is name */
+static int find_port_device(const char *name, char *path, size_t len)
+{
+    DIR *dir;
+    struct dirent *ent;
+    char name_file[512];
+    char buf[256];
+    FILE *fp;
+    int found = -1;
+
+    dir = opendir(VIRTIO_PORTS_DIR);
+    if (!dir) {
+        perror("opendir");
+        return -1;
+    }
+
+    while ((ent = readdir(dir)) != NULL) {
+        if (ent->d_name[0] == '.')
+            continue;
+
+        snprintf(name_file, sizeof(name_file), "%s/%s/name", VIRTIO_PORTS_DIR, ent->d_name);
+        fp = fopen(name_file, "r");
+        if (!fp)
+            continue;
+
+        if (fgets(buf, sizeof(buf), fp)) {
+            buf[strcspn(buf, "\n")] = '\0';
+            if (!strcmp(buf, name)) {
+                snprintf(path, len, "/dev/%s", ent->d_name);
+                found = 0;
+            }
+        }
+        fclose(fp);
+
+        if (!found)
+            break;
+    }
+
+    closedir(dir);
+    return found;
+}
+
+static int read_line(int fd, char *buf, size_t len)
+{
+    size_t pos = 0;
+    ssize_t n;
+    char c;
+
+    while (pos < len - 1) {
+        n = read(fd, &c, 1);
+        if (n < 0 && errno == EINTR)
+            continue;
+        if (n <= 0)
+            return -1;
+        if (c == '\n')
+            break;
+        buf[pos++] = c;
+    }
+
+    buf[pos] = '\0';
+    return pos;
+}
+
+static int read_full(int fd, char *buf, size_t len)
+{
+    size_t pos = 0;
+    ssize_t n;
+
+    while (pos < len) {
+        n = read(fd, buf + pos, len - pos);
+        if (n < 0 && errno == EINTR)
+            continue;
+        if (n <= 0)
+            return -1;
+        pos += n;
+    }
+
+    return 0;
+}
+
+static int write_full(int fd, const char *buf, size_t len)
+{
+    size_t pos = 0;
+    ssize_t n;
+
+    while (pos < len) {
+        n = write(fd, buf + pos, len - pos);
+        if (n < 0 && errno == EINTR)
+            continue;
+        if (n <= 0)
+            return -1;
+        pos += n;
+    }
+
+    return 0;
+}
+
+static int send_file_contents(int port, int fd, off_t size)
+{
+    char buf[4096];
+    ssize_t n;
+
+    lseek(fd, 0, SEEK_SET);
+    while (size > 0) {
+        n = read(fd, buf, size < (off_t) sizeof(buf) ? (size_t) size : sizeof(buf));
+        if (n <= 0)
+            return -1;
+        if (write_full(port, buf, n) < 0)
+            return -1;
+        size -= n;
+    }
+
+    return 0;
+}
+
+static long elapsed_us(struct timespec *start, struct timespec *end)
+{
+    return (end->tv_sec - start->tv_sec) * 1000000L + (end->tv_nsec - start->tv_nsec) / 1000L;
+}
+
+static volatile sig_atomic_t deadline_passed;
+
+static void on_alarm(int sig)
+{
+    (void) sig;
+    deadline_passed = 1;
+}
+
+static void set_deadline(long timeout_ms)
+{
+    struct itimerval timer = { 0 };
+
+    timer.it_value.tv_sec = timeout_ms / 1000;
+    timer.it_value.tv_usec = (timeout_ms % 1000) * 1000;
+    setitimer(ITIMER_REAL, &timer, NULL);
+}
+
+static int run_command(int port, const char *id, const char *cmd, long timeout_ms)
+{
+    FILE *out, *err;
+    struct stat out_st, err_st;
+    struct timespec start, end;
+    char header[256];
+    pid_t pid;
+    int status = 0;
+    int timed_out = 0;
+    int rc;
+
+    out = tmpfile();
+    err = tmpfile();
+    if (!out || !err) {
+        perror("tmpfile");
+        if (out)
+            fclose(out);
+        if (err)
+            fclose(err);
+        return -1;
+    }
+
+    clock_gettime(CLOCK_MONOTONIC, &start);
+
+    pid = fork();
+    if (pid < 0) {
+        perror("fork");
+        fclose(out);
+        fclose(err);
+        return -1;
+    }
+
+    if (pid == 0) {
+        int devnull = open("/dev/null", O_RDONLY);
+
+        /* own process group, so a timeout kills everything the command started */
+        setpgid(0, 0);
+        dup2(devnull, STDIN_FILENO);
+        dup2(fileno(out), STDOUT_FILENO);
+        dup2(fileno(err), STDERR_FILENO);
+        close(port);
+        execl("/bin/sh", "sh", "-c", cmd, (char *) NULL);
+        _exit(127);
+    }
+
+    deadline_passed = 0;
+    if (timeout_ms > 0)
+        set_deadline(timeout_ms);
+
+    while (waitpid(pid, &status, 0) < 0 && errno == EINTR) {
+        if (deadline_passed && !timed_out) {
+            kill(-pid, SIGKILL);
+            kill(pid, SIGKILL);
+            timed_out = 1;
+        }
+    }
+
+    if (timeout_ms > 0)
+        set_deadline(0);
+
+    clock_gettime(CLOCK_MONOTONIC, &end);
+
+    if (WIFEXITED(status))
+        rc = WEXITSTATUS(status);
+    else
+        rc = 128 + WTERMSIG(status);
+
+    fstat(fileno(out), &out_st);
+    fstat(fileno(err), &err_st);
+
+    snprintf(header, sizeof(header), "DONE %s %d %ld %lld %lld %d\n", id, rc, elapsed_us(&start, &end),
+             (long long) out_st.st_size, (long long) err_st.st_size, timed_out);
+
+    if (write_full(port, header, strlen(header)) < 0 ||
+        send_file_contents(port, fileno(out), out_st.st_size) < 0 ||
+        send_file_contents(port, fileno(err), err_st.st_size) < 0) {
+        fprintf(stderr, "Failed to send result of %s\n", id);
+    }
+
+    fclose(out);
+    fclose(err);
+
+    return 0;
+}
+
+int main(int argc, char **argv)
+{
+    int opt;
+    int opt_index = 0;
+    int port;
+    char device[256] = {0};
+    const char *port_name = DEFAULT_PORT_NAME;
+    char line[256];
+    char id[64];
+    long len;
+    long timeout_ms;
+    long default_timeout_ms = 0;
+    char *cmd;
+    struct sigaction sa = { 0 };
+
+    while ((opt = getopt_long_only(argc, argv, "", long_options, &opt_index)) != -1) {
+        switch (opt) {
+            case 'd':
+                strncpy(device, optarg, sizeof(device) - 1);
+                break;
+            case 'n':
+                port_name = optarg;
+                break;
+            case 't':
+                default_timeout_ms = (long) (strtod(optarg, NULL) * 1000);
+                break;
+            case 'h':
+                fprintf(stderr, "Usage: %s [options]\n", argv[0]);
+                fprintf(stderr, "Options:\n");
+                fprintf(stderr, "  --device <path>      virtio-serial port device\n");
+                fprintf(stderr, "  --name <name>        port name to look up when --device is not given (default: %s)\n", DEFAULT_PORT_NAME);
+                fprintf(stderr, "  --timeout <seconds>  kill commands running longer, for requests without a timeout (default: no limit)\n");
+                fprintf(stderr, "  --help               Show this help message\n");
+                return 0;
+            default:
+                fprintf(stderr, "Unknown option: %c\n", opt);
+                return -1;
+        }
+    }
+
+    if (strlen(device) == 0 && find_port_device(port_name, device, sizeof(device)) < 0) {
+        fprintf(stderr, "virtio-serial port %s not found\n", port_name);
+        return -1;
+    }
+
+    port = open(device, O_RDWR);
+    if (port < 0) {
+        perror("[*]Failed to open port");
+        return -1;
+    }
+
+    /* no SA_RESTART, the alarm has to interrupt waitpid() */
+    sa.sa_handler = on_alarm;
+    sigemptyset(&sa.sa_mask);
+    sigaction(SIGALRM, &sa, NULL);
+
+    cmd = malloc(MAX_CMD_LEN + 1);
+    if (!cmd) {
+        perror("malloc");
+        return -1;
+    }
+
+    for (;;) {
+        if (read_line(port, line, sizeof(line)) < 0) {
+            /* the host side is not connected, wait for it */
+            usleep(100 * 1000);
+            continue;
+        }
+
+        timeout_ms = default_timeout_ms;
+        if (sscanf(line, "RUN %63s %ld %ld", id, &len, &timeout_ms) < 2 || len < 0 || len > MAX_CMD_LEN) {
+            fprintf(stderr, "Invalid request: %s\n", line);
+            continue;
+        }
+
+        if (read_full(port, cmd, len) < 0) {
+            fprintf(stderr, "Failed to read command of %s\n", id);
+            continue;
+        }
+        cmd[len] = '\0';
+
+        run_command(port, id, cmd, timeout_ms);
+    }
+
+    return 0;
+}
@@ -5,9 +5,12 @@
 #include <unistd.h>
 #include <sys/ioctl.h>
 #include <getopt.h>
+#include <time.h>
 #include "sbi_fuzz.h"
 
 #define SBI_FUZZ_DEVICE "/dev/sbi_fuzz"
+/* last stderr line with the start/end of the ecall in ns, parsed by split_guest_timing() of fuzzer/lib/ssh_client.py */
+#define GUEST_TIMING_MARKER "@@mtcfuzz-elapsed"
 
 static struct option long_options[] = {
     { "output-dir", required_argument, NULL, 'o'},
@@ -20,6 +23,7 @@ static struct option long_options[] = {
     { "a4", required_argument, NULL, 'E'},
     { "a5", required_argument, NULL, 'F'},
     { "notrace", no_argument, NULL, 'n'},
+    { "batch", no_argument, NULL, 'b'},
     { "help", no_argument, NULL, 'h' },
     {0, 0, NULL, 0}
 };
@@ -29,11 +33,15 @@ int write_result(struct sbi_data *params, const char *output_dir)
     FILE *fp;
     char filename[256];
 
-    snprintf(filename, sizeof(filename), "%s/ecall_result.json", output_dir);
-    fp = fopen(filename, "w");
-    if (!fp) {
-        perror("fopen");
-        return -1;
+    if (!strcmp(output_dir, "-")) {
+        fp = stdout;
+    } else {
+        snprintf(filename, sizeof(filename), "%s/ecall_result.json", output_dir);
+        fp = fopen(filename, "w");
+        if (!fp) {
+            perror("fopen");
+            return -1;
+        }
     }
 
     fprintf(fp, "{\n");
@@ -48,7 +56,48 @@ int write_result(struct sbi_data *params, const char *output_dir)
     fprintf(fp, "  \"error\": \"0x%lx\",\n", params->ret.error);
     fprintf(fp, "  \"value\": \"0x%lx\"\n", params->ret.value);
     fprintf(fp, "}\n");
-    fclose(fp);
+    if (fp != stdout)
+        fclose(fp);
+
+    return 0;
+}
+
+/*
+ * Batch mode: read "eid fid a0 a1 a2 a3 a4 a5" (hex) lines from stdin, run them back to back
+ * and print one json line per input. The fuzzer splits the trace at every entry of the ioctl.
+ */
+int run_batch(int fd)
+{
+    char line[512];
+    struct sbi_data params;
+    struct timespec start, end;
+    long elapsed_us;
+    int ret;
+
+    while (fgets(line, sizeof(line), stdin)) {
+        memset(&params, 0, sizeof(params));
+        if (sscanf(line, "%lx %lx %lx %lx %lx %lx %lx %lx",
+                   &params.eid, &params.fid, &params.a0, &params.a1,
+                   &params.a2, &params.a3, &params.a4, &params.a5) != 8) {
+            fprintf(stderr, "Invalid batch input: %s", line);
+            printf("{\"ret\": -1}\n");
+            fflush(stdout);
+            continue;
+        }
+
+        clock_gettime(CLOCK_MONOTONIC, &start);
+        ret = ioctl(fd, SBI_FUZZ_IOCTL_EXEC_ECALL, &params);
+        clock_gettime(CLOCK_MONOTONIC, &end);
+        elapsed_us = (end.tv_sec - start.tv_sec) * 1000000L + (end.tv_nsec - start.tv_nsec) / 1000L;
+
+        printf("{\"ret\": %d, \"elapsed_us\": %ld, \"eid\": \"0x%lx\", \"fid\": \"0x%lx\", \"a0\": \"0x%lx\", \"a1\": \"0x%lx\", "
+               "\"a2\": \"0x%lx\", \"a3\": \"0x%lx\", \"a4\": \"0x%lx\", \"a5\": \"0x%lx\", "
+               "\"error\": \"0x%lx\", \"value\": \"0x%lx\"}\n",
+               ret, elapsed_us, params.eid, params.fid, params.a0, params.a1, params.a2, params.a3,
+               params.a4, params.a5, params.ret.error, params.ret.value);
+        /* flush per input so the results before a crash still reach the host */
+        fflush(stdout);
+    }
 
     return 0;
 }
@@ -60,6 +109,8 @@ int main(int argc, char **argv)
     int opt;
     int opt_index = 0;
     struct sbi_data params = { 0x0 };
+    struct timespec start, end;
+    int batch = 0;
 
     char output_dir[256] = {0};
 
@@ -68,10 +119,13 @@ int main(int argc, char **argv)
             case 'o':
                 strncpy(output_dir, optarg, sizeof(output_dir) - 1);
                 break;
+            case 'b':
+                batch = 1;
+                break;
             case 'h':
                 fprintf(stderr, "Usage: %s [options]\n", argv[0]);
                 fprintf(stderr, "Options:\n");
-                fprintf(stderr, "  --output-dir <prefix>  output directory\n");
+                fprintf(stderr, "  --output-dir <prefix>  output directory (- for stdout)\n");
                 fprintf(stderr, "  --eid <eid>         Specify EID\n");
                 fprintf(stderr, "  --fid <fid>         Specify FID\n");
                 fprintf(stderr, "  --a0 <value>         Specify a0 value\n");
@@ -80,6 +134,7 @@ int main(int argc, char **argv)
                 fprintf(stderr, "  --a4 <value>         Specify a4 value\n");
                 fprintf(stderr, "  --a5 <value>         Specify a5 value\n");
                 fprintf(stderr, "  --notrace            do not trace kcov and sbi_cov\n");
+                fprintf(stderr, "  --batch              read inputs from stdin, one per line\n");
                 fprintf(stderr, "  --help               Show this help message\n");
                 return 0;
             case 'e':
@@ -112,6 +167,17 @@ int main(int argc, char **argv)
         }
     }
 
+    if (batch) {
+        fd = open(SBI_FUZZ_DEVICE, O_RDWR);
+        if (fd < 0) {
+            perror("[*]Failed to open device");
+            return -1;
+        }
+        ret = run_batch(fd);
+        close(fd);
+        return ret;
+    }
+
     if (strlen(output_dir) == 0) {
         fprintf(stderr, "Output directory name is required\n");
         return -1;
@@ -123,10 +189,16 @@ int main(int argc, char **argv)
         return -1;
     }
 
+    /* time the ioctl only, like the batch mode does */
+    clock_gettime(CLOCK_MONOTONIC, &start);
     ioctl(fd, SBI_FUZZ_IOCTL_EXEC_ECALL, &params);
+    clock_gettime(CLOCK_MONOTONIC, &end);
 
     ret = write_result(&params, output_dir);
 
+    fprintf(stderr, GUEST_TIMING_MARKER " %lld %lld\n",
+            start.tv_sec * 1000000000LL + start.tv_nsec, end.tv_sec * 1000000000LL + end.tv_nsec);
+
     close(fd);
 
     return ret;
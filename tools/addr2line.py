@@ -1,12 +1,14 @@
 #!/usr/bin/env python3
 
 import argparse
-import subprocess
-import re
-import tempfile
+import json
 import yaml
 import os
 import shutil
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "fuzzer"))
+from lib.symbolizer import SymbolCache, Symbolizer
 
 def write_analyzed_data(cover_data, output_file):
     with open(output_file, "w") as f:
@@ -16,24 +18,7 @@ def write_analyzed_data(cover_data, output_file):
 
     print(f"[+] Analyzed coverage data written to {output_file}")
 
-def call_addr2line(addr2line, binary, addr_list):
-    if not addr_list:
-        return []
-
-    with tempfile.NamedTemporaryFile(mode="w+", delete=False) as tf:
-        for a in addr_list:
-            tf.write(a + "\n")
-        tf.flush()
-
-        result = subprocess.run(
-            [addr2line, "-e", binary, "-f", "-p", "-a", "@" + tf.name],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-    return result.stdout.strip().splitlines()
-
-def run_addr2line(addresses, addr_count_map, config):
+def run_addr2line(addresses, addr_count_map, config, cache):
     results = []
 
     for target in config:
@@ -44,7 +29,6 @@ def run_addr2line(addresses, addr_count_map, config):
             continue
 
         target_addresses = []
-        addr_pair = {}
 
         data = config[target]
 
@@ -56,33 +40,30 @@ def run_addr2line(addresses, addr_count_map, config):
         for addr in addresses:
             addr = int(addr, 16)
             if addr >= low and addr <= high:
-                actual_addr = hex(addr - base_addr)
-                # print(f"{hex(addr)} - {hex(base_addr)} = {hex(addr - base_addr)}")
-                target_addresses.append(actual_addr)
-                addr_pair[actual_addr] = hex(addr)
-
-        a2r_result = call_addr2line(config["addr2line"]["binary"], data["elf"], target_addresses)   
-        for line in a2r_result:
-            # e.g.:
-            # 0x000000000000a704: tlb_range_check at /path/to/file.c:274
-            match = re.match(r"^0x[0-9a-fA-F]+:\s+(.*?)\s+at\s+(.+):(\d+)(?:\s+\(discriminator\s+\d+\))?$", line)
-            if match:
-                func_name = match.group(1)
-                file_path = match.group(2)
-                line_num = int(match.group(3))
-                address = int(line.split(":")[0].strip(), 16)
-                addr = hex(address)
-                if not addr in results:
-                    d = {
-                        "binary_offset_address": addr,
-                        "loaded_address": addr_pair[addr],
-                        "function": func_name,
-                        "file": os.path.abspath(file_path),
-                        "line": line_num,
-                        "count": addr_count_map[addr_pair[addr]],
-                    }
-                    
-                    results.append(d)
+                target_addresses.append((addr - base_addr, hex(addr)))
+
+        if not target_addresses:
+            continue
+
+        # the DWARF of each ELF is loaded once and only for addresses missing in the cache
+        symbolizer = Symbolizer(config["addr2line"]["binary"], data["elf"], cache)
+        try:
+            symbols = symbolizer.symbolize([offset for offset, _ in target_addresses])
+        finally:
+            symbolizer.close()
+
+        for offset, loaded_address in target_addresses:
+            func_name, file_path, line_num = symbols[offset]
+            if line_num is None:
+                continue
+            results.append({
+                "binary_offset_address": hex(offset),
+                "loaded_address": loaded_address,
+                "function": func_name,
+                "file": os.path.abspath(file_path),
+                "line": line_num,
+                "count": addr_count_map[loaded_address],
+            })
 
     return results
 
@@ -91,6 +72,9 @@ def parse_args():
     parser.add_argument("--config", type=str, required=True, help="config yaml file path")
     parser.add_argument("--trace-log", type=str, required=True, help="qemu trace log file")
     parser.add_argument("--output", type=str, default="analyzed_coverage.csv", help="output file name")
+    parser.add_argument("--ta-layout", type=str, default=None, help="ta_layout.json saved by the fuzzer, overrides the address range and base of --ta-target")
+    parser.add_argument("--ta-target", type=str, default="ftpm-ta", help="config entry of the TA relocated by --ta-layout")
+    parser.add_argument("--symbol-cache", type=str, default=None, help="symbol cache file (default: ~/.cache/mtcfuzz/symbols.sqlite3)")
     args = parser.parse_args()
 
     return args
@@ -100,6 +84,19 @@ def read_config(file_path):
         data = yaml.safe_load(f)
     return data
 
+def apply_ta_layout(config, layout_file, target):
+    """Use the TA load address the fuzzer found at boot instead of the one in the config."""
+    with open(layout_file, "r") as f:
+        layout = json.load(f)
+
+    if target not in config:
+        print(f"[-] {target} is not in the config, {layout_file} is not applied")
+        return
+
+    for key, value in layout["addr2line"].items():
+        config[target][key] = int(value, 16)
+    print(f"[+] {target} relocated to {layout['load_address']}")
+
 def read_trace_log(trace_log):
     ret = {}
     with open(trace_log, "r") as f:
@@ -118,10 +115,16 @@ def main():
     args = parse_args()
 
     config = read_config(args.config)
+    if args.ta_layout:
+        apply_ta_layout(config, args.ta_layout, args.ta_target)
     addr_count_map = read_trace_log(args.trace_log)
 
     addresses = sorted(addr_count_map.keys(), key=lambda x: int(x, 16))
-    cover_data = run_addr2line(addresses, addr_count_map, config)
+    cache = SymbolCache(args.symbol_cache)
+    try:
+        cover_data = run_addr2line(addresses, addr_count_map, config, cache)
+    finally:
+        cache.close()
 
     write_analyzed_data(cover_data, args.output)
 
@@ -4,6 +4,10 @@ import glob
 import re
 import os
 import pprint
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "fuzzer"))
+from lib.trace_index import update_trace_index
 
 
 UNIT_TO_SECONDS = {
@@ -36,6 +40,7 @@ def parse_args():
     parser = argparse.ArgumentParser(description="Calulate average test count")
     parser.add_argument("--result-dir", required=True, help="Test result dir")
     parser.add_argument("--time", required=True, help="Test time (5m, 1h...)")
+    parser.add_argument("--index", action="store_true", help="Count the tests in the trace index (including archived ones), updating it first")
     args = parser.parse_args()
 
     return args
@@ -49,7 +54,11 @@ def main(args):
 
     tmp = []
     for d in dirs:
-        count = find_files(d, "qemu_trace_log.log")
+        if args.index:
+            _, records = update_trace_index(d, jobs=os.cpu_count())
+            count = len(records)
+        else:
+            count = find_files(d, "qemu_trace_log.log")
         tmp.append(count / duration)
     
     avg = sum(tmp) / len(tmp)
@@ -2,9 +2,11 @@
 
 import argparse
 import json
-import angr
+import os
+import sys
 
-import pprint
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "fuzzer"))
+from lib.static_layout import StaticLayout
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Count basic blocks")
@@ -12,6 +14,9 @@ def parse_args():
     parser.add_argument("--binary", required=True, help="Path to binary file")
     parser.add_argument("--filter", required=True, help="kernel or firmware")
     parser.add_argument("--output", default="output.csv", help="Output filename")
+    parser.add_argument("--objdump", default="objdump", help="objdump binary, e.g. riscv64-linux-gnu-objdump")
+    parser.add_argument("--layout-cache", default=None, help="static layout cache dir (default: ~/.cache/mtcfuzz/layout)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Number of objdump processes when the layout is not cached")
     args = parser.parse_args()
 
     return args
@@ -23,7 +28,8 @@ def get_target_functions(config_file, filter_type):
         j = json.load(f)
         filters = j["address_filters"][filter_type]
         for filter in filters:
-            funcs.append(filter["name"])
+            # merged filters list every function they cover
+            funcs.extend(filter.get("functions", [filter["name"]]))
     
     return funcs
 
@@ -32,20 +38,16 @@ def main(args):
 
     funcs = get_target_functions(args.config, args.filter)
 
-    print(f"Load {args.binary}")
-    p = angr.Project(args.binary, load_options={'auto_load_libs': False})
+    # built once per build-id, later runs only read the cache
+    print(f"Load static layout of {args.binary}")
+    layout = StaticLayout.load_or_build(args.binary, args.objdump, args.layout_cache, args.jobs)
 
-    print("Create CFG")
-    cfg = p.analyses.CFGFast()
-    print("Create CFG Done.")
-    
-    for func in cfg.kb.functions.values():
-        if func.name in funcs:
-            bb_count = len(func.block_addrs)
-            if func.name in bbdata:
-                print(f"function {func.name} is already listed")
+    for start, end, name in zip(layout.starts, layout.ends, layout.names):
+        if name in funcs:
+            if name in bbdata:
+                print(f"function {name} is already listed")
                 continue
-            bbdata[func.name] = bb_count
+            bbdata[name] = layout.count_blocks(start, end)
             
     bbdata = dict(sorted(bbdata.items(), key=lambda x: x[0]))
     with open(args.output, "w") as f:
@@ -1,87 +1,207 @@
 #!/usr/bin/env python3
 import os
-from pathlib import Path
+import sys
 import argparse
 import json
-from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
 
-QEMU_TRACE_LOG_FILE = "qemu_trace_log.log"
+import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "fuzzer"))
+from lib.trace_archive import decode_record, find_trace_archives, read_trace_archive_index
+from lib.trace_index import QEMU_TRACE_LOG_FILE, parse_test_dir_name, update_trace_index
 
-def write_csv(output_filename: str, coverages: dict[int, dict]) -> None:
+# tests are loaded and accumulated this many at a time
+CHUNK_SIZE = 1024
+# above this many filtered bytes the seen addresses are kept as a sorted array instead of a mask
+MAX_SEEN_MASK_SIZE = 1 << 30
+
+
+def write_csv(output_filename: str, new_counts) -> None:
     """
     Write CSV lines: test_no,new_count,cumulative_count
     """
-    cumulative = 0
+    cumulative = np.cumsum(new_counts)
     with open(output_filename, "w") as f:
-        for test_no in sorted(coverages):
-            d = coverages[test_no]
-            cumulative += d["new_count"]
-            f.write(f"{d['test_no']},{d['new_count']},{cumulative}\n")
+        for test_no, (new_count, total) in enumerate(zip(new_counts.tolist(), cumulative.tolist())):
+            f.write(f"{test_no},{new_count},{total}\n")
 
 
-def addr_in_filters(addr: int, filters: list[tuple[int, int]], starts: list[int]) -> bool:
+class AddressFilter:
     """
-    Return True if addr is inside any non-overlapping, sorted [lower, upper] ranges.
-    Assumption: filters are merged (non-overlapping) and sorted by lower bound.
+    Sorted [lower, upper] ranges. An address is checked against the range with the last lower bound <= addr,
+    and mapped to a slot in the concatenation of all ranges for the seen-mask.
     """
-    idx = bisect_right(starts, addr) - 1
-    if idx < 0:
-        return False
-    lower, upper = filters[idx]
-    return lower <= addr <= upper
-
-
-def apply_filter(
-    trace_logs: list[str],
-    filters: list[tuple[int, int]],
-    starts: list[int],
-    coverages: dict[int, dict],
-    test_no: int,
-    seen_addrs: set[int],
-) -> None:
+    def __init__(self, filters: list[tuple[int, int]]) -> None:
+        self.lowers = np.array([lower for lower, _ in filters], dtype=np.uint64)
+        self.uppers = np.array([upper for _, upper in filters], dtype=np.uint64)
+        sizes = [upper - lower + 1 for lower, upper in filters]
+        self.bases = np.array([0] + sizes[:-1], dtype=np.uint64).cumsum(dtype=np.uint64)
+        self.size = sum(sizes)
+
+    def apply(self, pcs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return a keep mask for pcs and the seen-mask slots of the kept ones.
+        """
+        if len(self.lowers) == 0:
+            return np.zeros(len(pcs), dtype=bool), np.empty(0, dtype=np.uint64)
+        idx = np.searchsorted(self.lowers, pcs, side="right").astype(np.int64) - 1
+        clipped = np.maximum(idx, 0)
+        keep = (idx >= 0) & (pcs <= self.uppers[clipped])
+        slots = pcs[keep] - self.lowers[clipped[keep]] + self.bases[clipped[keep]]
+        return keep, slots
+
+
+class CoverageAccumulator:
     """
-    Count newly discovered addresses in this test:
-      - Only addresses inside the filters are considered.
-      - An address is "new" if it has not appeared in any previous test.
-      - Multiple occurrences of the same address in the same test are counted once.
+    New-PC count per test in test order, fed a chunk of tests at a time.
     """
-    new_addrs: set[int] = set()
-
-    for line in trace_logs:
-        addr_s = line.strip()
+    def __init__(self, address_filter: AddressFilter) -> None:
+        self.address_filter = address_filter
+        if address_filter.size <= MAX_SEEN_MASK_SIZE:
+            self.seen_mask = np.zeros(address_filter.size, dtype=bool)
+            self.seen = None
+        else:
+            self.seen_mask = None
+            self.seen = np.empty(0, dtype=np.uint64)
+
+    def add_chunk(self, chunk: list[np.ndarray]) -> np.ndarray:
+        if not chunk:
+            return np.zeros(0, dtype=np.int64)
+
+        pcs = np.concatenate(chunk)
+        test_ids = np.repeat(np.arange(len(chunk)), [len(p) for p in chunk])
+        keep, slots = self.address_filter.apply(pcs)
+        test_ids = test_ids[keep]
+
+        # first occurrence of every address in this chunk, the chunk is in test order
+        uniq, first = np.unique(slots, return_index=True)
+        if self.seen_mask is not None:
+            is_new = ~self.seen_mask[uniq]
+            self.seen_mask[uniq[is_new]] = True
+        else:
+            is_new = ~np.isin(uniq, self.seen, assume_unique=True)
+            self.seen = np.union1d(self.seen, uniq)
+
+        return np.bincount(test_ids[first[is_new]], minlength=len(chunk))
+
+
+HEX_DIGITS = np.full(256, 255, dtype=np.uint8)
+for i, c in enumerate(b"0123456789abcdef"):
+    HEX_DIGITS[c] = i
+    HEX_DIGITS[bytes([c]).upper()[0]] = i
+
+
+def parse_hex_tokens(tokens: list[bytes]) -> np.ndarray | None:
+    """
+    Vectorized int(token, 16) for tokens like 0x80001234 or 80001234 of up to 16 digits.
+    Return None if any token is something else, int() has to decide about those.
+    """
+    arr = np.array(tokens)
+    if arr.dtype.itemsize > 18:
+        return None
+
+    m = arr.view(np.uint8).reshape(len(arr), arr.dtype.itemsize)
+    lengths = np.strings.str_len(arr) if hasattr(np, "strings") else np.char.str_len(arr)
+    start = np.where((m[:, 0] == ord("0")) & ((m[:, 1] | 0x20) == ord("x")) & (lengths > 2), 2, 0) if m.shape[1] > 1 else np.zeros(len(arr), dtype=np.int64)
+    if np.any(lengths - start > 16) or np.any(lengths - start < 1):
+        return None
+
+    nibbles = HEX_DIGITS[m]
+    values = np.zeros(len(arr), dtype=np.uint64)
+    for j in range(m.shape[1]):
+        in_digits = (j >= start) & (j < lengths)
+        if np.any(nibbles[in_digits, j] == 255):
+            return None
+        values = np.where(in_digits, (values << np.uint64(4)) | nibbles[:, j].astype(np.uint64), values)
+    return values
+
+
+def read_trace_log_pcs(filename: str) -> np.ndarray:
+    """
+    Addresses of a qemu_trace_log.log, malformed lines are skipped.
+    """
+    with open(filename, "rb") as f:
+        data = f.read()
+
+    # one token per line means no blank lines and nothing but the address on a line
+    tokens = data.split()
+    lines = data.count(b"\n") + (1 if data and not data.endswith(b"\n") else 0)
+    if tokens and len(tokens) == lines:
+        # traces repeat the same PCs a lot, parse every one once
+        values = parse_hex_tokens(list(set(tokens)))
+        if values is not None:
+            return values
+
+    pcs = []
+    for addr_s in set(line.strip() for line in data.decode(errors="replace").splitlines()):
         try:
-            addr = int(addr_s, 16)
-        except Exception:
-            # Skip malformed lines
-            continue
-
-        # Skip addresses outside of the filter ranges
-        if not addr_in_filters(addr, filters, starts):
-            continue
-
-        # Skip addresses already seen in earlier tests
-        if addr in seen_addrs:
+            pc = int(addr_s, 16)
+        except ValueError:
             continue
+        if 0 <= pc < 1 << 64:
+            pcs.append(pc)
+    return np.array(pcs, dtype=np.uint64)
 
-        # Record as newly discovered in this test (deduplicate within the test)
-        new_addrs.add(addr)
 
-    # Update global seen set after processing this test
-    seen_addrs.update(new_addrs)
-
-    coverages[test_no] = {
-        "test_no": test_no,
-        "new_count": len(new_addrs),
-    }
+def test_order_key(test_dir_name: str, timestamp: float) -> tuple:
+    """
+    Tests run in the order of the start time in their dir name (<task id>-<YYYYmmddHHMMSS>-<uuid>),
+    the finish time orders tests started within the same second.
+    """
+    _, name_time = parse_test_dir_name(test_dir_name)
+    return (name_time if name_time is not None else timestamp, timestamp, test_dir_name)
 
 
-def read_qemu_trace_log(filename: Path) -> list[str]:
+def collect_tests(base_dir: str, use_index: bool, jobs: int) -> list[tuple]:
     """
-    Read qemu_trace_log.log and return lines.
+    Return (order key, trace log path, archive dir, archive record) for every test.
     """
-    with open(filename) as f:
-        return f.readlines()
+    tests = []
+    if use_index:
+        index_dir, records = update_trace_index(base_dir, jobs=jobs)
+        for record in records:
+            tests.append((test_order_key(record["test"], record["time"]), None, index_dir, record))
+        return tests
+
+    archived_tests = set()
+    for archive_dir in find_trace_archives(base_dir):
+        print(f"[+] Reading trace archive {archive_dir}")
+        for record in read_trace_archive_index(archive_dir):
+            tests.append((test_order_key(record["test"], record["time"]), None, archive_dir, record))
+            archived_tests.add(record["test"])
+
+    for root, dirs, files in os.walk(base_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        # a kept test dir (keep_raw_trace) still has its raw trace although the archive has the test too
+        if QEMU_TRACE_LOG_FILE in files and os.path.basename(root) not in archived_tests:
+            trace_log = os.path.join(root, QEMU_TRACE_LOG_FILE)
+            tests.append((test_order_key(os.path.basename(root), os.path.getmtime(trace_log)), trace_log, None, None))
+
+    return tests
+
+
+def load_chunk(chunk: list[tuple], executor, segments: dict) -> list[np.ndarray]:
+    trace_logs = [trace_log for _, trace_log, _, _ in chunk if trace_log is not None]
+    if executor:
+        raw_pcs = iter(executor.map(read_trace_log_pcs, trace_logs, chunksize=16))
+    else:
+        raw_pcs = map(read_trace_log_pcs, trace_logs)
+
+    result = []
+    for _, trace_log, archive_dir, record in chunk:
+        if trace_log is not None:
+            result.append(next(raw_pcs))
+            continue
+
+        segment_path = os.path.join(archive_dir, record["segment"])
+        seg = segments.get(segment_path)
+        if seg is None:
+            seg = segments[segment_path] = open(segment_path, "rb")
+        seg.seek(record["offset"])
+        pcs, _ = decode_record(seg.read(record["length"]))
+        result.append(np.array(pcs, dtype=np.uint64))
+    return result
 
 
 def create_merged_filter(config: dict, target_filter) -> list[tuple[int, int]]:
@@ -93,7 +213,6 @@ def create_merged_filter(config: dict, target_filter) -> list[tuple[int, int]]:
     result: list[tuple[int, int]] = []
 
     address_filters = config["address_filters"]
-    targets = None
     if target_filter == "all":
         filters = ["kernel", "firmware"]
     elif target_filter == "kernel":
@@ -123,23 +242,29 @@ def read_config(config_path: str) -> dict:
 
 
 def main(args: argparse.Namespace) -> None:
-    coverages: dict[int, dict] = {}
-    seen_addrs: set[int] = set()
-
     config = read_config(args.config)
-
-    filters = create_merged_filter(config, args.target_filter)
-    starts = [lower for (lower, _) in filters]
-
-    base_dir = Path(os.path.abspath(args.result_dir))
-    files = sorted(base_dir.rglob(QEMU_TRACE_LOG_FILE))
-
-    for test_no, file in enumerate(files):
-        print(f"[+] Processing {file}")
-        trace_logs = read_qemu_trace_log(file)
-        apply_filter(trace_logs, filters, starts, coverages, test_no, seen_addrs)
-
-    write_csv(args.output, coverages)
+    accumulator = CoverageAccumulator(AddressFilter(create_merged_filter(config, args.target_filter)))
+
+    base_dir = os.path.abspath(args.result_dir)
+    jobs = max(args.jobs or 1, 1)
+    tests = collect_tests(base_dir, args.index, jobs)
+    tests.sort(key=lambda x: x[0])
+    print(f"[+] Accumulating coverage of {len(tests)} tests")
+
+    new_counts = []
+    segments = {}
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    try:
+        for i in range(0, len(tests), CHUNK_SIZE):
+            chunk = load_chunk(tests[i:i + CHUNK_SIZE], executor, segments)
+            new_counts.append(accumulator.add_chunk(chunk))
+    finally:
+        if executor:
+            executor.shutdown()
+        for seg in segments.values():
+            seg.close()
+
+    write_csv(args.output, np.concatenate(new_counts) if new_counts else np.zeros(0, dtype=np.int64))
 
 
 def parse_args() -> argparse.Namespace:
@@ -148,6 +273,8 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--result-dir", required=True, help="Path to test result directory")
     parser.add_argument("--output", required=True, help="Output CSV file name")
     parser.add_argument("--target-filter", default="all", help="all/kernel/firmware")
+    parser.add_argument("--index", action="store_true", help="Read the traces from the trace index, updating it first")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Number of worker processes")
     return parser.parse_args()
 
 
@@ -1,10 +1,20 @@
 #!/usr/bin/env python3
+import os
 import re
 import subprocess
 import argparse
 import json
 import sys
 import pprint
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from elftools.elf.elffile import ELFFile
+except ImportError:
+    ELFFile = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "fuzzer"))
+from lib.address_filter_index import load_filter_index, merge_ranges, write_filter_index
 
 FUNC_LINE_RE = re.compile(r'^\s*([0-9a-fA-F]+)\s+<([^>]+)>:\s*$')
 
@@ -32,6 +42,73 @@ def parse_objdump_text(text: str):
 
     return functions
 
+def read_elf_functions(binary: str):
+    """Return the function symbols of an ELF file like parse_objdump_text(), from its .symtab."""
+    functions = []
+    with open(binary, "rb") as f:
+        elf = ELFFile(f)
+        for section in elf.iter_sections():
+            if section["sh_type"] != "SHT_SYMTAB":
+                continue
+            for symbol in section.iter_symbols():
+                if symbol["st_info"]["type"] != "STT_FUNC" or symbol["st_shndx"] == "SHN_UNDEF":
+                    continue
+                functions.append({
+                    "name": symbol.name,
+                    "address": hex(symbol["st_value"]),
+                    "size": symbol["st_size"]
+                })
+
+    return functions
+
+def read_functions(binary: str, objdump: str):
+    """Function symbols of a binary, with pyelftools if it is installed, else from objdump -t."""
+    if ELFFile is not None:
+        return read_elf_functions(binary)
+    return parse_objdump_text(run_objdump(objdump, binary))
+
+def read_target_functions(target_files: list, objdump: str, jobs: int) -> dict:
+    """Read the function symbols of every object file, in parallel."""
+    target_functions = {}
+    if jobs > 1 and len(target_files) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(read_functions, target_files, [objdump] * len(target_files), chunksize=32))
+    else:
+        results = [read_functions(target, objdump) for target in target_files]
+
+    for rows in results:
+        for row in rows:
+            target_functions[row["name"]] = row
+    return target_functions
+
+def merge_address_data(address_data: dict) -> dict:
+    """Merge overlapping and adjacent function ranges, named after their first function."""
+    ranges = sorted((int(d["start"], 16), int(d["end"], 16), name) for name, d in address_data.items())
+    merged = {}
+    current = None
+    for lower, upper, name in ranges:
+        if current and lower <= int(current["end"], 16) + 1:
+            current["end"] = hex(max(upper, int(current["end"], 16)))
+            current["functions"].append(name)
+        else:
+            current = merged[name] = {"start": hex(lower), "end": hex(upper), "functions": [name]}
+    return merged
+
+def write_index(index_path: str, address_list: list, target: str, replace: bool) -> None:
+    """Write the ranges of the target into the binary filter index, keeping its other targets."""
+    filters = {}
+    if os.path.exists(index_path):
+        filters = {name: list(zip(lowers, uppers)) for name, (lowers, uppers) in load_filter_index(index_path).items()}
+
+    ranges = [(int(pair["lower"], 16), int(pair["upper"], 16)) for pair in address_list]
+    if replace or target not in filters:
+        filters[target] = ranges
+    else:
+        filters[target] = filters[target] + ranges
+
+    write_filter_index(index_path, filters)
+    print(f"[+] {len(merge_ranges(filters[target]))} merged {target} ranges written to {index_path}", file=sys.stderr)
+
 def create_address_filter_list(address_data: dict) -> list:
     """Create address filter list from address data."""
     address_list = []
@@ -43,6 +120,8 @@ def create_address_filter_list(address_data: dict) -> list:
             "lower": d["start"], 
             "upper": d["end"],
         }
+        if "functions" in d:
+            pair["functions"] = d["functions"]
         address_list.append(pair)
 
     return address_list
@@ -89,10 +168,13 @@ def parse_args() -> argparse.Namespace:
     filter_group = parser.add_argument_group("Config file options")
 
     base_group.add_argument("--target-list", required=True, help="Target .c file names(this file name convert to .o file) or .o file names list")
-    base_group.add_argument("--objdump", required=True, help="Path to objdump binary")
+    base_group.add_argument("--objdump", default="objdump", help="Path to objdump binary, used when pyelftools is not installed")
     base_group.add_argument("--binary", required=True, help="Binary file to analyze. for example: vmlinux")
     base_group.add_argument("--base-address", help="Base address to adjust function addresses", type=str, default="0x0")
     base_group.add_argument("--output", help="Output file path (default: stdout)")
+    base_group.add_argument("--merge", action="store_true", help="Merge overlapping and adjacent function ranges in the config", default=False)
+    base_group.add_argument("--index", help="Binary address filter index to write, for fuzzing.address_filter_index", type=str)
+    base_group.add_argument("--jobs", help="Number of processes reading the object files", type=int, default=os.cpu_count())
 
     filter_group.add_argument("--config", help="Config file to merge address filters", type=str)
     filter_group.add_argument("--replace", action="store_true", help="Replace address filters in config file", default=False)
@@ -106,17 +188,10 @@ def main():
     args = parse_args()
     target_files = read_target_list(args.target_list)
 
-    target_functions = {}
-    for target in target_files:
-        text = run_objdump(args.objdump, target)
-        rows = list(parse_objdump_text(text))
-        for row in rows:
-            name = row["name"]
-            target_functions[name] = row
-            
-    binry_analysis_result = run_objdump(args.objdump, args.binary)
+    target_functions = read_target_functions(target_files, args.objdump, max(args.jobs or 1, 1))
+
     all_functions = {}
-    rows = list(parse_objdump_text(binry_analysis_result))
+    rows = read_functions(args.binary, args.objdump)
     for row in rows:
         name = row["name"]
         all_functions[name] = row
@@ -131,8 +206,14 @@ def main():
             size = all_functions[name]["size"]
             address_data[name] = {"start": addr, "end": hex(int(addr, 16) + size)}
 
+    if args.merge:
+        address_data = merge_address_data(address_data)
+
     address_list = create_address_filter_list(address_data)
 
+    if args.index:
+        write_index(args.index, address_list, args.filter_target, args.replace)
+
     config = merge_address_list(args.config, address_list, args.filter_target, args.replace)
 
     if args.output:
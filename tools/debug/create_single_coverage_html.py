@@ -3,9 +3,16 @@
 import argparse
 import csv
 import os
+import sys
 import html
 import collections
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "..", "fuzzer"))
+from lib.html_pages import PageDigests, map_pages
+
+# bump when the page layout changes so that every page is rendered again
+PAGE_FORMAT = 1
+
 
 def read_csv(file_path):
     ret = {}
@@ -32,21 +39,18 @@ def read_csv(file_path):
     return ret
 
 
-def create_source_line_map(file_paths):
-    result = {}
-    for filepath in file_paths:
-        try:
-            print(f"Reading source file: {filepath}")
-            with open(filepath, "r") as f:
-                lines = f.readlines()
-        except FileNotFoundError:
-            print(f"File not found: {filepath}")
-            continue
-        line_map = {}
-        for idx, line in enumerate(lines):
-            line_map[idx + 1] = line.replace("\t", "    ").rstrip("\n")
-        result[filepath] = line_map
-    return result
+def read_source_lines(filepath):
+    try:
+        print(f"Reading source file: {filepath}")
+        with open(filepath, "r") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        print(f"File not found: {filepath}")
+        return None
+    line_map = {}
+    for idx, line in enumerate(lines):
+        line_map[idx + 1] = line.replace("\t", "    ").rstrip("\n")
+    return line_map
 
 
 def sanitize_filename(filepath):
@@ -55,47 +59,59 @@ def sanitize_filename(filepath):
     return rel_path.replace(".", "_") + ".html"
 
 
-def write_html_per_file(output_dir, src_path, lines, coverage, prefix=""):
-    dst_file = os.path.join(output_dir, sanitize_filename(src_path))
-    with open(dst_file, "w") as f:
-        f.write("<html><head><style>\n")
-        f.write("body { font-family: monospace; background-color: #fdfdfd; }\n")
-        f.write("table { border-collapse: collapse; margin-bottom: 30px; }\n")
-        f.write("td, th { padding: 4px 8px; vertical-align: top; }\n")
-        f.write("tr:nth-child(even) { background-color: #f9f9f9; }\n")
-        f.write(".count { text-align: right; width: 60px; color: #555; }\n")
-        f.write(".line { white-space: pre; }\n")
-        f.write("th { background-color: #eaeaea; font-weight: bold; }\n")
-        f.write("tr.hit { background-color: #ddffdd; }\n")
-        f.write("</style></head><body>\n")
-
-        abs_src_path = os.path.abspath(src_path)
-        abs_prefix = os.path.abspath(prefix) if prefix else ""
-        display_path = abs_src_path[len(abs_prefix):].lstrip(os.sep) if abs_prefix and abs_src_path.startswith(abs_prefix) else src_path
-        f.write(f"<h2>{html.escape(display_path)}</h2>\n")
-
-        f.write("<div><strong>Legend:</strong><ul>\n")
-        f.write("<li style='background-color:#ddffdd;'>Covered (count &gt; 0)</li>\n")
-        f.write("<li>No coverage</li>\n")
-        f.write("</ul></div><br>\n")
-
-        f.write("<table>\n")
-        f.write("<tr><th>Count</th><th>Line</th><th>Source</th></tr>\n")
-
-        for lineno in sorted(lines.keys()):
-            key = f"{src_path}:{lineno}"
-            line_text = html.escape(lines[lineno])
-            count = coverage.get(key, {}).get("count", 0)
-            display = str(count) if count > 0 else "&nbsp;"
-
-            row_class = "hit" if count > 0 else ""
-            f.write(f"<tr class='{row_class}'>")
-            f.write(f"<td class='count'>{display}</td>")
-            f.write(f"<td class='count'>{lineno}</td>")
-            f.write(f"<td class='line'>{line_text}</td>")
-            f.write("</tr>\n")
-
-        f.write("</table>\n</body></html>\n")
+PAGE_HEADER = (
+    "<html><head><style>\n"
+    "body { font-family: monospace; background-color: #fdfdfd; }\n"
+    "table { border-collapse: collapse; margin-bottom: 30px; }\n"
+    "td, th { padding: 4px 8px; vertical-align: top; }\n"
+    "tr:nth-child(even) { background-color: #f9f9f9; }\n"
+    ".count { text-align: right; width: 60px; color: #555; }\n"
+    ".line { white-space: pre; }\n"
+    "th { background-color: #eaeaea; font-weight: bold; }\n"
+    "tr.hit { background-color: #ddffdd; }\n"
+    "</style></head><body>\n"
+)
+
+PAGE_LEGEND = (
+    "<div><strong>Legend:</strong><ul>\n"
+    "<li style='background-color:#ddffdd;'>Covered (count &gt; 0)</li>\n"
+    "<li>No coverage</li>\n"
+    "</ul></div><br>\n"
+    "<table>\n"
+    "<tr><th>Count</th><th>Line</th><th>Source</th></tr>\n"
+)
+
+
+def render_html(src_path, lines, file_coverage, prefix=""):
+    """
+    file_coverage: {line number: count}
+    """
+    abs_src_path = os.path.abspath(src_path)
+    abs_prefix = os.path.abspath(prefix) if prefix else ""
+    display_path = abs_src_path[len(abs_prefix):].lstrip(os.sep) if abs_prefix and abs_src_path.startswith(abs_prefix) else src_path
+
+    parts = [PAGE_HEADER, f"<h2>{html.escape(display_path)}</h2>\n", PAGE_LEGEND]
+    for lineno in sorted(lines.keys()):
+        line_text = html.escape(lines[lineno])
+        count = file_coverage.get(lineno, 0)
+        display = str(count) if count > 0 else "&nbsp;"
+
+        row_class = "hit" if count > 0 else ""
+        parts.append(f"<tr class='{row_class}'><td class='count'>{display}</td>"
+                     f"<td class='count'>{lineno}</td><td class='line'>{line_text}</td></tr>\n")
+
+    parts.append("</table>\n</body></html>\n")
+    return "".join(parts)
+
+
+def write_html_per_file(output_dir, src_path, file_coverage, prefix=""):
+    lines = read_source_lines(src_path)
+    if lines is None:
+        return False
+
+    with open(os.path.join(output_dir, sanitize_filename(src_path)), "w") as f:
+        f.write(render_html(src_path, lines, file_coverage, prefix))
+    return True
 
 
 def build_tree_with_display(display_paths, real_paths):
@@ -123,8 +139,8 @@ def write_frame_list(output_dir, src_paths, prefix=""):
     tree = build_tree_with_display(display_paths, src_paths)
     outpath = os.path.join(output_dir, "frame_list.html")
 
-    def render_node(node, f):
-        f.write("<ul>\n")
+    def render_node(node, parts):
+        parts.append("<ul>\n")
         for name in sorted(node.keys()):
             if name == "__fullpath__":
                 continue
@@ -134,23 +150,27 @@ def write_frame_list(output_dir, src_paths, prefix=""):
                 link = sanitize_filename(fullpath)
                 display_name = os.path.relpath(fullpath, prefix) if prefix and fullpath.startswith(prefix) else fullpath
                 filename = os.path.basename(display_name)
-                f.write(f"<li><a href='{link}' target='sourceview'>{html.escape(filename)}</a></li>\n")
+                parts.append(f"<li><a href='{link}' target='sourceview'>{html.escape(filename)}</a></li>\n")
             else:
-                f.write(f"<li><details open><summary>{html.escape(name)}</summary>\n")
-                render_node(child, f)
-                f.write("</details></li>\n")
-        f.write("</ul>\n")
+                parts.append(f"<li><details open><summary>{html.escape(name)}</summary>\n")
+                render_node(child, parts)
+                parts.append("</details></li>\n")
+        parts.append("</ul>\n")
+
+    parts = [
+        "<html><head><style>\n"
+        "body { font-family: sans-serif; padding: 8px; }\n"
+        "ul { list-style-type: none; padding-left: 1em; }\n"
+        "li { margin: 4px 0; }\n"
+        "a { text-decoration: none; color: #004080; }\n"
+        "summary { cursor: pointer; font-weight: bold; }\n"
+        "</style></head><body>\n"
+    ]
+    render_node(tree, parts)
+    parts.append("</body></html>\n")
 
     with open(outpath, "w") as f:
-        f.write("<html><head><style>\n")
-        f.write("body { font-family: sans-serif; padding: 8px; }\n")
-        f.write("ul { list-style-type: none; padding-left: 1em; }\n")
-        f.write("li { margin: 4px 0; }\n")
-        f.write("a { text-decoration: none; color: #004080; }\n")
-        f.write("summary { cursor: pointer; font-weight: bold; }\n")
-        f.write("</style></head><body>\n")
-        render_node(tree, f)
-        f.write("</body></html>\n")
+        f.write("".join(parts))
 
 
 def write_frame_index(output_dir):
@@ -168,6 +188,8 @@ def parse_args():
     parser.add_argument("--csv", required=True, help="Path to coverage CSV")
     parser.add_argument("--html-dir", required=True, help="Output directory for HTML files")
     parser.add_argument("--prefix", help="Prefix path to strip from source paths in frame list", default="")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--force", action="store_true", help="Rewrite every page even if its coverage did not change")
     return parser.parse_args()
 
 
@@ -175,26 +197,44 @@ def main():
     args = parse_args()
     coverage = read_csv(args.csv)
 
-    all_files = set()
-    for key in coverage.keys():
-        src_path, _ = key.rsplit(":", 4)
-        all_files.add(src_path)
+    # {src path: {line: count}}
+    file_coverages = collections.defaultdict(dict)
+    for key, data in coverage.items():
+        src_path, line = key.rsplit(":", 1)
+        file_coverages[src_path][int(line)] = data["count"]
 
-    source_lines = create_source_line_map(all_files)
     os.makedirs(args.html_dir, exist_ok=True)
+    digests = PageDigests(args.html_dir)
 
-    for src_path in sorted(source_lines.keys()):
-        write_html_per_file(
-            args.html_dir,
-            src_path,
-            source_lines[src_path],
-            coverage,
-            prefix=args.prefix
-        )
-
-    write_frame_list(args.html_dir, source_lines.keys(), prefix=args.prefix)
+    src_paths = []
+    tasks = []
+    task_digests = []
+    for src_path in sorted(file_coverages.keys()):
+        try:
+            st = os.stat(src_path)
+        except FileNotFoundError:
+            print(f"File not found: {src_path}")
+            continue
+        src_paths.append(src_path)
+
+        # the page only changes with the source file, its coverage or the prefix
+        page = sanitize_filename(src_path)
+        digest = PageDigests.digest(PAGE_FORMAT, src_path, args.prefix, st.st_mtime_ns, st.st_size,
+                                    sorted(file_coverages[src_path].items()))
+        if args.force or not digests.is_current(page, digest):
+            tasks.append((args.html_dir, src_path, file_coverages[src_path], args.prefix))
+            task_digests.append((page, digest))
+
+    written = map_pages(write_html_per_file, tasks, max(args.jobs or 1, 1))
+    for (page, digest), ok in zip(task_digests, written):
+        if ok:
+            digests.update(page, digest)
+    digests.save()
+
+    write_frame_list(args.html_dir, src_paths, prefix=args.prefix)
     write_frame_index(args.html_dir)
 
+    print(f"[+] {len(tasks)} of {len(src_paths)} source pages rewritten")
     print(f"HTML coverage report generated in: {args.html_dir}/index.html")
 
 
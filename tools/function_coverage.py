@@ -3,6 +3,10 @@ import argparse
 from collections import namedtuple, defaultdict
 import csv
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "fuzzer"))
+from lib.static_layout import StaticLayout
 
 FunctionRange = namedtuple("FunctionRange", ["name", "file", "start", "end"])
 
@@ -96,12 +100,53 @@ def calculate_function_hit_only(func_ranges, hits, output_file_prefix):
         for file, total, covered, rate in total_summary:
             writer.writerow([file, total, covered, rate])
 
+def calculate_block_coverage(layout, base_addr, func_ranges, addr_file, output_file_prefix):
+    """
+    Basic-block coverage of the functions in the tag file, from the addresses of the addr2line CSV.
+    """
+    names = {fr.name for fr in func_ranges}
+    covered = defaultdict(set)  # function index → set(block index)
+    with open(addr_file) as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if len(row) != 5:
+                continue
+            try:
+                addr = int(row[0], 16) - base_addr
+            except ValueError:
+                continue
+            func_idx = layout.function_index(addr)
+            if func_idx is not None:
+                covered[func_idx].add(layout.block_index(addr))
+
+    total_blocks = 0
+    total_covered = 0
+    with open(f"{output_file_prefix}_block_coverages.csv", "w") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Function", "Address", "Total Blocks", "Covered Blocks", "Block Coverage Rate"])
+        for i, (start, end, name) in enumerate(zip(layout.starts, layout.ends, layout.names)):
+            if name not in names:
+                continue
+            total = layout.count_blocks(start, end)
+            hit = len(covered.get(i, ()))
+            total_blocks += total
+            total_covered += hit
+            writer.writerow([name, hex(start + base_addr), total, hit, (hit / total) * 100 if total > 0 else 0.0])
+
+    rate = (total_covered / total_blocks) * 100 if total_blocks > 0 else 0.0
+    print(f"[+] Block coverage: {total_covered}/{total_blocks} ({rate:.2f}%)")
+
 def main():
     parser = argparse.ArgumentParser(description="Report function coverage (hit-based only) from ctags and addr2line CSV.")
     parser.add_argument("--tag-file", dest="tags_file", required=True)
     parser.add_argument("--addr-file", dest="addr_file", required=True)
     parser.add_argument("--source-root", dest="source_root", default=None, help="Root of the source code")
     parser.add_argument("--output", dest="output_file", default="function_coverage", help="Output file name prefix")
+    parser.add_argument("--elf", default=None, help="ELF of the addresses in the addr2line CSV, also reports basic-block coverage")
+    parser.add_argument("--base-addr", default="0x0", help="Load address subtracted from the addresses in the addr2line CSV")
+    parser.add_argument("--objdump", default="objdump", help="objdump binary, e.g. riscv64-linux-gnu-objdump")
+    parser.add_argument("--layout-cache", default=None, help="static layout cache dir (default: ~/.cache/mtcfuzz/layout)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Number of objdump processes when the layout is not cached")
 
     args = parser.parse_args()
 
@@ -111,5 +156,9 @@ def main():
     output_file_prefix = args.output_file if args.output_file is not None else "function_coverage"
     calculate_function_hit_only(func_ranges, addr_hits, output_file_prefix)
 
+    if args.elf:
+        layout = StaticLayout.load_or_build(args.elf, args.objdump, args.layout_cache, args.jobs)
+        calculate_block_coverage(layout, int(args.base_addr, 16), func_ranges, args.addr_file, output_file_prefix)
+
 if __name__ == "__main__":
     main()
@@ -10,11 +10,11 @@ binary="$2"
 cross_prefix="$3"
 base_address="$4"
 
-trace_pcs=$(cat ${logfile})
+script_dir=$(realpath $(dirname "${BASH_SOURCE[0]}"))
 
-for pc in ${trace_pcs[@]};
-do
-    addr=$(printf "0x%x" $((pc - base_address)))
-    echo "${addr}" | "${cross_prefix}"addr2line -e "${binary}" -afp
-
-done
+# one addr2line process for the whole log, resolved PCs are cached across runs
+"${script_dir}/symbolize.py" \
+    --trace-log "${logfile}" \
+    --elf "${binary}" \
+    --addr2line "${cross_prefix}addr2line" \
+    --base-addr "${base_address}"
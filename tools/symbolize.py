@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "fuzzer"))
+from lib.symbolizer import SymbolCache, Symbolizer
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Print the function and source line of every PC in a trace log, like addr2line -afp")
+    parser.add_argument("--trace-log", required=True, help="qemu trace log file")
+    parser.add_argument("--elf", required=True, help="ELF file with debug info")
+    parser.add_argument("--addr2line", default="addr2line", help="addr2line binary, e.g. riscv64-linux-gnu-addr2line")
+    parser.add_argument("--base-addr", default="0x0", help="Load address subtracted from each PC")
+    parser.add_argument("--symbol-cache", default=None, help="symbol cache file (default: ~/.cache/mtcfuzz/symbols.sqlite3)")
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> None:
+    base_addr = int(args.base_addr, 0)
+    offsets = []
+    with open(args.trace_log) as f:
+        for line in f:
+            try:
+                offsets.append(int(line.strip(), 16) - base_addr)
+            except ValueError:
+                continue
+
+    cache = SymbolCache(args.symbol_cache)
+    symbolizer = Symbolizer(args.addr2line, args.elf, cache)
+    try:
+        symbols = symbolizer.symbolize(offsets)
+    finally:
+        symbolizer.close()
+        cache.close()
+
+    for offset in offsets:
+        function, file, line = symbols[offset]
+        if line is None and file == "??":
+            print(f"{offset:#x}: ?? ??:0")
+        else:
+            print(f"{offset:#x}: {function} at {file}:{line if line is not None else '?'}")
+
+
+if __name__ == "__main__":
+    main(parse_args())